@@ -0,0 +1,125 @@
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Allow running as python scripts/benchmark_clean_data.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.transform.clean_data import (  # noqa: E402
+    remove_zero_time_delta,
+    speed_calculation,
+    time_delta,
+)
+
+
+def make_tracks(rows, whales=50, seed=0):
+    """
+    Sorted synthetic frame shaped like a cleaned Movebank study.
+    Roughly 5% of gaps are zero so the zero delta stage has work to do.
+    """
+    rng = np.random.default_rng(seed)
+    whale = np.sort(rng.integers(0, whales, rows)).astype(str)
+    gaps = rng.integers(1, 3600, rows)
+    gaps[rng.random(rows) < 0.05] = 0
+    df = pd.DataFrame({
+        "individual-local-identifier": whale,
+        "tag-local-identifier": whale,
+        "timestamp": pd.Timestamp("2013-03-08")
+        + pd.to_timedelta(np.cumsum(gaps), unit="s"),
+        "location-lat": np.cumsum(rng.normal(0, 0.01, rows)),
+        "location-long": np.cumsum(rng.normal(0, 0.01, rows)),
+        "distance_from_prev_m": rng.uniform(0, 5000, rows),
+    })
+    return time_delta({"bench": df})["bench"]
+
+
+# Row by row versions kept here only as the baseline to compare against
+def legacy_remove_zero_time_delta(data_dict):
+    for key, df in data_dict.items():
+        valid_rows = []
+        for i in range(len(df)):
+            if i == 0:
+                valid_rows.append(i)
+                continue
+            same_whale = (
+                df.loc[i, "individual-local-identifier"]
+                == df.loc[i - 1, "individual-local-identifier"]
+                and df.loc[i, "tag-local-identifier"]
+                == df.loc[i - 1, "tag-local-identifier"]
+            )
+            if not same_whale:
+                valid_rows.append(i)
+                continue
+            if df.loc[i, "time_diff_s"] > 0:
+                valid_rows.append(i)
+        data_dict[key] = df.loc[valid_rows].reset_index(drop=True)
+    return data_dict
+
+
+def legacy_speed_calculation(data_dict):
+    for key, df in data_dict.items():
+        df["speed_mps"] = df.apply(
+            lambda x: (
+                x["distance_from_prev_m"] / x["time_diff_s"]
+                if x["time_diff_s"] > 0
+                else 0
+            ),
+            axis=1,
+        )
+        data_dict[key] = df
+    return data_dict
+
+
+def time_stage(func, df):
+    """
+    Run one stage on a fresh copy and return (seconds, result frame).
+    """
+    data_dict = {"bench": df.copy()}
+    # Stages print counts, keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func(data_dict)["bench"]
+        elapsed = time.perf_counter() - start
+    return elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare vectorised clean_data stages with the "
+                    "previous row by row implementations."
+    )
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--whales", type=int, default=50)
+    args = parser.parse_args()
+
+    df = make_tracks(args.rows, args.whales)
+    stages = [
+        ("remove_zero_time_delta",
+         legacy_remove_zero_time_delta, remove_zero_time_delta),
+        ("speed_calculation",
+         legacy_speed_calculation, speed_calculation),
+    ]
+
+    print(f"{args.rows} rows across {args.whales} whales")
+    print(f"{'stage':<26}{'legacy s':>12}{'new s':>12}{'speedup':>10}")
+    for name, legacy, new in stages:
+        legacy_s, expected = time_stage(legacy, df)
+        new_s, actual = time_stage(new, df)
+        # Both versions must agree before the timing means anything
+        pd.testing.assert_frame_equal(
+            actual, expected, check_dtype=False
+        )
+        print(
+            f"{name:<26}{legacy_s:>12.3f}{new_s:>12.4f}"
+            f"{legacy_s / new_s:>9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,402 @@
+import os
+import queue
+import threading
+from pathlib import Path
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 from src.utils.logging_utils import setup_logger
-from src.extract.extract import extract_data
-from src.transform.transform import transform_data
-from src.load.load import save_combined_csv
+from src.extract.create_file_list import create_file_list
+from src.extract.extract import extract_data, extract_data_stream
+from src.extract.extract_files_into_df import read_study
+from src.transform.clean_data import clean_data
+from src.transform.create_new_df import create_combined_df
+from src.transform.transform import transform_data, transform_stream
+from src.load.load import (
+    csv_path,
+    dataset_dir,
+    export_combined_csv,
+    new_version,
+    publish_version,
+    read_version,
+    remove_files,
+    stage_combined_parquet,
+    stale_studies,
+    store_path,
+    write_arrow_store,
+    write_partitions,
+)
+from src.load.database import database_path, export_combined_sql
+from src.load.aggregates import (
+    daily_summary_path,
+    species_rankings_path,
+    write_summaries,
+)
+from src.transform.track_registry import (
+    load_registry,
+    registry_generation,
+    save_registry,
+)
+from src.extract.manifest import (
+    iter_cleaned_study,
+    load_manifest,
+    save_manifest,
+    split_changed_files,
+    store_cleaned_study,
+    study_input_keys,
+    study_name,
+)
 
 
 # Function to call the ETL pipeline
-def run_etl_pipeline():
+def run_etl_pipeline(workers=1, incremental=True, staging=False,
+                     streaming=False, pipelined=False, queue_depth=2,
+                     readers=2, memory_budget=None, compact=False,
+                     dedup_across_studies=False, export_csv=False,
+                     database=False, output_root=None):
+    """
+    Run extract, transform and load.
+    workers sets the clean_data process pool size, None uses every core.
+    incremental only re-extracts and re-cleans studies whose raw file
+    changed, reusing cached cleaned studies for the rest.
+    staging reads raw studies through typed Parquet copies in
+    data/staging, converting each CSV once.
+    streaming runs extract, clean, combine and load one study at a time
+    and appends to the output, so peak memory is about the largest
+    study rather than the whole corpus.
+    pipelined overlaps reading, cleaning and writing, see
+    run_pipelined. queue_depth and readers only apply to it.
+    memory_budget, in bytes, implies streaming. Studies too big to clean
+    within it are spilled to disk by track and cleaned a partition at a
+    time, see spill_study. A single track over the budget is cut by time.
+    compact keeps identifiers as categoricals and metrics as float32
+    from cleaning to the output, see src/transform/compact.py.
+    Every run adds an integer track_id from the persisted registry in
+    data/registry, see src/transform/track_registry.py.
+    dedup_across_studies drops fixes repeated in an earlier study file.
+    It compares every study, so it needs a full batch run: it is not
+    incremental and cannot be combined with the per-study modes.
+    The output is a Parquet dataset partitioned by species and study in
+    data/processed/whales, see src/load/load.py, plus the Arrow store
+    the app maps and the summary tables of src/load/aggregates.py.
+    export_csv also writes combined_cleaned_data.csv.
+    Each run publishes a new dataset version. Incremental runs only
+    rewrite the studies whose inputs changed, see study_input_keys.
+    database upserts the dataset into the SQLite database, by study,
+    see src/load/database.py.
+    output_root writes every output under that directory instead of
+    data/processed, with the same names.
+    Returns the dataset directory.
+    """
     # Set up the logger for the ETL pipeline
     logger = setup_logger("etl_pipeline", "etl_pipeline.log")
     # Set up try expect block
     try:
         logger.info("Starting ETL pipeline.")
+        if dedup_across_studies:
+            if pipelined or streaming or memory_budget is not None:
+                raise ValueError(
+                    "dedup_across_studies needs every study at once, "
+                    "run it without pipelined, streaming or memory_budget"
+                )
+            # Cached studies were never compared with the new ones
+            incremental = False
+        manifest = load_manifest() if incremental else None
+        registry = load_registry()
+        generation = registry_generation()
+        root = _output_path(dataset_dir, output_root)
+
+        if pipelined:
+            version = run_pipelined(
+                manifest, staging=staging, workers=workers,
+                queue_depth=queue_depth, readers=readers, compact=compact,
+                registry=registry, generation=generation, root=root,
+            )
+            output_file = publish_outputs(
+                version, export_csv, database, output_root
+            )
+            save_registry(registry)
+            if manifest is not None:
+                save_manifest(manifest)
+            return output_file
+
+        if streaming or memory_budget is not None:
+            logger.info("Running ETL one study at a time")
+            studies = extract_data_stream(
+                manifest=manifest, staging=staging,
+                memory_budget=memory_budget, compact=compact,
+            )
+            inputs = _study_inputs(manifest, compact, generation)
+            frames = transform_stream(
+                studies, workers=workers, manifest=manifest, compact=compact,
+                registry=registry, skip=_unchanged_studies(inputs, root),
+            )
+            version = stage_combined_parquet(frames, inputs=inputs, root=root)
+            output_file = publish_outputs(
+                version, export_csv, database, output_root
+            )
+            save_registry(registry)
+            if manifest is not None:
+                save_manifest(manifest)
+            return output_file
 
         # Extract phase
         logger.info("Beginning data extraction phase")
-        extracted_data = extract_data()
+        extracted_data = extract_data(
+            manifest=manifest, staging=staging, compact=compact
+        )
         logger.info("Data extraction phase completed")
 
         # Transformation phase
         logger.info("Beginning data transformation phase")
-        transformed_data = transform_data(extracted_data)
+        inputs = _study_inputs(manifest, compact, generation)
+        transformed_data = transform_data(
+            extracted_data, workers=workers, manifest=manifest,
+            compact=compact, registry=registry,
+            dedup_across_studies=dedup_across_studies, per_study=True,
+            skip=_unchanged_studies(inputs, root),
+        )
         logger.info("Transformation complete.")
 
         # Load phase
         logger.info("Beginning data load phase")
-        output_file = save_combined_csv(transformed_data)
+        version = stage_combined_parquet(
+            transformed_data.items(), inputs=inputs, workers=workers,
+            root=root,
+        )
+        output_file = publish_outputs(
+            version, export_csv, database, output_root
+        )
+
+        # Only record the run once the output is written
+        save_registry(registry)
+        if manifest is not None:
+            save_manifest(manifest)
 
         return output_file
 
     except Exception as e:
         logger.error(f"ETL pipeline failed: {e}")
         raise
+
+
+def _study_inputs(manifest, compact=False, generation=None):
+    # Without a manifest nothing is known to be unchanged
+    if manifest is None:
+        return None
+    return study_input_keys(manifest, compact, generation)
+
+
+def _unchanged_studies(inputs, root=None):
+    # Studies whose published files are up to date, never loaded
+    if inputs is None:
+        return set()
+    return set(inputs) - set(stale_studies(inputs, root))
+
+
+def _output_path(default, output_root=None):
+    # Same file name under output_root, None keeps the module default
+    if output_root is None:
+        return None
+    return Path(output_root) / default.name
+
+
+def publish_outputs(version, export_csv=False, database=False,
+                    output_root=None):
+    """
+    Derive the other outputs from a staged dataset version, then
+    publish it: the memory-mapped Arrow store, the summary tables and,
+    if asked, the CSV export and the SQLite database. Readers polling
+    the version only see it change once all of them are written.
+    output_root is the directory of every output, data/processed by
+    default. Returns the dataset directory.
+    """
+    root = _output_path(dataset_dir, output_root)
+    if output_root is not None:
+        Path(output_root).mkdir(parents=True, exist_ok=True)
+    write_arrow_store(
+        root, _output_path(store_path, output_root), manifest=version
+    )
+    write_summaries(
+        root, version,
+        daily_path=_output_path(daily_summary_path, output_root),
+        rankings_path=_output_path(species_rankings_path, output_root),
+    )
+    if export_csv:
+        export_combined_csv(
+            root, version, path=_output_path(csv_path, output_root)
+        )
+    if database:
+        export_combined_sql(
+            root, _output_path(database_path, output_root), version
+        )
+    return publish_version(version, root)
+
+
+def _read_into(raw_queue, stop, path, staging, compact=False):
+    """
+    Reader stage: parse one study and hand it to the cleaners.
+    Blocks while the queue is full, which is the back-pressure.
+    Failures are passed along the queue so the scheduler raises them.
+    """
+    try:
+        item = (study_name(path), read_study(
+            path, staging=staging, compact=compact
+        ))
+    except Exception as e:
+        item = e
+    while not stop.is_set():
+        try:
+            raw_queue.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _clean_study(name, df, compact=False):
+    # Cleaner stage, runs in a worker process
+    return name, clean_data({name: df}, compact=compact)[name]
+
+
+def _write_parts(write_queue, version, manifest, errors, written,
+                 compact=False, registry=None, root=None):
+    """
+    Writer stage: cache each cleaned study and write it in the combined
+    schema to its own partitions under root, as files of the given
+    dataset version, recorded in written. A None item stops the thread,
+    a None frame means the study is read from the cache. After an error
+    it keeps draining so the scheduler never blocks on a full queue.
+    """
+    # Files per partition directory, studies can share one
+    counts = {}
+    while True:
+        item = write_queue.get()
+        if item is None:
+            return
+        if errors:
+            continue
+        name, cleaned = item
+        try:
+            if cleaned is None:
+                # A spilled study is cached a partition at a time
+                frames = iter_cleaned_study(manifest, name)
+            else:
+                if manifest is not None:
+                    store_cleaned_study(manifest, name, cleaned)
+                frames = [cleaned]
+            for frame in frames:
+                written.setdefault(name, []).extend(write_partitions(
+                    create_combined_df(
+                        {name: frame}, compact=compact, registry=registry
+                    ), root, files=counts, version=version,
+                ))
+        except Exception as e:
+            errors.append(e)
+
+
+def run_pipelined(manifest=None, staging=False, workers=1, queue_depth=2,
+                  readers=2, compact=False, registry=None, generation=None,
+                  root=None):
+    """
+    Read, clean and write studies at the same time.
+
+    Reader threads put parsed studies in a queue of at most queue_depth
+    studies. A pool of workers processes cleans them, never more than
+    workers at once. A writer thread writes each cleaned study to its
+    own dataset partitions as soon as it is done. Cached studies whose
+    published files are up to date are not written again. Returns the
+    staged dataset version, see stage_combined_parquet, with the same
+    files as the phased run.
+
+    Wall-clock is close to the slowest stage rather than the sum of
+    all three. At most readers + queue_depth + workers raw studies are
+    held in memory. generation is the track registry's, see
+    registry_generation. root is the dataset directory,
+    data/processed/whales by default.
+    """
+    logger = setup_logger("etl_pipeline", "etl_pipeline.log")
+    workers = workers or os.cpu_count() or 1
+    root = dataset_dir if root is None else Path(root)
+
+    file_list = create_file_list()
+    names = [study_name(path) for path in file_list]
+    changed = file_list
+    if manifest is not None:
+        changed = split_changed_files(file_list, manifest, compact=compact)
+        names = list(manifest["studies"])
+    to_clean = {study_name(path) for path in changed}
+    inputs = _study_inputs(manifest, compact, generation)
+    unchanged = _unchanged_studies(inputs, root)
+    cached = [
+        name for name in names
+        if name not in to_clean and name not in unchanged
+    ]
+    logger.info(
+        f"Pipelined run: {len(changed)} studies to clean, "
+        f"{len(cached)} from cache, queue depth {queue_depth}"
+    )
+
+    raw_queue = queue.Queue(maxsize=max(queue_depth, 1))
+    write_queue = queue.Queue(maxsize=max(queue_depth, 1))
+    stop = threading.Event()
+    errors = []
+    written = {}
+
+    current = read_version(root)
+    try:
+        writer = threading.Thread(
+            target=_write_parts,
+            args=(write_queue, current["version"] + 1, manifest, errors,
+                  written, compact, registry, root),
+        )
+        writer.start()
+        try:
+            with ThreadPoolExecutor(max_workers=readers) as read_pool, \
+                    ProcessPoolExecutor(max_workers=workers) as clean_pool:
+                for path in changed:
+                    read_pool.submit(_read_into, raw_queue, stop, path,
+                                     staging, compact)
+                try:
+                    received = 0
+                    pending = set()
+                    while received < len(changed) or pending:
+                        # Keep every worker busy, but no more
+                        while (received < len(changed)
+                               and len(pending) < workers):
+                            item = raw_queue.get()
+                            received += 1
+                            if isinstance(item, Exception):
+                                raise item
+                            pending.add(clean_pool.submit(
+                                _clean_study, *item, compact
+                            ))
+                        done, pending = wait(
+                            pending, return_when=FIRST_COMPLETED
+                        )
+                        for future in done:
+                            write_queue.put(future.result())
+                except BaseException:
+                    # Release readers blocked on a full queue
+                    stop.set()
+                    raise
+
+            for name in cached:
+                write_queue.put((name, None))
+        finally:
+            write_queue.put(None)
+            writer.join()
+
+        if errors:
+            raise errors[0]
+    except BaseException:
+        remove_files(root, written)
+        raise
+
+    logger.info(
+        f"Pipelined run wrote {len(to_clean) + len(cached)} of "
+        f"{len(names)} studies"
+    )
+    return new_version(current, written, inputs)
@@ -18,7 +18,8 @@ def create_file_list() -> list:
         List of file paths
 
     Raises:
-        Exception if no file found
+        FileNotFoundError if the folder is missing or holds no csv, so
+        a run never publishes a dataset without studies
     """
     try:
         # Create file list to store paths
@@ -39,6 +40,12 @@ def create_file_list() -> list:
                 file_path = data_directory / file_name
                 file_list.append(file_path)
 
+        # Nothing to build a dataset from
+        if not file_list:
+            raise FileNotFoundError(
+                f"No studies found, no csv files in {data_directory}"
+            )
+
         logger.info(
             f"File list creation complete. "
             f"Total files found: {len(file_list)}"
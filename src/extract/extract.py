@@ -1,10 +1,22 @@
 from src.extract.create_file_list import create_file_list
-from src.extract.extract_files_into_df import extract_files_to_df
+from src.extract.extract_files_into_df import (
+    extract_files_to_df,
+    iter_files_to_df,
+)
+from src.extract.manifest import split_changed_files, study_name
+from src.extract.spill import needs_spill, spill_study
 from src.utils.logging_utils import setup_logger
 
 
 # Start the extract data
-def extract_data() -> dict:
+def extract_data(manifest=None, staging=False, compact=False) -> dict:
+    """
+    Read the raw CSVs into a dictionary of DataFrames.
+    With a manifest only new or changed files are read, and files
+    cached with another compact setting, see split_changed_files.
+    With staging the files are read from typed Parquet copies.
+    compact keeps identifiers as categoricals, see read_study_csv.
+    """
     # Set up logger for the extract data
     logger = setup_logger("extract_data", "extract_data.log")
 
@@ -14,8 +26,15 @@ def extract_data() -> dict:
 
         # Create a list of files
         file_list = create_file_list()
+        # Skip studies whose raw file has not changed
+        if manifest is not None:
+            file_list = split_changed_files(
+                file_list, manifest, compact=compact
+            )
         # Convert the files into a dictionary of file name and dataframe
-        data_dict = extract_files_to_df(file_list)
+        data_dict = extract_files_to_df(
+            file_list, staging=staging, compact=compact
+        )
 
         logger.info(
             f"Extraction completed successfully."
@@ -26,3 +45,40 @@ def extract_data() -> dict:
     except Exception as e:
         logger.error(f"Error during extraction: {e}")
         raise
+
+
+def extract_data_stream(manifest=None, staging=False, memory_budget=None,
+                        compact=False):
+    """
+    Streaming version of extract_data.
+    Returns a generator of (df_name, DataFrame), one study at a time in
+    file order. The file list and manifest are updated straight away,
+    only the reads are deferred.
+    With a memory_budget in bytes, a study too big to clean within it is
+    spilled to disk and yielded as its list of partition files instead,
+    see spill_study.
+    """
+    logger = setup_logger("extract_data", "extract_data.log")
+    try:
+        logger.info("Starting streaming data extraction")
+        file_list = create_file_list()
+        if manifest is not None:
+            file_list = split_changed_files(
+                file_list, manifest, compact=compact
+            )
+    except Exception as e:
+        logger.error(f"Error during extraction: {e}")
+        raise
+    if memory_budget is None:
+        return iter_files_to_df(file_list, staging=staging, compact=compact)
+    return _iter_within_budget(file_list, staging, memory_budget, compact)
+
+
+def _iter_within_budget(file_list, staging, memory_budget, compact=False):
+    for path in file_list:
+        if needs_spill(path, memory_budget):
+            yield study_name(path), spill_study(path, memory_budget)
+        else:
+            yield from iter_files_to_df(
+                [path], staging=staging, compact=compact
+            )
@@ -1,38 +1,330 @@
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
+from src.utils.file_utils import atomic_write
 from src.utils.logging_utils import setup_logger
+from src.utils.timestamps import parse_timestamps
 
 # Set up the logger with module name and captures every message
 logger = setup_logger(__name__, "File_conversion.log", level=logging.DEBUG)
 
+# Raw Movebank columns the pipeline uses and the dtype each is read as
+# Everything else in the export is never parsed
+TIMESTAMP_COLUMN = "timestamp"
+COLUMN_DTYPES = {
+    "location-lat": "float64",
+    "location-long": "float64",
+    "individual-local-identifier": "category",
+    "tag-local-identifier": "category",
+    "individual-taxon-canonical-name": "category",
+    "study-name": "category",
+}
+REQUIRED_COLUMNS = [TIMESTAMP_COLUMN, *COLUMN_DTYPES]
+# Identifiers are always parsed as categoricals. They stay that way in
+# compact mode only, see infer_identifiers
+IDENTIFIER_COLUMNS = [
+    col for col, dtype in COLUMN_DTYPES.items() if dtype == "category"
+]
 
-def extract_files_to_df(file_paths) -> dict:
+# Argos fix quality, only read from studies that have it
+# Used by the Argos pre-filter in clean_data, then dropped
+OPTIONAL_COLUMN_DTYPES = {
+    "argos:lc": "category",
+    "argos:error-radius": "float64",
+    "argos:semi-major": "float64",
+}
+
+# Typed Parquet copies of the raw CSVs
+root_directory = Path(__file__).resolve().parents[2]
+staging_directory = root_directory / "data" / "staging"
+
+
+def _file_size(path):
+    # Missing files sort last, reading them raises the real error
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def _empty_column(length, dtype):
+    # Placeholder for a required column a study does not have
+    if dtype == "category":
+        return pd.Categorical([None] * length)
+    return pd.Series([None] * length, dtype=dtype).to_numpy()
+
+
+def _study_columns(header):
+    # Required columns, then the optional ones this study has
+    return REQUIRED_COLUMNS + [
+        col for col in OPTIONAL_COLUMN_DTYPES if col in header
+    ]
+
+
+def _read_dtypes(header):
+    # dtype map for the columns of header the pipeline knows
+    return {
+        k: v for k, v in {**COLUMN_DTYPES, **OPTIONAL_COLUMN_DTYPES}.items()
+        if k in header
+    }
+
+
+def infer_identifiers(df):
+    """
+    Turn the identifier categoricals into the dtypes a plain read_csv
+    infers: numbers when every value is a number, strings otherwise.
+    Only the categories are converted, then taken per row.
+    """
+    for col in IDENTIFIER_COLUMNS:
+        if col not in df.columns or not isinstance(
+            df[col].dtype, pd.CategoricalDtype
+        ):
+            continue
+        column = df[col]
+        numbers = pd.to_numeric(column.cat.categories, errors="coerce")
+        if len(numbers) and not numbers.isna().any():
+            codes = column.cat.codes.to_numpy()
+            values = numbers.to_numpy()[codes]
+            if (codes < 0).any():
+                # Missing values make the column float, as in read_csv
+                values = np.where(codes < 0, np.nan, values)
+            df[col] = values
+        else:
+            df[col] = column.astype(object)
+    return df
+
+
+def _conform_schema(df, columns, name, compact=False):
+    """
+    Warn about and add any required column the study does not have,
+    then return the required columns in a fixed order, followed by the
+    optional columns the study has.
+    Outside compact mode identifiers get read_csv's own dtypes.
+    """
+    missing = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing:
+        logger.warning(
+            f"{name} is missing required columns {missing}, "
+            f"they will be empty"
+        )
+    for col in missing:
+        dtype = COLUMN_DTYPES.get(col, "datetime64[ns]")
+        df[col] = _empty_column(len(df), dtype)
+    # Same column order for every study
+    df = df[_study_columns(columns)]
+    return df if compact else infer_identifiers(df)
+
+
+def _read_typed_csv(path, header, columns=None):
+    """
+    Read a CSV with the dtype map and a parsed timestamp.
+    columns limits the read to those columns, None reads them all.
+    """
+    df = pd.read_csv(
+        path,
+        usecols=None if columns is None else (lambda col: col in columns),
+        dtype=_read_dtypes(header),
+    )
+    return _parse_timestamp_column(_sort_categories(df), path.name)
+
+
+def _sort_categories(df):
+    """
+    Put categories in sorted order. Large files are parsed in blocks
+    whose categories are joined unsorted, which would make the track
+    order in clean_data depend on the row layout of the file.
+    """
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            categories = df[col].cat.categories
+            if not categories.is_monotonic_increasing:
+                df[col] = df[col].cat.reorder_categories(
+                    categories.sort_values()
+                )
+    return df
+
+
+def _parse_timestamp_column(df, name):
+    if TIMESTAMP_COLUMN in df.columns:
+        # Format detected once per file, see parse_timestamps
+        df[TIMESTAMP_COLUMN], _ = parse_timestamps(
+            df[TIMESTAMP_COLUMN], name=name
+        )
+    return df
+
+
+def read_study_csv(path, compact=False):
+    """
+    Read only the REQUIRED_COLUMNS of a Movebank CSV with their dtypes
+    and a parsed timestamp, plus any OPTIONAL_COLUMN_DTYPES it has.
+    Missing required columns are logged as a warning and added empty so
+    every study has the same schema.
+    Identifiers are categoricals with compact, otherwise they have the
+    dtypes read_csv infers, so numeric tags stay numbers.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    df = _read_typed_csv(path, header, _study_columns(header))
+    return _conform_schema(df, header, path.name, compact)
+
+
+def read_study_chunks(path, chunksize, compact=False):
+    """
+    Read a study like read_study_csv, chunksize rows at a time.
+    Yields DataFrames with the same schema.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    columns = _study_columns(header)
+    reader = pd.read_csv(
+        path,
+        usecols=lambda col: col in columns,
+        dtype=_read_dtypes(header),
+        chunksize=chunksize,
+    )
+    with reader:
+        for chunk in reader:
+            chunk = _parse_timestamp_column(chunk, path.name)
+            yield _conform_schema(chunk, header, path.name, compact)
+
+
+def staged_path(path, staging_dir=staging_directory):
+    # Parquet copy of a raw CSV
+    return Path(staging_dir) / f"{path.stem}.parquet"
+
+
+def stage_study(path, staging_dir=staging_directory):
+    """
+    Convert a whole raw CSV into a typed Parquet file once.
+
+    Every column is kept so later stages can project whatever they
+    need. Known columns use the dtype map, other text columns are
+    stored as strings. Written through a temporary file.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    df = _read_typed_csv(path, header)
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype("string")
+
+    target = staged_path(path, staging_dir)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_write(target) as tmp_path:
+        df.to_parquet(tmp_path, index=False)
+    logger.info(f"Staged {path.name} as {target.name}")
+    return target
+
+
+def read_study(path, staging=False, staging_dir=staging_directory,
+               compact=False):
+    """
+    Read the required columns of a study, see read_study_csv.
+
+    With staging, the Parquet copy is read with column projection and
+    the CSV is only parsed (and re-staged) when it is newer than the
+    copy or no copy exists yet.
+    """
+    if not staging:
+        return read_study_csv(path, compact)
+
+    target = staged_path(path, staging_dir)
+    if (
+        not target.exists()
+        or target.stat().st_mtime_ns < path.stat().st_mtime_ns
+    ):
+        stage_study(path, staging_dir)
+
+    columns = pq.read_schema(target).names
+    df = pd.read_parquet(
+        target,
+        columns=[col for col in _study_columns(columns) if col in columns],
+    )
+    return _conform_schema(df, columns, path.name, compact)
+
+
+def _read_study_timed(path, staging=False, compact=False):
+    """
+    Read one study and log how long it took.
+    Returns the DataFrame.
+    """
+    start = time.perf_counter()
+    df = read_study(path, staging=staging, compact=compact)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    size_mb = _file_size(path) / 1e6
+    logger.info(
+        f"Read {path.name}: {len(df)} rows, {size_mb:.1f} MB in "
+        f"{elapsed:.2f}s ({size_mb / elapsed:.1f} MB/s, "
+        f"{len(df) / elapsed:.0f} rows/s)"
+    )
+    return df
+
+
+def extract_files_to_df(file_paths, workers=None, staging=False,
+                        compact=False) -> dict:
     """
     Load all CSVs listed by create_file_list() into DataFrames.
     Returns a dictionary {df_name: DataFrame}.
+
+    Only REQUIRED_COLUMNS are parsed, see read_study_csv for compact.
+    With staging
+    they come from a Parquet copy of each CSV instead, see read_study.
+    Files are read concurrently in a thread pool, largest first, so the
+    total time is close to the slowest file. workers caps the pool size,
+    None lets ThreadPoolExecutor pick. Keys keep the order of file_paths
+    and any file that fails to load still raises.
     """
     # Set up data dictionary to store file names and dataframes
     data_dict = {}
+    file_paths = list(file_paths)
     logger.info("Starting CSV extraction into DataFrames.")
 
-    # Loop through every path in file path folder and convert it to a dataframe
+    # Biggest files start first so they do not finish last on their own
+    schedule = sorted(file_paths, key=_file_size, reverse=True)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            path: pool.submit(_read_study_timed, path, staging, compact)
+            for path in schedule
+        }
+
+        # Loop through every path in file path folder in the given order
+        for path in file_paths:
+            # Set up try expect block
+            try:
+                df = futures[path].result()
+                # Pull out the csv name
+                df_name = path.name.split(".", 1)[0]
+                # Save the df under the file name
+                data_dict[df_name] = df
+                # Display the name, path and length
+                logger.info(
+                    f"Loaded {df_name} from {path.name} with {len(df)} rows."
+                )
+            # Raise an exception with an error.
+            except Exception as e:
+                logger.error(f"Failed to load {path.name}: {e}")
+                # Do not start files still waiting in the queue
+                for future in futures.values():
+                    future.cancel()
+                raise
+    # Log the number of files used.
+    logger.info(f"Extraction complete. Loaded {len(data_dict)} DataFrames.")
+    return data_dict
+
+
+def iter_files_to_df(file_paths, staging=False, compact=False):
+    """
+    Yield (df_name, DataFrame) for each file in order, reading one file
+    at a time so only the current study is held in memory.
+    """
     for path in file_paths:
-        # Set up try expect block
         try:
-            # Convert to dataframe
-            df = pd.read_csv(path)
-            # Pull out the csv name
-            df_name = path.name.split(".", 1)[0]
-            # Save the df under the file name
-            data_dict[df_name] = df
-            # Display the name, path and length
-            logger.info(
-                f"Loaded {df_name} from {path.name} with {len(df)} rows."
-            )
-        # Raise an exception with an error.
+            df = _read_study_timed(path, staging, compact)
         except Exception as e:
             logger.error(f"Failed to load {path.name}: {e}")
             raise
-    # Log the number of files used.
-    logger.info(f"Extraction complete. Loaded {len(data_dict)} DataFrames.")
-    return data_dict
+        df_name = path.name.split(".", 1)[0]
+        logger.info(f"Loaded {df_name} from {path.name} with {len(df)} rows.")
+        yield df_name, df
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+import pandas as pd
+from src.utils.file_utils import atomic_write
+from src.utils.logging_utils import setup_logger
+
+logger = setup_logger(__name__, "Manifest.log", level=logging.DEBUG)
+
+# Cleaned studies and the manifest describing them live here
+root_directory = Path(__file__).resolve().parents[2]
+cache_directory = root_directory / "data" / "cache"
+
+# Bump when cleaning changes so every cached study is rebuilt
+CACHE_VERSION = 4
+
+
+def _cache_path(cache_dir=None):
+    # cache_directory is looked up on each call, so it can be moved
+    return Path(cache_directory if cache_dir is None else cache_dir)
+
+
+def _output_files(output):
+    # A spilled study is cached as a list of partition files
+    if output is None:
+        return []
+    return [output] if isinstance(output, str) else list(output)
+
+
+def study_name(path) -> str:
+    # Same naming as extract_files_to_df
+    return Path(path).name.split(".", 1)[0]
+
+
+def file_sha256(path, chunk_size=1 << 20) -> str:
+    """
+    Hash a file in chunks so large studies are not loaded at once.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path, previous=None) -> dict:
+    """
+    Size, modification time and content hash of a raw file.
+
+    When size and mtime match the previous fingerprint the stored hash
+    is reused, so unchanged files are never re-read.
+    """
+    stat = Path(path).stat()
+    fingerprint = {
+        "source": Path(path).name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    if (
+        previous
+        and previous.get("size") == stat.st_size
+        and previous.get("mtime_ns") == stat.st_mtime_ns
+    ):
+        fingerprint["sha256"] = previous["sha256"]
+    else:
+        fingerprint["sha256"] = file_sha256(path)
+    return fingerprint
+
+
+def load_manifest(cache_dir=None) -> dict:
+    """
+    Read the manifest, or start an empty one if there is none or it was
+    written by an older version of the cleaning code.
+    """
+    manifest_path = _cache_path(cache_dir) / "manifest.json"
+    empty = {"version": CACHE_VERSION, "studies": {}}
+    if not manifest_path.exists():
+        return empty
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return empty
+    if manifest.get("version") != CACHE_VERSION:
+        logger.info("Manifest version changed, rebuilding every study")
+        return empty
+    return manifest
+
+
+def save_manifest(manifest, cache_dir=None):
+    """
+    Write the manifest through a temporary file so readers never see a
+    half written one.
+    """
+    cache_dir = _cache_path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with atomic_write(cache_dir / "manifest.json") as tmp_path:
+        tmp_path.write_text(json.dumps(manifest, indent=2))
+
+
+def split_changed_files(file_paths, manifest, cache_dir=None,
+                        compact=False):
+    """
+    Return the raw files that are new or changed since the last run.
+
+    The manifest is rebuilt in file_paths order: unchanged studies keep
+    their entry, changed ones get a fresh fingerprint with no output
+    yet, and studies whose file is gone are dropped. Each entry records
+    compact, the cleaned copy of a study cleaned with the other setting
+    is stale too.
+    """
+    cache_dir = _cache_path(cache_dir)
+    previous = manifest["studies"]
+    studies = {}
+    changed = []
+    for path in file_paths:
+        name = study_name(path)
+        old = previous.get(name)
+        fingerprint = file_fingerprint(path, old)
+        output = old.get("output") if old else None
+        cached = (
+            output is not None
+            and old["sha256"] == fingerprint["sha256"]
+            and old.get("compact", False) == compact
+            and all((cache_dir / f).exists() for f in _output_files(output))
+        )
+        if cached:
+            studies[name] = {**fingerprint, "compact": compact,
+                             "output": output}
+        else:
+            # Stale cleaned copy of the old file
+            for f in _output_files(output):
+                (cache_dir / f).unlink(missing_ok=True)
+            studies[name] = {**fingerprint, "compact": compact,
+                             "output": None}
+            changed.append(path)
+
+    removed = set(previous) - set(studies)
+    for name in removed:
+        for f in _output_files(previous[name].get("output")):
+            (cache_dir / f).unlink(missing_ok=True)
+    manifest["studies"] = studies
+
+    logger.info(
+        f"{len(changed)} new or changed studies, "
+        f"{len(studies) - len(changed)} reused, {len(removed)} removed"
+    )
+    return changed
+
+
+def study_input_keys(manifest, compact=False, registry=None) -> dict:
+    """
+    Key per study of everything its processed output is built from:
+    the raw file, the cleaning version, compact and the generation of
+    the track registry. The load stage only rewrites studies whose key
+    changed.
+    """
+    return {
+        name: hashlib.sha256(
+            f"{entry['sha256']}\0{CACHE_VERSION}\0{compact}\0{registry}"
+            .encode()
+        ).hexdigest()
+        for name, entry in manifest["studies"].items()
+    }
+
+
+def store_cleaned_study(manifest, name, df, cache_dir=None, part=None):
+    """
+    Save a cleaned study next to the manifest and record it.
+    The file is named by study and source hash so stale copies never
+    match. part numbers the cleaned partitions of a spilled study,
+    each saved to its own file and added to the study's list, so the
+    study is never held whole.
+    """
+    cache_dir = _cache_path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    entry = manifest["studies"][name]
+    key = hashlib.sha256(f"{name}\0{entry['sha256']}".encode()).hexdigest()
+    if part is None:
+        output = f"{key[:16]}.pkl"
+    else:
+        output = f"{key[:16]}-{part:05d}.pkl"
+    with atomic_write(cache_dir / output) as tmp_path:
+        df.to_pickle(tmp_path)
+    if part is None:
+        entry["output"] = output
+    else:
+        # Partition 0 starts the list
+        done = [] if part == 0 else _output_files(entry["output"])
+        entry["output"] = done + [output]
+
+
+def iter_cleaned_study(manifest, name, cache_dir=None):
+    """
+    Yield a cached cleaned study recorded in the manifest, one frame
+    per cached file, so a spilled study comes back a partition at a
+    time.
+    """
+    cache_dir = _cache_path(cache_dir)
+    for output in _output_files(manifest["studies"][name]["output"]):
+        yield pd.read_pickle(cache_dir / output)
+
+
+def load_cleaned_study(manifest, name, cache_dir=None):
+    """
+    Read a cached cleaned study recorded in the manifest, the
+    partitions of a spilled study joined in order.
+    """
+    frames = list(iter_cleaned_study(manifest, name, cache_dir))
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
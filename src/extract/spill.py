@@ -0,0 +1,260 @@
+import itertools
+import logging
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.extract.extract_files_into_df import (
+    COLUMN_DTYPES,
+    OPTIONAL_COLUMN_DTYPES,
+    TIMESTAMP_COLUMN,
+    infer_identifiers,
+    read_study_chunks,
+    root_directory,
+)
+from src.utils.logging_utils import setup_logger
+
+logger = setup_logger(__name__, "Spill.log", level=logging.DEBUG)
+
+# On-disk partitions of studies too big to clean in memory
+spill_directory = root_directory / "data" / "spill"
+
+# Peak memory of cleaning and combining over the size of the frame
+# read in, measured on a 300k row study. Sorted copies, metric arrays
+# and the text columns of the combined schema make up the difference
+CLEANING_OVERHEAD = 10
+
+# A track is one individual and tag. Tracks are only split across
+# partitions when one alone is over the budget, see track_time_cuts
+TRACK_KEY = ["individual-local-identifier", "tag-local-identifier"]
+
+# dtype of every column a partition can hold
+SPILL_DTYPES = {**COLUMN_DTYPES, **OPTIONAL_COLUMN_DTYPES}
+
+
+def spill_schema(columns):
+    # Parquet schema of a partition, identifiers are kept as text
+    return pa.schema([
+        (col, pa.timestamp("ns")) if col == TIMESTAMP_COLUMN
+        else (col, pa.float64()) if SPILL_DTYPES[col] == "float64"
+        else (col, pa.string())
+        for col in columns
+    ])
+
+
+def _bytes_per_row(path, sample_rows):
+    """
+    In-memory bytes per row of the typed required columns and CSV bytes
+    per line, both from the first sample_rows rows.
+    """
+    with open(path, "rb") as f:
+        f.readline()
+        lines = list(itertools.islice(f, sample_rows))
+    if not lines:
+        return 0, 0
+    sample = next(read_study_chunks(path, len(lines), compact=True))
+    memory = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    return memory, sum(len(line) for line in lines) / len(lines)
+
+
+def estimate_study_bytes(path, sample_rows=10_000):
+    """
+    Estimated memory of a study once read, from a sample of its rows
+    scaled up by the file size.
+    """
+    memory, line_bytes = _bytes_per_row(path, sample_rows)
+    if not line_bytes:
+        return 0
+    return int(path.stat().st_size / line_bytes * memory)
+
+
+def needs_spill(path, memory_budget):
+    # Too big to read and clean in one go within the budget
+    return estimate_study_bytes(path) * CLEANING_OVERHEAD > memory_budget
+
+
+def count_tracks(path, chunksize=100_000):
+    """
+    Rows per (individual, tag) track, sorted the way clean_data sorts
+    tracks. Rows missing either key are left out, cleaning drops them.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    if not all(col in header for col in TRACK_KEY):
+        logger.warning(f"{path.name} has no track key columns")
+        return pd.Series(dtype="int64")
+    reader = pd.read_csv(path, usecols=TRACK_KEY, dtype=str,
+                         chunksize=chunksize)
+    with reader:
+        counts = [chunk[TRACK_KEY].value_counts() for chunk in reader]
+    if not counts:
+        return pd.Series(dtype="int64")
+    # Each chunk only holds its own counts, add them up per track
+    return pd.concat(counts).groupby(level=[0, 1]).sum().sort_index()
+
+
+def pack_tracks(counts, target_rows):
+    """
+    Give consecutive tracks the same partition until it would pass
+    target_rows. A track bigger than target_rows gets one of its own.
+    Returns the partition of each track, indexed like counts.
+    """
+    partition = np.zeros(len(counts), dtype="int64")
+    current, rows = 0, 0
+    for i, size in enumerate(counts.to_numpy()):
+        if rows and rows + size > target_rows:
+            current, rows = current + 1, 0
+        partition[i] = current
+        rows += size
+    return pd.Series(partition, index=counts.index)
+
+
+def _track_positions(chunk, tracks):
+    # Position of each row's track in tracks, -1 without a track key
+    keys = pd.MultiIndex.from_frame(chunk[TRACK_KEY])
+    return tracks.get_indexer(keys)
+
+
+def _timestamps_ns(chunk):
+    # int64 nanoseconds, NaT becomes the smallest int64
+    return chunk[TIMESTAMP_COLUMN].to_numpy(dtype="datetime64[ns]").view(
+        "int64"
+    )
+
+
+def track_time_cuts(path, counts, target_rows, chunksize):
+    """
+    Cut every track longer than target_rows into slices of about
+    target_rows rows by time.
+
+    Only the timestamps of those tracks are held, 8 bytes a row. Cuts
+    fall between distinct timestamps, so fixes at the same time, and
+    so any duplicates, stay in one slice. Rows without a timestamp go
+    to the first slice, cleaning drops them.
+    Returns {position in counts: (cut timestamps, rows per slice)}.
+    """
+    long_tracks = np.nonzero(counts.to_numpy() > target_rows)[0]
+    if not len(long_tracks):
+        return {}
+    times = {i: [] for i in long_tracks}
+    for chunk in read_study_chunks(path, chunksize, compact=True):
+        position = _track_positions(chunk, counts.index)
+        t_ns = _timestamps_ns(chunk)
+        for i in np.intersect1d(position, long_tracks):
+            times[i].append(t_ns[position == i])
+
+    cuts = {}
+    for i, parts in times.items():
+        t_ns = np.sort(np.concatenate(parts))
+        valid = t_ns[t_ns != np.iinfo("int64").min]
+        bounds = np.unique(valid[target_rows::target_rows])
+        slices = np.searchsorted(bounds, t_ns, side="right")
+        cuts[i] = (bounds, np.bincount(slices, minlength=len(bounds) + 1))
+        logger.warning(
+            f"{path.name} track {counts.index[i]} has {len(t_ns)} rows, "
+            f"over the {target_rows} the budget allows, split by time "
+            f"into {len(bounds) + 1} partitions"
+        )
+    return cuts
+
+
+def _slice_partitions(counts, cuts, target_rows):
+    """
+    Pack whole tracks and the time slices of long tracks into
+    partitions. Returns the first slice of each track and the
+    partition of each slice.
+    """
+    sizes = []
+    first_slice = np.zeros(len(counts), dtype="int64")
+    for i, size in enumerate(counts.to_numpy()):
+        first_slice[i] = len(sizes)
+        sizes.extend(cuts[i][1] if i in cuts else [size])
+    partition = pack_tracks(pd.Series(sizes, dtype="int64"), target_rows)
+    return first_slice, partition.to_numpy()
+
+
+def spill_study(path, memory_budget, spill_dir=None,
+                chunksize=None):
+    """
+    Split a study into Parquet partitions of whole tracks.
+
+    The CSV is read chunksize rows at a time, by default the partition
+    size so a chunk fits the budget too. Tracks are packed in
+    clean_data sort order into partitions that fit the memory budget,
+    so cleaning the partitions one by one and joining them gives the
+    same rows in the same order as cleaning the whole study. A track
+    over the budget on its own is cut by time over several partitions,
+    see track_time_cuts. clean_spilled_study carries its last kept fix
+    from one partition into the next.
+    Returns the partition files in order.
+    """
+    memory, _ = _bytes_per_row(path, 10_000)
+    target_rows = max(int(memory_budget / CLEANING_OVERHEAD / memory), 1)
+    chunksize = chunksize or max(target_rows, 1000)
+    counts = count_tracks(path, chunksize)
+    cuts = track_time_cuts(path, counts, target_rows, chunksize)
+    first_slice, partition_of = _slice_partitions(counts, cuts, target_rows)
+    n_partitions = int(partition_of.max()) + 1 if len(partition_of) else 0
+
+    spill_dir = Path(spill_directory if spill_dir is None else spill_dir)
+    spill_dir.mkdir(parents=True, exist_ok=True)
+    out_dir = Path(tempfile.mkdtemp(prefix=f"{path.stem[:40]}-",
+                                    dir=spill_dir))
+    partitions = [out_dir / f"{i:05d}.parquet" for i in range(n_partitions)]
+    writers = {}
+    dropped = 0
+    try:
+        for chunk in read_study_chunks(path, chunksize, compact=True):
+            schema = spill_schema(chunk.columns)
+            for col in chunk.columns:
+                if SPILL_DTYPES.get(col) == "category":
+                    chunk[col] = chunk[col].astype(object)
+            index = _track_positions(chunk, counts.index)
+            slices = np.where(index >= 0, first_slice[index], -1)
+            if cuts:
+                t_ns = _timestamps_ns(chunk)
+                for i, (bounds, _) in cuts.items():
+                    rows = index == i
+                    slices[rows] += np.searchsorted(
+                        bounds, t_ns[rows], side="right"
+                    )
+            part = np.where(slices >= 0, partition_of[slices], -1)
+            dropped += int((part < 0).sum())
+            for p, rows in chunk.groupby(part, sort=False):
+                if p < 0:
+                    continue
+                if p not in writers:
+                    writers[p] = pq.ParquetWriter(partitions[p], schema)
+                writers[p].write_table(pa.Table.from_pandas(
+                    rows, schema=schema, preserve_index=False
+                ))
+    except Exception as e:
+        logger.error(f"Spilling {path.name} failed: {e}")
+        for writer in writers.values():
+            writer.close()
+        shutil.rmtree(out_dir, ignore_errors=True)
+        raise
+    for writer in writers.values():
+        writer.close()
+
+    logger.info(
+        f"Spilled {path.name} into {n_partitions} partitions of up to "
+        f"{target_rows} rows, {dropped} rows without a track key dropped"
+    )
+    return partitions
+
+
+def read_partition(path, compact=False):
+    # A spilled partition with the dtypes read_study_csv gives
+    df = pd.read_parquet(path)
+    df = df.astype({col: dtype for col, dtype in SPILL_DTYPES.items()
+                    if dtype == "category" and col in df.columns})
+    return df if compact else infer_identifiers(df)
+
+
+def remove_spilled_study(partitions):
+    # Partitions of one study share a directory
+    if partitions:
+        shutil.rmtree(Path(partitions[0]).parent, ignore_errors=True)
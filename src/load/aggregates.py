@@ -0,0 +1,161 @@
+import logging
+from pathlib import Path
+import pandas as pd
+from src.utils.file_utils import atomic_write
+from src.utils.logging_utils import setup_logger
+from src.load.load import ROW_GROUP_ROWS, open_dataset, output_dir
+
+logger = setup_logger(__name__, "Load_aggregates.log", level=logging.DEBUG)
+
+# Small tables derived from the dataset, read by the app as they are
+daily_summary_path = output_dir / "daily_summary.parquet"
+species_rankings_path = output_dir / "species_rankings.parquet"
+
+DAY_KEYS = [
+    "study_name",
+    "individual_local_identifier",
+    "individual_taxon_canonical_name",
+    "obs_date",
+]
+SOURCE_COLUMNS = [
+    "timestamp",
+    "individual_local_identifier",
+    "individual_taxon_canonical_name",
+    "study_name",
+    "distance_from_prev_m",
+    "speed_mps",
+]
+# Individuals tracked on fewer days are left out of the rankings
+MIN_DAYS = 5
+
+
+def _day_totals(df):
+    # Sums per individual and day of one batch, combined later
+    df = df.assign(
+        obs_date=df["timestamp"].dt.normalize(),
+        fix_count=1,
+    )
+    return df.groupby(DAY_KEYS, observed=True, dropna=False).agg(
+        distance_m=("distance_from_prev_m", "sum"),
+        speed_sum=("speed_mps", "sum"),
+        fix_count=("fix_count", "sum"),
+    )
+
+
+def daily_summary(frames):
+    """
+    One row per study, individual, species and day: distance covered
+    in metres, mean speed and number of fixes.
+
+    frames is an iterable of combined DataFrames. Each is reduced on
+    its own and the partial sums are added up, so the whole dataset is
+    never in memory. Rows are sorted by the keys.
+    """
+    partials = [_day_totals(df) for df in frames]
+    if not partials:
+        return pd.DataFrame(columns=DAY_KEYS + [
+            "distance_m", "mean_speed_mps", "fix_count"
+        ])
+    totals = pd.concat(partials)
+    if len(partials) > 1:
+        totals = totals.groupby(level=DAY_KEYS, dropna=False).sum()
+    totals = totals.sort_index()
+    totals["mean_speed_mps"] = totals["speed_sum"] / totals["fix_count"]
+    return totals.reset_index()[DAY_KEYS + [
+        "distance_m", "mean_speed_mps", "fix_count"
+    ]]
+
+
+def species_rankings(daily, min_days=MIN_DAYS):
+    """
+    Mean daily distance and mean speed per species, over individuals
+    tracked on at least min_days days, ranked from the highest (1).
+
+    An individual's speed is the mean over all its fixes, the daily
+    means weighted by fix count, since cleaning leaves no speed empty.
+    Individuals are matched by identifier alone, as the Cetacean
+    Olympics page always did.
+    """
+    daily = daily.assign(
+        speed_sum=daily["mean_speed_mps"] * daily["fix_count"]
+    )
+    individuals = daily.groupby(
+        "individual_local_identifier", as_index=False, observed=True
+    ).agg(
+        total_distance_m=("distance_m", "sum"),
+        days_observed=("obs_date", "nunique"),
+        speed_sum=("speed_sum", "sum"),
+        fix_count=("fix_count", "sum"),
+        species=("individual_taxon_canonical_name", "first"),
+    )
+    individuals = individuals[individuals["days_observed"] >= min_days]
+    individuals = individuals.assign(
+        daily_km=individuals["total_distance_m"] / 1000
+        / individuals["days_observed"],
+        avg_speed_mps=individuals["speed_sum"] / individuals["fix_count"],
+    )
+
+    rankings = individuals.groupby("species", as_index=False).agg(
+        mean_daily_km=("daily_km", "mean"),
+        mean_speed=("avg_speed_mps", "mean"),
+        No=("individual_local_identifier", "count"),
+    )
+    rankings["distance_rank"] = rankings["mean_daily_km"].rank(
+        ascending=False, method="first"
+    ).astype(int)
+    rankings["speed_rank"] = rankings["mean_speed"].rank(
+        ascending=False, method="first"
+    ).astype(int)
+    return rankings
+
+
+def _write_table(df, path):
+    # Through a temporary file, readers never see a partial table
+    with atomic_write(path) as tmp_path:
+        df.to_parquet(tmp_path, index=False)
+    return path
+
+
+def write_summaries(root=None, manifest=None, daily_path=None,
+                    rankings_path=None):
+    """
+    Materialize the daily summary and the species rankings from the
+    Parquet dataset, or the staged version in manifest.
+    Only the columns they need are read, a record batch at a time.
+    """
+    daily_path = Path(daily_summary_path if daily_path is None
+                      else daily_path)
+    rankings_path = Path(species_rankings_path if rankings_path is None
+                         else rankings_path)
+    try:
+        dataset = open_dataset(root, manifest)
+        daily = daily_summary(
+            batch.to_pandas() for batch in dataset.to_batches(
+                columns=SOURCE_COLUMNS, batch_size=ROW_GROUP_ROWS
+            )
+        )
+        rankings = species_rankings(daily)
+        _write_table(daily, daily_path)
+        _write_table(rankings, rankings_path)
+    except Exception as e:
+        logger.error(f"Writing the summary tables failed: {e}")
+        raise
+    logger.info(
+        f"Summary tables written, {len(daily)} individual days, "
+        f"{len(rankings)} species ranked"
+    )
+    return daily_path, rankings_path
+
+
+def read_daily_summary(columns=None, path=None):
+    # The per individual per day table, see daily_summary
+    return pd.read_parquet(
+        daily_summary_path if path is None else path, columns=columns
+    )
+
+
+def read_species_rankings(path=None):
+    # The per species table behind the Cetacean Olympics page
+    return pd.read_parquet(
+        species_rankings_path if path is None else path
+    )
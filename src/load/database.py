@@ -0,0 +1,343 @@
+import json
+import logging
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import sqlalchemy as sa
+from src.utils.logging_utils import setup_logger
+from src.load.load import (
+    ROW_GROUP_ROWS,
+    dataset_dir,
+    open_dataset,
+    output_dir,
+    read_version,
+)
+
+logger = setup_logger(__name__, "Load_database.log", level=logging.DEBUG)
+
+# Local SQLite copy of the processed dataset, for indexed queries
+database_path = output_dir / "whales.db"
+TABLE_NAME = "whales"
+# Rows bound per executemany call, all inside one transaction
+INSERT_BATCH_ROWS = 50_000
+
+metadata = sa.MetaData()
+whales = sa.Table(
+    TABLE_NAME, metadata,
+    sa.Column("track_id", sa.Integer),
+    sa.Column("study_tag_id", sa.Text),
+    # Stored as SQLAlchemy writes DateTime on SQLite, so text order is
+    # time order and range queries can use the index
+    sa.Column("timestamp", sa.DateTime),
+    sa.Column("location_lat", sa.Float),
+    sa.Column("location_lon", sa.Float),
+    sa.Column("distance_from_prev_m", sa.Float),
+    sa.Column("time_diff_s", sa.Float),
+    sa.Column("speed_mps", sa.Float),
+    sa.Column("individual_local_identifier", sa.Text),
+    sa.Column("tag_local_identifier", sa.Text),
+    sa.Column("individual_taxon_canonical_name", sa.Text),
+    sa.Column("study_name", sa.Text),
+    # Raw study file the row came from, what loads upsert and delete by
+    sa.Column("study_file", sa.Text),
+)
+# Dataset files each study file was loaded from, to sync only the
+# studies that changed since
+loaded = sa.Table(
+    "loaded_studies", metadata,
+    sa.Column("study_file", sa.Text, primary_key=True),
+    sa.Column("inputs", sa.Text),
+    sa.Column("files", sa.Text),
+)
+INDEXES = [
+    sa.Index("ix_whales_track_time", whales.c.study_tag_id,
+             whales.c.timestamp),
+    sa.Index("ix_whales_species", whales.c.individual_taxon_canonical_name),
+    sa.Index("ix_whales_study", whales.c.study_name),
+    sa.Index("ix_whales_study_file", whales.c.study_file),
+]
+INSERT_SQL = (
+    f"INSERT INTO {TABLE_NAME} ({', '.join(whales.c.keys())}) "
+    f"VALUES ({', '.join('?' * len(whales.c))})"
+)
+
+
+def _set_pragmas(dbapi_connection, connection_record):
+    # WAL lets the app keep reading while a load is running, and with
+    # WAL a commit only needs to sync the log
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def get_engine(path=None):
+    """
+    SQLAlchemy engine on the SQLite database, created if missing.
+    """
+    path = Path(database_path if path is None else path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    engine = sa.create_engine(f"sqlite:///{path}")
+    sa.event.listen(engine, "connect", _set_pragmas)
+    return engine
+
+
+def _column_values(df, name):
+    """
+    One column of df as a list of Python values SQLite can bind.
+    Missing columns and values are NULL.
+    """
+    if name not in df.columns:
+        return [None] * len(df)
+    col = df[name]
+    if name == "timestamp":
+        # Arrow formats timestamps as SQLAlchemy's SQLite DateTime does
+        return pa.array(
+            col.to_numpy(dtype="datetime64[us]")
+        ).cast(pa.string()).to_pylist()
+    if pd.api.types.is_numeric_dtype(col.dtype):
+        # NaN is stored as NULL
+        return col.to_numpy().tolist()
+    # Text columns, each distinct label converted once
+    codes, uniques = pd.factorize(col)
+    labels = np.array([str(u) for u in uniques] + [None], dtype=object)
+    return labels[codes].tolist()
+
+
+def _rows(df):
+    # Row tuples in table column order, built column-wise
+    return list(zip(*(_column_values(df, name) for name in whales.c.keys())))
+
+
+def _insert(conn, df):
+    # Batched executemany straight on the driver, no per-row processing
+    for start in range(0, len(df), INSERT_BATCH_ROWS):
+        conn.exec_driver_sql(
+            INSERT_SQL, _rows(df.iloc[start:start + INSERT_BATCH_ROWS])
+        )
+
+
+def _create_tables(conn):
+    # Tables from before rows recorded their study file are rebuilt
+    inspector = sa.inspect(conn)
+    if inspector.has_table(TABLE_NAME) and "study_file" not in {
+        col["name"] for col in inspector.get_columns(TABLE_NAME)
+    }:
+        logger.warning("Database has no study_file column, rebuilding it")
+        whales.drop(conn)
+        loaded.drop(conn, checkfirst=True)
+    metadata.create_all(conn)
+
+
+def append_combined_sql(frames, path=None, expected_rows=None, keep=None,
+                        studies=None, version=None):
+    """
+    Upsert an iterable of combined DataFrames into the database, by
+    study file, in a single transaction.
+
+    Rows are keyed on their study_file column, the raw study file they
+    came from, or on study_name in frames without one. The first time a
+    study file is seen its old rows are deleted, so a re-load replaces
+    the studies it contains and keeps the others. With keep, the rows
+    of every other study file are deleted first.
+    studies, {study file: version manifest entry}, records which
+    dataset files each loaded study came from, see loaded_studies.
+    version records the dataset version the database now holds, see
+    database_version.
+    When the table is empty, or expected_rows says the load is at least
+    half its size, the indexes are dropped and built once at the end,
+    which is much cheaper than updating them on every insert.
+    """
+    engine = get_engine(path)
+    rows = 0
+    seen = set()
+    removed = []
+    try:
+        with engine.begin() as conn:
+            _create_tables(conn)
+            if keep is not None:
+                removed = sorted(_study_files(conn) - set(keep))
+                _delete_studies(conn, removed)
+            existing = conn.scalar(
+                sa.select(sa.func.count()).select_from(whales)
+            )
+            if existing == 0 or (
+                expected_rows is not None and 2 * expected_rows >= existing
+            ):
+                for index in INDEXES:
+                    index.drop(conn, checkfirst=True)
+            for df in frames:
+                if "study_file" not in df.columns:
+                    df = df.assign(study_file=df["study_name"])
+                files = set(df["study_file"].dropna().astype(str).unique())
+                _delete_studies(conn, sorted(files - seen))
+                seen |= files
+                _insert(conn, df)
+                rows += len(df)
+            for index in INDEXES:
+                index.create(conn, checkfirst=True)
+            if studies:
+                conn.execute(loaded.insert(), [
+                    {"study_file": name, **_loaded_entry(entry)}
+                    for name, entry in studies.items()
+                ])
+            if version is not None:
+                # Part of the transaction, like the rows
+                conn.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+    except Exception as e:
+        logger.error(f"Database load failed: {e}")
+        raise
+    finally:
+        engine.dispose()
+    logger.info(
+        f"Database loaded, {rows} rows over {len(seen)} study files, "
+        f"{len(removed)} study files removed"
+    )
+    return Path(database_path if path is None else path)
+
+
+def _study_files(conn):
+    # Study files with rows or a loaded entry, from the index
+    return {
+        name for name, in conn.execute(
+            sa.select(whales.c.study_file).distinct()
+        ) if name is not None
+    } | set(conn.execute(sa.select(loaded.c.study_file)).scalars())
+
+
+def _delete_studies(conn, names):
+    # Rows and loaded entry of each study file
+    if names:
+        conn.execute(whales.delete().where(whales.c.study_file.in_(names)))
+        conn.execute(loaded.delete().where(loaded.c.study_file.in_(names)))
+
+
+def _loaded_entry(entry):
+    # What loaded_studies records of a version manifest entry
+    return {"inputs": entry["inputs"], "files": json.dumps(entry["files"])}
+
+
+def loaded_studies(path=None) -> dict:
+    """
+    {study file: {"inputs", "files"}} as recorded when each study was
+    loaded from the dataset. Empty for a new database.
+    """
+    path = Path(database_path if path is None else path)
+    if not path.exists():
+        return {}
+    engine = get_engine(path)
+    try:
+        with engine.connect() as conn:
+            if not sa.inspect(conn).has_table(loaded.name):
+                return {}
+            return {
+                row.study_file: {"inputs": row.inputs, "files": row.files}
+                for row in conn.execute(sa.select(loaded))
+            }
+    finally:
+        engine.dispose()
+
+
+def database_version(path=None) -> int:
+    """
+    Version of the Parquet dataset the database holds, 0 when it was
+    never loaded from one.
+    """
+    path = Path(database_path if path is None else path)
+    if not path.exists():
+        return 0
+    engine = get_engine(path)
+    try:
+        with engine.connect() as conn:
+            return conn.exec_driver_sql("PRAGMA user_version").scalar()
+    finally:
+        engine.dispose()
+
+
+def save_combined_sql(combined_data, path=None):
+    """
+    Upsert one combined DataFrame, see append_combined_sql.
+    """
+    return append_combined_sql(
+        [combined_data], path, expected_rows=len(combined_data)
+    )
+
+
+def export_combined_sql(root=None, path=None, manifest=None):
+    """
+    Bring the database to the published Parquet dataset, or to the
+    staged version in manifest, a record batch at a time, each study
+    whole in dataset order.
+
+    Each study is compared with the inputs and files recorded when it
+    was loaded, see loaded_studies. Only studies that differ are
+    reloaded, and the rows of study files the version does not hold
+    are deleted. However many versions the database is behind, for
+    example after runs without database=True, only the changes are
+    synced. A new database loads every study.
+    """
+    root = Path(dataset_dir if root is None else root)
+    manifest = read_version(root) if manifest is None else manifest
+    recorded = loaded_studies(path)
+    current = {
+        name for name, entry in manifest["studies"].items()
+        if recorded.get(name) == _loaded_entry(entry)
+    }
+    stale = {
+        name: entry for name, entry in manifest["studies"].items()
+        if name not in current
+    }
+    logger.info(
+        f"Syncing database to dataset version {manifest['version']}, "
+        f"{len(stale)} studies to load, {len(current)} up to date"
+    )
+    return append_combined_sql(
+        _study_frames(root, manifest, stale), path,
+        expected_rows=sum(entry["rows"] for entry in stale.values()),
+        keep=current, studies=stale, version=manifest["version"],
+    )
+
+
+def _study_frames(root, manifest, studies):
+    # Record batches of each study, tagged with its study file
+    for name, entry in studies.items():
+        if not entry["files"]:
+            continue
+        dataset = open_dataset(root, {**manifest, "studies": {name: entry}})
+        for batch in dataset.to_batches(batch_size=ROW_GROUP_ROWS):
+            yield batch.to_pandas().assign(study_file=name)
+
+
+def read_database(columns=None, species=None, study=None, track=None,
+                  start=None, end=None, path=None):
+    """
+    Query the database, each filter answered from its index.
+    track is a study_tag_id, start and end bound the timestamp.
+    """
+    table = whales
+    query = sa.select(
+        *(table.c[col] for col in columns) if columns else table.c
+    )
+    if species is not None:
+        query = query.where(
+            table.c.individual_taxon_canonical_name == species
+        )
+    if study is not None:
+        query = query.where(table.c.study_name == study)
+    if track is not None:
+        query = query.where(table.c.study_tag_id == track)
+    if start is not None:
+        query = query.where(table.c.timestamp >= pd.Timestamp(start))
+    if end is not None:
+        query = query.where(table.c.timestamp <= pd.Timestamp(end))
+    engine = get_engine(path)
+    try:
+        with engine.connect() as conn:
+            df = pd.read_sql(query, conn)
+    finally:
+        engine.dispose()
+    if "timestamp" in df.columns:
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
@@ -1,5 +1,16 @@
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from src.utils.file_utils import atomic_write
 from src.utils.logging_utils import setup_logger
 
 # Get the root directory
@@ -10,11 +21,430 @@ root_directory = Path(__file__).resolve().parents[2]
 output_dir = root_directory / "data" / "processed"
 output_dir.mkdir(parents=True, exist_ok=True)
 
+# Processed dataset as Parquet, one directory per species and study
+dataset_dir = output_dir / "whales"
+PARTITION_COLUMNS = ["individual_taxon_canonical_name", "study_name"]
+PARTITIONING = ds.partitioning(
+    pa.schema([(col, pa.string()) for col in PARTITION_COLUMNS]),
+    flavor="hive",
+)
+# Stored as text, so a study whose tags were read as numbers has the
+# same schema as one whose tags are strings
+TEXT_COLUMNS = ["study_tag_id", "individual_local_identifier",
+                "tag_local_identifier"]
+# Directory name of a missing species, what hive readers expect
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+# Published version of the dataset, files starting with _ are not data
+VERSION_FILE = "_version.json"
+# Uncompressed Arrow IPC copy of the dataset, memory-mapped by the app
+store_path = output_dir / "whales.arrow"
+# Optional CSV export of the dataset
+csv_path = output_dir / "combined_cleaned_data.csv"
+# Rows are sorted by time within a partition, so each row group covers
+# a narrow time range and its min/max statistics can skip it
+ROW_GROUP_ROWS = 100_000
+
+
+def _partition_path(root, species, study):
+    # hive style key=value directories, values percent-encoded
+    parts = [
+        f"{col}="
+        + (NULL_PARTITION if pd.isna(value) else quote(str(value), safe=""))
+        for col, value in zip(PARTITION_COLUMNS, (species, study))
+    ]
+    return Path(root).joinpath(*parts)
+
+
+def _write_partition(path, part):
+    """
+    Write one species and study to a Parquet file, sorted by time,
+    without the partition columns, which live in the path.
+    Written through atomic_write, so it is never seen half written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(
+        part.drop(columns=PARTITION_COLUMNS), preserve_index=False
+    )
+    # Categoricals and identifiers are stored as plain strings so every
+    # file has the same schema whatever the run mode. Parquet
+    # dictionary-encodes the pages either way
+    table = table.cast(pa.schema([
+        (f.name, pa.string()) if f.name in TEXT_COLUMNS
+        else (f.name, f.type.value_type) if pa.types.is_dictionary(f.type)
+        else f
+        for f in table.schema
+    ])).replace_schema_metadata(None)
+    with atomic_write(path) as tmp_path:
+        pq.write_table(
+            table, tmp_path, row_group_size=ROW_GROUP_ROWS,
+            write_statistics=True,
+        )
+    return len(part)
+
+
+def write_partitions(df, root, workers=None, files=None, version=0):
+    """
+    Write the combined rows of df under root, one file per species and
+    study, the files in parallel.
+    files counts the files already in each partition directory, so a
+    study written in several frames gets one file per frame. File
+    names carry the dataset version, so they never replace the files
+    of a published version.
+    Returns (path relative to root, rows) of every file.
+    """
+    files = {} if files is None else files
+    root = Path(root)
+    groups = df.groupby(
+        PARTITION_COLUMNS, observed=True, sort=False, dropna=False
+    ).indices
+    timestamps = df["timestamp"].to_numpy()
+    tasks = []
+    for key, rows in groups.items():
+        directory = _partition_path(root, *key)
+        n = files.get(directory, 0)
+        files[directory] = n + 1
+        # Stable, so rows at the same time keep their track order
+        rows = rows[np.argsort(timestamps[rows], kind="stable")]
+        path = directory / f"part-v{version:06d}-{n:05d}.parquet"
+        tasks.append((path, rows))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_write_partition, path, df.take(rows))
+            for path, rows in tasks
+        ]
+        return [
+            (path.relative_to(root).as_posix(), future.result())
+            for (path, _), future in zip(tasks, futures)
+        ]
+
+
+def read_version(root=None) -> dict:
+    """
+    The published version manifest of the dataset: its version number
+    and, per study (raw study file, as in the extract manifest), the
+    files its rows are in and the inputs they were built from.
+    Version 0 when nothing was published yet.
+    """
+    path = Path(dataset_dir if root is None else root) / VERSION_FILE
+    if not path.exists():
+        return {"version": 0, "changed": [], "removed": [], "studies": {}}
+    return json.loads(path.read_text())
+
+
+def dataset_version(root=None) -> int:
+    # What readers poll to notice new data, one small file read
+    return read_version(root)["version"]
+
+
+def stale_studies(inputs, root=None):
+    """
+    Studies in inputs, {study: input key}, whose published files were
+    built from other inputs, or are not published at all.
+    """
+    published = read_version(root)["studies"]
+    return [
+        name for name, key in inputs.items()
+        if published.get(name, {}).get("inputs") != key
+    ]
+
+
+def new_version(current, written, inputs=None):
+    """
+    Version manifest following current, once the files in written,
+    {study: [(path, rows)]} as from write_partitions, are in place.
+
+    Without inputs the written studies are the whole dataset. With
+    inputs, {study: input key} of every study the dataset should hold,
+    studies whose key is unchanged keep their published files and
+    studies missing from inputs are removed.
+    """
+    studies = {
+        name: {
+            "inputs": None if inputs is None else inputs.get(name),
+            "rows": sum(rows for _, rows in files),
+            "files": [path for path, _ in files],
+        }
+        for name, files in written.items()
+    }
+    changed = sorted(studies)
+    if inputs is not None:
+        kept = current["studies"]
+        for name, key in inputs.items():
+            if name in studies:
+                continue
+            if kept.get(name, {}).get("inputs") == key:
+                studies[name] = kept[name]
+            else:
+                # Changed, but no rows left after cleaning
+                studies[name] = {"inputs": key, "rows": 0, "files": []}
+                changed.append(name)
+    return {
+        "version": current["version"] + 1,
+        "published": None,
+        "rows": sum(entry["rows"] for entry in studies.values()),
+        "changed": sorted(changed),
+        "removed": sorted(set(current["studies"]) - set(studies)),
+        "studies": {name: studies[name] for name in sorted(studies)},
+    }
+
+
+def _version_files(manifest):
+    return {
+        path for entry in manifest["studies"].values()
+        for path in entry["files"]
+    }
+
+
+def stage_combined_parquet(studies, inputs=None, workers=None, root=None):
+    """
+    Write the files of the next dataset version, without publishing it.
+    studies yields (study, DataFrame) pairs in the combined schema, a
+    study may come in several frames. Each study owns its files, so it
+    can be replaced on its own. With inputs only the studies in
+    stale_studies are written, see new_version.
+    Returns the unpublished manifest.
+    """
+    root = Path(dataset_dir if root is None else root)
+    current = read_version(root)
+    stale = None if inputs is None else set(stale_studies(inputs, root))
+    written = {}
+    counts = {}
+    try:
+        for name, df in studies:
+            if stale is not None and name not in stale:
+                continue
+            written.setdefault(name, []).extend(write_partitions(
+                df, root, workers, counts, version=current["version"] + 1
+            ))
+    except Exception as e:
+        logger.error(f"Parquet load failed: {e}")
+        remove_files(root, written)
+        raise
+    return new_version(current, written, inputs)
+
+
+def remove_files(root, written):
+    # Files of a version that will not be published
+    for files in written.values():
+        for path, _ in files:
+            (Path(root) / path).unlink(missing_ok=True)
+
+
+def publish_version(manifest, root=None):
+    """
+    Make a staged version the published one by renaming its manifest
+    into place. Files only the version before the previous one used
+    are deleted, readers still on the previous version keep theirs.
+    """
+    root = Path(dataset_dir if root is None else root)
+    root.mkdir(parents=True, exist_ok=True)
+    previous = read_version(root)
+    manifest["published"] = datetime.now(timezone.utc).isoformat()
+    with atomic_write(root / VERSION_FILE) as tmp_path:
+        tmp_path.write_text(json.dumps(manifest, indent=2))
+
+    keep = _version_files(manifest) | _version_files(previous)
+    removed = 0
+    for path in root.rglob("*.parquet"):
+        if path.relative_to(root).as_posix() not in keep:
+            path.unlink()
+            removed += 1
+    for directory in sorted(root.rglob("*"), reverse=True):
+        if directory.is_dir() and not any(directory.iterdir()):
+            directory.rmdir()
+    logger.info(
+        f"Dataset version {manifest['version']} published, "
+        f"{manifest['rows']} rows, {len(manifest['changed'])} studies "
+        f"changed, {len(manifest['removed'])} removed, "
+        f"{removed} old files deleted"
+    )
+    return root
+
+
+def save_combined_parquet(combined_data, workers=None, root=None):
+    """
+    Write the combined dataset as Parquet partitioned by species and
+    study, see write_partitions, and publish it as the next version.
+    """
+    return append_combined_parquet([combined_data], workers, root)
+
+
+def append_combined_parquet(frames, workers=None, root=None):
+    """
+    Write an iterable of combined DataFrames as one dataset version,
+    a frame at a time. Without a source study per frame, each
+    study_name is a study of the version manifest.
+    """
+    studies = (
+        (str(name), part) for df in frames
+        for name, part in df.groupby(
+            "study_name", observed=True, sort=False, dropna=False
+        )
+    )
+    manifest = stage_combined_parquet(studies, workers=workers, root=root)
+    return publish_version(manifest, root)
+
+
+def open_dataset(root=None, manifest=None):
+    """
+    pyarrow dataset of the published version, or of a staged manifest.
+    Only the files the version lists are read, so files being written
+    for the next version are never seen.
+    """
+    root = Path(dataset_dir if root is None else root)
+    manifest = read_version(root) if manifest is None else manifest
+    if not manifest["version"]:
+        # Written before versions were published
+        return ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    return ds.dataset(
+        [str(root / path) for path in sorted(_version_files(manifest))],
+        format="parquet", partitioning=PARTITIONING,
+        partition_base_dir=str(root),
+    )
+
+
+def processed_columns(root=None):
+    # Column names of the processed dataset, without reading any rows
+    return open_dataset(root).schema.names
+
+
+def read_processed(columns=None, filters=None, root=None):
+    """
+    Read the processed Parquet dataset as a DataFrame.
+    columns limits the columns read. filters takes pyarrow filters,
+    e.g. [("study_name", "=", name), ("timestamp", ">=", start)].
+    Species and study filters skip whole directories and time filters
+    skip row groups by their statistics.
+    """
+    return open_dataset(root).to_table(
+        columns=columns,
+        filter=pq.filters_to_expression(filters) if filters else None,
+    ).to_pandas()
+
+
+def _store_dictionaries(dataset, columns):
+    """
+    Sorted distinct values of each text column over the whole dataset,
+    collected a batch at a time.
+    """
+    values = {col: [] for col in columns}
+    for batch in dataset.to_batches(columns=columns):
+        for col in columns:
+            values[col].append(pc.unique(batch.column(col)))
+    dictionaries = {}
+    for col, chunks in values.items():
+        unique = pa.array([], pa.string())
+        if chunks:
+            unique = pc.drop_null(pc.unique(pa.concat_arrays(chunks)))
+        dictionaries[col] = pc.take(unique, pc.sort_indices(unique))
+    return dictionaries
+
+
+def write_arrow_store(root=None, path=None, manifest=None):
+    """
+    Copy the Parquet dataset, or the staged version in manifest, into
+    one uncompressed Arrow IPC file that open_arrow_store can
+    memory-map.
+
+    Text columns are dictionary-encoded against one dictionary per
+    column for the whole file, so they load as categoricals. Written
+    a record batch at a time through a temporary file.
+    """
+    path = Path(store_path if path is None else path)
+    dataset = open_dataset(root, manifest)
+    text = [f.name for f in dataset.schema if pa.types.is_string(f.type)]
+    dictionaries = _store_dictionaries(dataset, text)
+    schema = pa.schema([
+        (f.name, pa.dictionary(pa.int32(), pa.string()))
+        if f.name in dictionaries else f
+        for f in dataset.schema
+    ])
+
+    rows = 0
+    try:
+        # Readers with the old file mapped keep it until they close it
+        with atomic_write(path) as tmp_path, \
+                pa.ipc.new_file(tmp_path, schema) as writer:
+            for batch in dataset.to_batches(
+                columns=schema.names, batch_size=ROW_GROUP_ROWS
+            ):
+                columns = [
+                    pa.DictionaryArray.from_arrays(
+                        pc.index_in(
+                            batch.column(col), value_set=dictionaries[col]
+                        ).cast(pa.int32()),
+                        dictionaries[col],
+                    ) if col in dictionaries else batch.column(col)
+                    for col in schema.names
+                ]
+                writer.write_batch(pa.record_batch(columns, schema=schema))
+                rows += batch.num_rows
+    except Exception as e:
+        logger.error(f"Writing the Arrow store failed: {e}")
+        raise
+    logger.info(f"Arrow store written, {rows} rows")
+    return path
+
+
+def open_arrow_store(path=None):
+    """
+    Memory-map the Arrow store as a pyarrow Table. Only the file footer
+    is read here, column pages are read from disk when first used.
+    """
+    source = pa.memory_map(str(store_path if path is None else path), "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def store_frame(table, columns=None):
+    """
+    DataFrame of some columns of an opened store. Numeric columns
+    without nulls point at the mapped pages instead of being copied.
+    """
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas(split_blocks=True)
+
 
 # Save the data to the output folder
-def save_combined_csv(combined_data):
-    output_path = output_dir / "combined_cleaned_data.csv"
-    combined_data.to_csv(output_path, index=False)
-    logger.info("Dataset loaded")
+def save_combined_csv(combined_data, path=None):
+    # Through a temporary file, see append_combined_csv
+    return append_combined_csv([combined_data], path)
+
+
+def append_combined_csv(frames, path=None):
+    """
+    Write an iterable of DataFrames to the combined CSV one at a time.
+    The header comes from the first frame. Rows go to a temporary file
+    that replaces the output at the end, so readers never see a partial
+    dataset.
+    """
+    output_path = Path(csv_path if path is None else path)
+    rows = 0
+    try:
+        with atomic_write(output_path) as tmp_path, \
+                open(tmp_path, "w", newline="") as f:
+            for df in frames:
+                df.to_csv(f, index=False, header=f.tell() == 0)
+                rows += len(df)
+    except Exception as e:
+        logger.error(f"Streaming load failed: {e}")
+        raise
+    logger.info(f"Dataset loaded, {rows} rows streamed")
     return output_path
+
+
+def export_combined_csv(root=None, manifest=None, path=None):
+    """
+    Export the Parquet dataset, or the staged version in manifest, to
+    combined_cleaned_data.csv, or path, a record batch at a time, in
+    dataset order (species, study, then time).
+    """
+    dataset = open_dataset(root, manifest)
+    return append_combined_csv(
+        (batch.to_pandas() for batch in dataset.to_batches(
+            batch_size=ROW_GROUP_ROWS
+        )),
+        path,
+    )
 # Future work get the folder right
@@ -7,11 +7,12 @@ if not (ROOT / "src").exists():
 
 sys.path.insert(0, str(ROOT))
 
-import pandas as pd
-import os
 import streamlit as st
 from scripts.run_etl import run_etl_pipeline
 from src.utils.logging_utils import setup_logger
+from src.transform.track_registry import load_track_lookup
+from src.load.load import dataset_version, open_arrow_store, store_frame
+from src.load.aggregates import read_daily_summary, read_species_rankings
 
 
 def main():
@@ -26,21 +27,75 @@ def main():
         logger.error(f"An error occurred in the app pipeline : {e}")
 
     if filepath is None:
-        filepath = "data/processed/combined_cleaned_data.csv"
+        filepath = "data/processed/whales"
 
     return filepath
 
 
-@st.cache_data(show_spinner="Loading whale data...")
-def load_data():
-    root_directory = Path(__file__).resolve().parents[2]
-    data_directory = root_directory / "data" / "processed"
+@st.cache_resource(show_spinner="Opening whale data...", max_entries=1)
+def load_store(version):
+    # Memory-mapped once per dataset version, pages are read on first
+    # use. The store is written before its version is published
+    return open_arrow_store()
 
-    for file_name in os.listdir(data_directory):
-        if file_name.endswith(".csv"):
-            file_path = data_directory / file_name
 
-    return pd.read_csv(file_path)
+def load_data(columns=None):
+    """
+    The processed dataset as a DataFrame, only the given columns.
+    Each page asks for the columns it plots, so the others are never
+    read from disk. Text columns come back as categoricals.
+    The published version is polled on every call, so a new ETL run is
+    picked up without restarting the app.
+    """
+    table = load_store(dataset_version())
+    if columns is None:
+        # Pages use the integer track_id, labels come from
+        # load_track_labels
+        columns = [col for col in table.column_names
+                   if col != "study_tag_id"]
+    return store_frame(table, columns)
+
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def _species_rankings(version):
+    return read_species_rankings()
+
+
+def load_species_rankings():
+    """
+    Per species distance and speed rankings, materialized by the ETL,
+    see src/load/aggregates.py. A few rows, whatever the fix count.
+    """
+    return _species_rankings(dataset_version())
+
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def _daily_summary(version, columns):
+    return read_daily_summary(list(columns) if columns else None)
+
+
+def load_daily_summary(columns=None):
+    """
+    Distance, mean speed and fix count per individual per day,
+    materialized by the ETL, for daily analytics.
+    """
+    return _daily_summary(
+        dataset_version(), tuple(columns) if columns else None
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def _track_labels(version):
+    lookup = load_track_lookup()
+    return dict(zip(lookup["track_id"], lookup["study_tag_id"]))
+
+
+def load_track_labels():
+    """
+    track_id to its study_tag_id label, read again for each dataset
+    version so tracks registered by a later run get their labels.
+    """
+    return _track_labels(dataset_version())
 
 
 # Style the page to look good
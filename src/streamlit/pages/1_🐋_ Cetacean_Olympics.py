@@ -8,8 +8,7 @@ if not (ROOT / "src").exists():
 sys.path.insert(0, str(ROOT))
 
 import streamlit as st
-import pandas as pd
-from src.streamlit.app import load_data
+from src.streamlit.app import load_species_rankings
 
 st.set_page_config(layout="wide")
 
@@ -48,62 +47,20 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Load in the data set
-whale_df = load_data()
-
-# Force timestamp to have mixed format
-whale_df["timestamp"] = pd.to_datetime(
-    whale_df["timestamp"], format="mixed", errors="coerce"
-)
-
-whale_df["obs_date"] = whale_df["timestamp"].dt.date
-
-# Group by individual whale
-individual_stats = (
-    whale_df.groupby("individual_local_identifier", as_index=False)
-    .agg(
-        total_distance_m=("distance_from_prev_m", "sum"),
-        days_observed=("obs_date", "nunique"),
-        avg_speed_mps=("speed_mps", "mean"),
-        species=("individual_taxon_canonical_name", "first")
-    )
-)
-
-# Only include individuals with at least 5 days of data
-individual_stats = individual_stats[
-    individual_stats["days_observed"] >= 5
-].copy()
-
-# Calculate daily km
-individual_stats["daily_km"] = (
-    individual_stats["total_distance_m"] / 1000
-) / individual_stats["days_observed"]
-
-# Aggregate to species level
-species_stats = (
-    individual_stats.groupby("species", as_index=False)
-    .agg(
-        mean_daily_km=("daily_km", "mean"),
-        mean_speed=("avg_speed_mps", "mean"),
-        No=("individual_local_identifier", "count")
-    )
-)
+# Rankings are materialized by the ETL, see src/load/aggregates.py
+species_stats = load_species_rankings()
 
 # Top and bottom selections
-top8_dist = species_stats.sort_values(
-    "mean_daily_km", ascending=False
-).head(8)
+top8_dist = species_stats.sort_values("distance_rank").head(8)
 
 bot8_dist = species_stats.sort_values(
-    "mean_daily_km", ascending=True
+    "distance_rank", ascending=False
 ).head(8)
 
-top8_speed = species_stats.sort_values(
-    "mean_speed", ascending=False
-).head(8)
+top8_speed = species_stats.sort_values("speed_rank").head(8)
 
 bot8_speed = species_stats.sort_values(
-    "mean_speed", ascending=True
+    "speed_rank", ascending=False
 ).head(8)
 
 # Distance tables
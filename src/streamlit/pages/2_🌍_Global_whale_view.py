@@ -52,7 +52,13 @@ st.markdown("**Fun fact: Whales are found in all major oceans on Earth!**")
 colour = st.sidebar.color_picker("Color", value="#00FFAA")
 
 # Load the data
-whale_df = load_data()
+whale_df = load_data([
+    "location_lat",
+    "location_lon",
+    "individual_local_identifier",
+    "individual_taxon_canonical_name",
+    "study_name",
+])
 
 filtered = whale_df.copy()
 
@@ -50,7 +50,10 @@ st.markdown("""
 st.markdown("**Change the map to change view!**")
 
 # Load the data
-whale_df = load_data()
+whale_df = load_data([
+    "location_lat",
+    "location_lon",
+])
 
 # Create a value column for the marker value
 whale_df["value"] = 1
@@ -10,7 +10,7 @@ sys.path.insert(0, str(ROOT))
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-from src.streamlit.app import load_data
+from src.streamlit.app import load_data, load_track_labels
 
 
 st.set_page_config(layout="wide")
@@ -49,7 +49,15 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-whale_df = load_data()
+whale_df = load_data([
+    "track_id",
+    "timestamp",
+    "location_lat",
+    "location_lon",
+    "individual_local_identifier",
+    "individual_taxon_canonical_name",
+    "study_name",
+])
 
 # Select the species
 species_list = (
@@ -76,29 +84,32 @@ whale_df = whale_df[
     whale_df["individual_taxon_canonical_name"] == selected_species
 ]
 
-# Select the whale (study_tag_id)
+# Select the whale by track_id, shown as its study_tag_id
+track_labels = load_track_labels()
 whale_ids = (
-    whale_df["study_tag_id"]
+    whale_df["track_id"]
     .dropna()
     .unique()
     .tolist()
 )
+whale_labels = [track_labels.get(i, str(i)) for i in whale_ids]
 
 default_whale = "Humpback whale and climate change_245950"
 default_whale_index = (
-    whale_ids.index(default_whale)
-    if default_whale in whale_ids
+    whale_labels.index(default_whale)
+    if default_whale in whale_labels
     else 0
 )
 
 selected_whale = st.selectbox(
     "study_tag_id",
     whale_ids,
-    index=default_whale_index
+    index=default_whale_index,
+    format_func=lambda i: track_labels.get(i, str(i))
 )
 
 whale_df = whale_df[
-    whale_df["study_tag_id"] == selected_whale
+    whale_df["track_id"] == selected_whale
 ]
 
 # Stops it breaking at the start by adding a message
@@ -121,7 +132,7 @@ fig = px.scatter_map(
     zoom=2,
     # Animating section
     animation_frame="timestamp",
-    animation_group="study_tag_id",
+    animation_group="track_id",
     height=700,
     color_discrete_sequence=["red"]
 )
@@ -49,7 +49,11 @@ st.markdown("""
 st.set_page_config(layout="wide")
 
 # Load the data
-whale_df = load_data()
+whale_df = load_data([
+    "location_lat",
+    "location_lon",
+    "individual_taxon_canonical_name",
+])
 
 # Add heatmap value column
 whale_df["value"] = 1
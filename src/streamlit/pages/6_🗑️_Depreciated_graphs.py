@@ -16,7 +16,13 @@ from src.streamlit.app import load_data
 
 
 
-whale_df = load_data()
+whale_df = load_data([
+    "location_lat",
+    "location_lon",
+    "individual_local_identifier",
+    "individual_taxon_canonical_name",
+    "study_name",
+])
 
 st.subheader("Whale Density Heatmap (Plotly)")
 
@@ -1,14 +1,201 @@
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-import geopy.distance
 from src.utils.logging_utils import setup_logger
+from src.utils.timestamps import parse_timestamps
+from src.transform.compact import compact_frame, unify_categories
+from src.transform.geodesic import (
+    DEFAULT_METHOD,
+    distance_from_prev_m,
+    pairwise_distance_m,
+)
 
 
 # Set up the logger with module name and captures every message
 logger = setup_logger(__name__, "Clean_data.log", level=logging.DEBUG)
 
 
-def clean_data(data_dict):
+def _track_starts(df):
+    """
+    True on the first row of every whale and tag in a sorted frame.
+    """
+    ids = df[["individual-local-identifier", "tag-local-identifier"]]
+    # Row 0 compares against NaN so it always counts as a start
+    return (ids != ids.shift()).any(axis=1).to_numpy()
+
+
+TRACK_ORDER = [
+    "individual-local-identifier",
+    "tag-local-identifier",
+    "timestamp",
+]
+
+
+def _sort_values(series):
+    """
+    Values in the order sort_values uses, codes for categoricals.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        # Missing values sort last
+        return np.where(codes < 0, np.iinfo(codes.dtype).max, codes)
+    return series.to_numpy()
+
+
+def _is_track_sorted(df):
+    """
+    True when df is already ordered by individual, tag then timestamp,
+    with NaT timestamps last in each track as sort_values puts them.
+    """
+    if len(df) < 2:
+        return True
+    try:
+        ind = _sort_values(df["individual-local-identifier"])
+        tag = _sort_values(df["tag-local-identifier"])
+        t_ns, nat = _timestamps_ns(df)
+
+        same_ind = ind[1:] == ind[:-1]
+        same_tag = tag[1:] == tag[:-1]
+        time_ok = nat[1:] | (~nat[:-1] & (t_ns[:-1] <= t_ns[1:]))
+
+        ordered = np.where(
+            same_ind,
+            np.where(same_tag, time_ok, tag[:-1] < tag[1:]),
+            ind[:-1] < ind[1:],
+        )
+        return bool(ordered.all())
+    except TypeError:
+        # Mixed types cannot be compared here, let sort_values decide
+        return False
+
+
+def _sort_tracks(df):
+    """
+    Sort by individual, tag then timestamp with a fresh index.
+    Frames that are already in that order are not copied.
+    """
+    if not _is_track_sorted(df):
+        return df.sort_values(TRACK_ORDER).reset_index(drop=True)
+    if not df.index.equals(pd.RangeIndex(len(df))):
+        df.index = pd.RangeIndex(len(df))
+    return df
+
+
+def _partition_study(df, target_rows):
+    """
+    Split a raw study into chunks of whole (individual, tag) tracks.
+
+    Tracks are taken in sorted order and cut into contiguous ranges of
+    roughly target_rows rows, so cleaned chunks concatenate back into
+    track order.
+    """
+    if len(df) <= target_rows:
+        return [df]
+    track = df.groupby(
+        ["individual-local-identifier", "tag-local-identifier"],
+        sort=True, dropna=False, observed=True,
+    ).ngroup().to_numpy()
+    # Missing ids give -1, they are dropped in cleaning anyway
+    track = np.where(track < 0, track.max() + 1, track)
+    rows_per_track = np.bincount(track)
+    # Chunk number of every track from its running row total
+    chunk_of_track = (np.cumsum(rows_per_track) - 1) // target_rows
+    chunk = chunk_of_track[track]
+    return [df[chunk == c] for c in np.unique(chunk)]
+
+
+def _clean_partition(key, df, method, compact=False):
+    """
+    Clean one study or one chunk of a study inside a worker process.
+    """
+    return clean_data({key: df}, method=method, compact=compact)[key]
+
+
+def _clean_parallel(data_dict, method, workers, compact=False):
+    """
+    Clean studies across a process pool.
+
+    Large studies are split by track so one giant study does not
+    straggle. Chunks are submitted largest first and put back together
+    in their original order, so the result does not depend on which
+    worker finishes first.
+    """
+    total_rows = sum(len(df) for df in data_dict.values())
+    # A few chunks per worker keeps every core busy to the end
+    target_rows = max(1, -(-total_rows // (workers * 4)))
+
+    tasks = []
+    for key, df in data_dict.items():
+        for part, chunk in enumerate(_partition_study(df, target_rows)):
+            tasks.append((key, part, chunk))
+    logger.info(
+        f"Cleaning {len(data_dict)} studies as {len(tasks)} chunks "
+        f"on {workers} workers"
+    )
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                _clean_partition, key, chunk, method, compact
+            ): (key, part)
+            for key, part, chunk in sorted(
+                tasks, key=lambda task: len(task[2]), reverse=True
+            )
+        }
+        for future, task_id in futures.items():
+            results[task_id] = future.result()
+
+    # Merge chunks back per study in partition order
+    for key in data_dict:
+        parts = [
+            results[(k, part)] for k, part in sorted(results) if k == key
+        ]
+        data_dict[key] = (
+            parts[0] if len(parts) == 1
+            # Chunks may have gained different species categories
+            else pd.concat(unify_categories(parts), ignore_index=True)
+        )
+    return data_dict
+
+
+def clean_data(data_dict, method=DEFAULT_METHOD, workers=1, compact=False,
+               dedup_across_studies=False, argos_filters=None):
+    """
+    Clean every study in data_dict.
+
+    method picks the distance accuracy tier used for distances and
+    outlier speeds, see src.transform.geodesic.DISTANCE_METHODS.
+    workers above 1 cleans studies and track chunks in a process pool,
+    None uses every core.
+    compact dictionary-encodes identifiers up front and stores the
+    metrics as float32 at the end, see src.transform.compact.
+    dedup_across_studies also drops fixes repeated in an earlier study,
+    see drop_duplicates.
+    argos_filters overrides ARGOS_FILTERS, see filter_argos_fixes.
+    """
+    # Nothing new to clean, e.g. every study came from the cache
+    if not data_dict:
+        logger.info("No studies to clean")
+        return data_dict
+
+    if compact:
+        # Before any split so every chunk shares the categories
+        data_dict = {key: compact_frame(df) for key, df in data_dict.items()}
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1:
+        # Filtered here so workers never split or ship the dropped fixes
+        data_dict = remove_missing_values(data_dict)
+        data_dict = filter_argos_fixes(data_dict, argos_filters)
+        if dedup_across_studies:
+            # Workers only see one study, so compare studies first
+            data_dict = drop_duplicates(data_dict, across_studies=True)
+        return _clean_parallel(data_dict, method, workers, compact)
+
     logger.info("Starting cleaning dataset")
 
     # Task 1 - Remove rows with missing longitude or latitude data
@@ -16,55 +203,38 @@ def clean_data(data_dict):
     data_dict = remove_missing_values(data_dict)
     logger.info("Missing Values removed")
 
-    # Task 2 - Drop duplicates 
+    # Task 2 - Drop poor Argos fixes before any distance work
+    logger.info("Starting Argos quality filter")
+    data_dict = filter_argos_fixes(data_dict, argos_filters)
+
+    # Task 3 - Drop duplicates 
     logger.info("Starting duplicate removal")
-    data_dict = drop_duplicates(data_dict)
+    data_dict = drop_duplicates(
+        data_dict, across_studies=dedup_across_studies
+    )
 
-    # Task 3 - ensure timestamps are in proper datetime format
+    # Task 4 - ensure timestamps are in proper datetime format
     logger.info("Starting to ensure timestamp is in datetime")
     data_dict = ensure_datetime(data_dict)
     logger.info("Timestamps in datetime")
     
-    # Task 4 - Drop NAs
-
-    # Task 4 - Calculate distance from previous point
-    logger.info("Starting calculation of distance from previous point")
-    data_dict = distance_calculator(data_dict)
-
-    # Task 5 - Calculate time deltas from previous point
-    logger.info("Starting time delta calculation from previous point")
-    data_dict = time_delta(data_dict)
-
-    # Task 6 - Remove time deltas of zero (Add in where distance is different)
-    logger.info("Starting removal of time delta")
-    data_dict = remove_zero_time_delta(data_dict)
+    # Task 5 - Normalise species names, outlier thresholds use them
+    logger.info("Filling in missing taxon name")
+    data_dict = fill_missing_column(data_dict)
+    data_dict = change_species_names(data_dict)
 
-    # Task 7 - Calculate speed from previous point
-    logger.info("Starting speed calculation")
-    data_dict = speed_calculation(data_dict)
+    # Task 6 - Distance, time delta, zero delta removal and speed
+    # Sorts once, every later stage keeps the track order
+    logger.info("Starting movement metrics from previous point")
+    data_dict = derive_movement_metrics(data_dict, method=method)
 
-    # Task 8 - Remove Outliers
+    # Task 7 - Remove Outliers, per species speed thresholds
+    # Metrics are patched only next to the removed rows
     logger.info("Starting outlier removal")
-    data_dict = remove_outliers(data_dict)
-
-    # Task 9 - Re-run calculations after outlier removal
-    logger.info("Starting calculation of distance from previous point - 2")
-    data_dict = distance_calculator(data_dict)
-
-    logger.info("Starting time delta calculation from previous point - 2")
-    data_dict = time_delta(data_dict)
-
-    logger.info("Starting removal of time delta - 2")
-    data_dict = remove_zero_time_delta(data_dict)
-
-    logger.info("Starting speed calculation - 2")
-    data_dict = speed_calculation(data_dict)
+    data_dict = remove_outliers(data_dict, method=method)
 
-    # Task 10 fill in missing
-    logger.info("Filling in missing taxon name")
-    data_dict = fill_missing_column(data_dict)
-
-    data_dict = change_species_names(data_dict)
+    if compact:
+        data_dict = {key: compact_frame(df) for key, df in data_dict.items()}
     return data_dict
 
 
@@ -91,24 +261,186 @@ def remove_missing_values(data_dict):
         raise
 
 
-def drop_duplicates(data_dict):
-    # Drop duplicates
+# Fastest plausible travel between fixes in m/s, keyed on the names
+# change_species_names gives. Upper ends of reported burst speeds, so
+# fast but real movement is kept. Other species use the default, the
+# blue whale limit the pipeline started with
+DEFAULT_SPEED_THRESHOLD = 10.0
+SPECIES_SPEED_THRESHOLDS = {
+    "Blue whale": 10.0,
+    "Fin whale": 10.0,
+    "Sei whale": 10.0,
+    "Balaenopterid whale (unspecified)": 10.0,
+    "Humpback whale": 8.0,
+    "Sperm whale": 8.0,
+    "Short-finned pilot whale": 9.0,
+    "Pilot whale (unspecified)": 9.0,
+    "False killer whale": 9.0,
+    "Bowhead whale": 5.0,
+    "Narwhal": 6.0,
+    "Whale shark": 3.0,
+}
+
+
+def species_speed_thresholds(df, thresholds=None):
+    """
+    Speed threshold of every row from its species, looked up once per
+    category. thresholds defaults to SPECIES_SPEED_THRESHOLDS, rows
+    without a listed species get DEFAULT_SPEED_THRESHOLD.
+    """
+    thresholds = SPECIES_SPEED_THRESHOLDS if thresholds is None else thresholds
+    species = df.get("individual-taxon-canonical-name")
+    if species is None:
+        return np.full(len(df), DEFAULT_SPEED_THRESHOLD)
+    if not isinstance(species.dtype, pd.CategoricalDtype):
+        species = species.astype("category")
+    lookup = np.array(
+        [thresholds.get(name, DEFAULT_SPEED_THRESHOLD)
+         for name in species.cat.categories] + [DEFAULT_SPEED_THRESHOLD],
+        dtype=float,
+    )
+    # Code -1 (missing) takes the default at the end
+    return lookup[species.cat.codes.to_numpy()]
+
+
+# Argos quality columns, see OPTIONAL_COLUMN_DTYPES in extract
+ARGOS_COLUMNS = ["argos:lc", "argos:error-radius", "argos:semi-major"]
+
+# Only Argos location class Z (invalid) is dropped by default. Class B
+# (no accuracy estimate) is often most of a study's fixes, so dropping
+# it is opted into per study in ARGOS_FILTERS. max_error_radius_m also
+# drops fixes with a larger error radius, or error ellipse semi-major
+# axis when there is no radius
+DEFAULT_ARGOS_FILTER = {"drop_classes": ["Z"], "max_error_radius_m": None}
+
+# Per-study settings, keyed like data_dict, for example
+# {"drop_classes": ["B", "Z"], "max_error_radius_m": None} to also drop
+# class B. None keeps every fix
+ARGOS_FILTERS = {}
+
+
+def _error_radius(df):
+    # Error radius in metres, the semi-major axis where it is missing
+    radius = pd.Series(np.nan, index=df.index)
+    for col in ["argos:semi-major", "argos:error-radius"]:
+        if col in df.columns:
+            radius = df[col].where(df[col].notna(), radius)
+    return radius.to_numpy()
+
+
+def filter_argos_fixes(data_dict, filters=None):
+    """
+    Drop poor quality Argos fixes before any distance work, by location
+    class and error radius, then drop the Argos columns.
+    filters maps study names to settings like DEFAULT_ARGOS_FILTER,
+    ARGOS_FILTERS when None. Studies without Argos columns, and fixes
+    without a class or radius, are kept.
+    """
+    filters = ARGOS_FILTERS if filters is None else filters
     try:
-        before = 0
-        after = 0
-        dropped = 0
         for key, df in data_dict.items():
-            before += len(df)
-            df = df.drop_duplicates()
-            after = +len(df)
-            dropped += before - after
+            present = [col for col in ARGOS_COLUMNS if col in df.columns]
+            if not present:
+                continue
+            settings = filters.get(key, DEFAULT_ARGOS_FILTER)
+            keep = np.ones(len(df), dtype=bool)
+            if settings is not None:
+                classes = [str(c) for c in settings.get("drop_classes") or []]
+                if classes and "argos:lc" in df.columns:
+                    # Categorical isin only compares the categories
+                    keep &= ~df["argos:lc"].isin(classes).to_numpy()
+                limit = settings.get("max_error_radius_m")
+                if limit is not None:
+                    keep &= ~(_error_radius(df) > limit)
+
+            dropped = int(len(df) - keep.sum())
+            if dropped:
+                df = df[keep]
+            data_dict[key] = df.drop(columns=present)
+            logger.info(
+                f"[{key}] Argos fixes removed: {dropped} "
+                f"(before: {len(keep)}, after: {len(keep) - dropped})"
+            )
+        return data_dict
+
+    except Exception as e:
+        logger.error(f"Argos filtering failed: {e}")
+        raise
+
+
+# Columns that identify a fix, rows equal on all of them are duplicates
+DEDUP_KEY = [
+    "individual-local-identifier",
+    "tag-local-identifier",
+    "timestamp",
+    "location-lat",
+    "location-long",
+]
+
+
+def row_fingerprints(df, columns=DEDUP_KEY):
+    """
+    64-bit hash of every row over columns, by value, so categoricals
+    with different categories still hash alike.
+    """
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def duplicate_rows(frames):
+    """
+    Duplicate mask for each frame, keeping the first occurrence across
+    all of them in order.
+
+    Rows are matched on their fingerprint, then the few rows sharing a
+    fingerprint are compared on the key itself so a hash collision
+    never drops a row.
+    """
+    if not frames:
+        return []
+    fingerprints = np.concatenate([row_fingerprints(df) for df in frames])
+    masks = np.zeros(len(fingerprints), dtype=bool)
+    shared = pd.Series(fingerprints).duplicated(keep=False).to_numpy()
+    if shared.any():
+        bounds = np.cumsum([0] + [len(df) for df in frames])
+        candidates = pd.concat(
+            [
+                df.loc[shared[start:end], DEDUP_KEY].astype(object)
+                for df, start, end in zip(frames, bounds[:-1], bounds[1:])
+            ],
+            ignore_index=True,
+        )
+        masks[shared] = candidates.duplicated().to_numpy()
+    return np.split(masks, np.cumsum([len(df) for df in frames])[:-1])
+
+
+def drop_duplicates(data_dict, across_studies=False):
+    """
+    Drop rows repeating the individual, tag, timestamp and position of
+    an earlier row.
+    across_studies also drops rows already seen in an earlier study,
+    for tags exported into more than one study file.
+    """
+    try:
+        keys = list(data_dict)
+        frames = [data_dict[key] for key in keys]
+        if across_studies:
+            masks = duplicate_rows(frames)
+        else:
+            masks = [duplicate_rows([df])[0] for df in frames]
+
+        total = 0
+        for key, df, mask in zip(keys, frames, masks):
+            dropped = int(mask.sum())
+            total += dropped
+            if dropped:
+                df = df[~mask]
             # Resent index to avoid issues in distance calc
             data_dict[key] = df.reset_index(drop=True)
-
-        logger.info(
+            logger.info(
                 f"[{key}] Duplicate rows removed: {dropped} "
-                f"(before: {before}, after: {after})"
+                f"(before: {len(mask)}, after: {len(mask) - dropped})"
             )
+        logger.info(f"Duplicate rows removed in total: {total}")
         return data_dict
 
     except Exception as e:
@@ -119,82 +451,45 @@ def drop_duplicates(data_dict):
 def ensure_datetime(data_dict):
     try:
         nas = 0
+        fallback = 0
         # Ensure the timestamp column is in correct format
+        # Format detected per study, only odd rows use mixed parsing
         for key, df in data_dict.items():
-            df["timestamp"] = pd.to_datetime(
-                df["timestamp"],
-                format="mixed",
-                errors="coerce")
+            df["timestamp"], study_fallback = parse_timestamps(
+                df["timestamp"], name=key
+            )
             data_dict[key] = df
             # Add nas from each data set
             nas += df["timestamp"].isna().sum()
+            fallback += study_fallback
 
-        logger.info(f"{nas} NAs across all timestamp")
+        logger.info(
+            f"{nas} NAs across all timestamp, "
+            f"{fallback} rows needed the mixed format fallback"
+        )
         return data_dict
     except Exception as e:
         logger.error(f"Conversion to datetime failed {e}")
         raise
 
 
-def distance_calculator(data_dict):
+def distance_calculator(data_dict, method=DEFAULT_METHOD):
     try:
         # For every df
         for key, df in data_dict.items():
-            # Set up a store for distances
-            distances = []
             # Sort the rows so the distance calculation is correct
-            df = (
-                # Sorted so individual , then tag then timestamp
-                # Index resent so indexing loc works
-                df.sort_values(
-                    [
-                        "individual-local-identifier",
-                        "tag-local-identifier",
-                        "timestamp"
-                        ]
-                ).reset_index(drop=True)
+            # Sorted so individual , then tag then timestamp
+            # Skipped when the frame is already in that order
+            df = _sort_tracks(df)
+
+            # Distance from the previous fix for every row in one pass
+            # First row of each whale and tag stays zero
+            df["distance_from_prev_m"] = distance_from_prev_m(
+                df["location-lat"].to_numpy(),
+                df["location-long"].to_numpy(),
+                _track_starts(df),
+                method=method,
             )
-
-            # Iterate i for the entire dataset
-            for i in range(len(df)):
-                # If i is 0 (the first row) should be zero (no previous)
-                if i == 0:
-                    distances.append(0)
-                    continue
-                # Same whale true if previous Whale-ID and Tag-ID equal
-                same_whale = (
-                    df.loc[i, "individual-local-identifier"]
-                    == df.loc[i - 1, "individual-local-identifier"]
-                    and df.loc[i, "tag-local-identifier"]
-                    == df.loc[i - 1, "tag-local-identifier"]
-                )
-                # If it is not true it must be a new whale or tag
-                if not same_whale:
-                    # Every new whale and tag should be zero
-                    distances.append(0)
-                    continue
-
-                # If same whale was true retrieve coords
-                coords_1 = (
-                    df.loc[i - 1, "location-lat"],
-                    df.loc[i - 1, "location-long"],
-                )
-                coords_2 = (
-                    df.loc[i, "location-lat"],
-                    df.loc[i, "location-long"],
-                )
-
-                try:
-                    # use geopy to calculate distance
-                    d = geopy.distance.distance(coords_1, coords_2).meters
-                except Exception as e:
-                    logger.error(f"d = None due to error {e}")
-                    d = None
-                # Add it to distances
-                distances.append(d)
-
-            # Add a new column with the data from distances
-            df["distance_from_prev_m"] = distances
             # Save this back to the key
             data_dict[key] = df
 
@@ -213,7 +508,8 @@ def time_delta(data_dict):
             # Save the difference as seconds
             df["time_diff_s"] = (
                 df.groupby(
-                    ["individual-local-identifier", "tag-local-identifier"]
+                    ["individual-local-identifier", "tag-local-identifier"],
+                    observed=True,
                 )["timestamp"]
                 .diff()
                 .dt.total_seconds()
@@ -234,35 +530,11 @@ def time_delta(data_dict):
 def remove_zero_time_delta(data_dict):
     try:
         for key, df in data_dict.items():
-            # Set up a store
-            valid_rows = []
-
-            # For i in the length of the df
-            for i in range(len(df)):
-
-                # If i zero a zero time delta allowed
-                if i == 0:
-                    valid_rows.append(i)
-                    continue
-
-                # Set up same whale logic again
-                same_whale = (
-                    df.loc[i, "individual-local-identifier"]
-                    == df.loc[i - 1, "individual-local-identifier"]
-                    and df.loc[i, "tag-local-identifier"]
-                    == df.loc[i - 1, "tag-local-identifier"]
-                )
-
-                # If it is not the same whale or tag a zero delta is valid
-                if not same_whale:
-                    valid_rows.append(i)
-                    continue
-
-                # All other rows above 0 valid
-                if df.loc[i, "time_diff_s"] > 0:
-                    valid_rows.append(i)
-            # Only keep rows with ame index as valid rows and removes old index
-            data_dict[key] = df.loc[valid_rows].reset_index(drop=True)
+            # First row of every whale and tag may have a zero delta
+            # All other rows need a positive time difference
+            valid_rows = _track_starts(df) | (df["time_diff_s"] > 0)
+            # Only keep valid rows and removes old index
+            data_dict[key] = df[valid_rows.to_numpy()].reset_index(drop=True)
 
         return data_dict
 
@@ -274,24 +546,23 @@ def remove_zero_time_delta(data_dict):
 def speed_calculation(data_dict):
     try:
         for key, df in data_dict.items():
-            # Apply a speed calculation to the df creating a new column
-            # Need else 0 to account for new whales etc
-            # Axis = 1 row by row calc
-            df["speed_mps"] = df.apply(
-                lambda x: (
-                    x["distance_from_prev_m"] / x["time_diff_s"]
-                    if x["time_diff_s"] > 0
-                    else 0
-                ),
-                axis=1,
-            )
+            # Speed is distance over time for the whole column at once
+            # Zero time gaps (new whales etc) get a speed of 0
+            time_s = df["time_diff_s"].to_numpy(dtype=float)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                df["speed_mps"] = np.where(
+                    time_s > 0,
+                    df["distance_from_prev_m"].to_numpy(dtype=float) / time_s,
+                    0.0,
+                )
             # Save it back to dictionary
             data_dict[key] = df
 
-            # Define too fast recordings as those exceeding 10 m/s
-            # Too fast based on blue whales future use expand this
-            too_fast = (df["speed_mps"] > 10).sum()
-            print(f"Number of too fast recordings: {too_fast}")
+            # Too fast for the species, see SPECIES_SPEED_THRESHOLDS
+            too_fast = (
+                df["speed_mps"].to_numpy() > species_speed_thresholds(df)
+            ).sum()
+            logger.info(f"[{key}] Number of too fast recordings: {too_fast}")
 
         return data_dict
 
@@ -300,59 +571,290 @@ def speed_calculation(data_dict):
         raise
 
 
-# Improved outlier removal:
-def remove_outliers(data_dict, speed_threshold=10):
+def derive_movement_metrics(data_dict, method=DEFAULT_METHOD):
+    """
+    Distance, time delta, zero delta removal and speed in one pass.
+
+    Each frame is sorted by individual, tag then timestamp once (or not
+    at all when already ordered). Rows with a zero or unknown time gap
+    inside a track are dropped first, so distances are measured between
+    the rows that remain. The frame is left sorted for later stages.
+    """
     try:
         for key, df in data_dict.items():
-            original = len(df)
+            df = _sort_tracks(df)
+            starts = _track_starts(df)
+            t_ns, nat = _timestamps_ns(df)
+
+            time_s = _time_from_prev_s(t_ns, nat, starts)
+
+            # Zero deltas only survive at the start of a track
+            valid = starts | (time_s > 0)
+            if not valid.all():
+                df = df[valid].reset_index(drop=True)
+                starts = starts[valid]
+                t_ns, nat = t_ns[valid], nat[valid]
+                time_s = _time_from_prev_s(t_ns, nat, starts)
+
+            distance_m = distance_from_prev_m(
+                df["location-lat"].to_numpy(dtype=float),
+                df["location-long"].to_numpy(dtype=float),
+                starts,
+                method=method,
+            )
+            with np.errstate(invalid="ignore", divide="ignore"):
+                speed = np.where(time_s > 0, distance_m / time_s, 0.0)
 
-            keep = [False] * len(df)
+            df["distance_from_prev_m"] = distance_m
+            df["time_diff_s"] = time_s
+            df["speed_mps"] = speed
+            data_dict[key] = df
 
-            # First row is always valid
-            last_good = 0
-            keep[0] = True
+            # Too fast for the species, see SPECIES_SPEED_THRESHOLDS
+            too_fast = (speed > species_speed_thresholds(df)).sum()
+            logger.info(f"[{key}] Number of too fast recordings: {too_fast}")
 
-            for i in range(1, len(df)):
+        return data_dict
 
-                if (
-                    df.at[i, "individual-local-identifier"]
-                    != df.at[last_good, "individual-local-identifier"]
-                    or df.at[i, "tag-local-identifier"]
-                    != df.at[last_good, "tag-local-identifier"]
-                ):
-                    keep[i] = True
-                    last_good = i
-                    continue
+    except Exception as e:
+        logger.error(f"Calculation of movement metrics failed: {e}")
+        raise
 
-                # Compute speed from last good point
-                coords_1 = (
-                    df.at[last_good, "location-lat"],
-                    df.at[last_good, "location-long"],
-                )
-                coords_2 = (
-                    df.at[i, "location-lat"],
-                    df.at[i, "location-long"],
-                )
 
-                dist_m = geopy.distance.distance(coords_1, coords_2).meters
-                time_s = (
-                    df.at[i, "timestamp"] - df.at[last_good, "timestamp"]
-                ).total_seconds()
+def _timestamps_ns(df):
+    """
+    Timestamp column as int64 nanoseconds plus a mask of NaT rows.
+    """
+    ts = df["timestamp"].to_numpy(dtype="datetime64[ns]")
+    nat = np.isnat(ts)
+    return ts.view("int64"), nat
+
+
+def _elapsed_s(t_ns, nat, start, end):
+    """
+    Seconds from rows start to rows end, NaN when either side is NaT.
+    """
+    # Subtract as integers so large epochs keep microsecond precision
+    elapsed = (t_ns[end] - t_ns[start]) / 1e9
+    return np.where(nat[start] | nat[end], np.nan, elapsed)
+
+
+def _time_from_prev_s(t_ns, nat, starts):
+    """
+    Seconds from the previous row, zero at track starts and where a
+    timestamp is missing, matching time_delta.
+    """
+    rows = np.arange(1, len(t_ns))
+    time_s = np.zeros(len(t_ns))
+    time_s[1:] = _elapsed_s(t_ns, nat, rows - 1, rows)
+    return np.where(starts, 0.0, np.nan_to_num(time_s))
+
+
+def _speed_ok(lat, lon, t_ns, nat, start, end, threshold, method):
+    """
+    True where travelling from rows start to rows end is within threshold.
+    A non-positive or unknown time gap counts as infinitely fast.
+    """
+    dist_m = pairwise_distance_m(
+        lat[start], lon[start], lat[end], lon[end], method=method
+    )
+    time_s = _elapsed_s(t_ns, nat, start, end)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        speed = np.where(time_s > 0, dist_m / time_s, np.inf)
+    # NaN speeds compare False so they are dropped like before
+    return speed <= threshold[end]
+
+
+def _outlier_keep_mask(lat, lon, t_ns, nat, starts, threshold,
+                       method=DEFAULT_METHOD):
+    """
+    Last good point filter over contiguous arrays.
+
+    Every row is judged by its speed from the last kept row of the same
+    whale and tag. While rows keep passing, the last kept row is simply
+    the previous row, so one vectorised pass over neighbouring pairs
+    settles those. After a failure the kernel searches forward from the
+    last good row, in growing blocks, for the next row that passes.
+    All tracks are searched together, so the number of Python rounds
+    follows the outliers in the worst track, not the row count.
+    """
+    n = len(lat)
+    keep = np.ones(n, dtype=bool)
+    if n < 2:
+        return keep
+
+    # The first row always starts a track
+    starts = starts.copy()
+    starts[0] = True
+    track_first = np.nonzero(starts)[0]
+    track_end = np.append(track_first[1:], n)
+
+    # Does each row pass when judged from the row before it
+    rows = np.arange(1, n)
+    neighbour_ok = np.ones(n, dtype=bool)
+    neighbour_ok[1:] = _speed_ok(
+        lat, lon, t_ns, nat, rows - 1, rows, threshold, method
+    )
+    neighbour_ok |= starts
+    # Padded with n so a lookup past the last failure is out of range
+    failures = np.append(np.nonzero(~neighbour_ok)[0], n)
+
+    # Per track state, last_good of -1 means no search in progress
+    pos = track_first.copy()
+    last_good = np.full(len(pos), -1)
+    search_from = np.zeros(len(pos), dtype=int)
+    block = np.zeros(len(pos), dtype=int)
+    active = np.ones(len(pos), dtype=bool)
+    drop_from = []
+    drop_to = []
+
+    while active.any():
+        # Tracks between searches jump straight to their next failure
+        idle = np.nonzero(active & (last_good < 0))[0]
+        if len(idle):
+            fail = failures[np.searchsorted(failures, pos[idle])]
+            done = fail >= track_end[idle]
+            active[idle[done]] = False
+            idle, fail = idle[~done], fail[~done]
+            last_good[idle] = fail - 1
+            search_from[idle] = fail
+            block[idle] = 8
+
+        tracks = np.nonzero(active)[0]
+        if not len(tracks):
+            break
+
+        # Candidate rows for every searching track in one flat array
+        hi = np.minimum(search_from[tracks] + block[tracks],
+                        track_end[tracks])
+        sizes = hi - search_from[tracks]
+        owner = np.repeat(np.arange(len(tracks)), sizes)
+        offsets = np.arange(len(owner)) - np.repeat(
+            np.cumsum(sizes) - sizes, sizes
+        )
+        cand = search_from[tracks][owner] + offsets
+        ok = _speed_ok(
+            lat, lon, t_ns, nat,
+            last_good[tracks][owner], cand, threshold, method
+        )
+
+        # First passing candidate per track, n when none passed
+        first_ok = np.full(len(tracks), n)
+        np.minimum.at(first_ok, owner[ok], cand[ok])
+        found = first_ok < n
+        exhausted = ~found & (hi == track_end[tracks])
+
+        # Rows between the last good row and the next passing one go
+        settled = found | exhausted
+        drop_from.append(last_good[tracks][settled] + 1)
+        drop_to.append(np.where(found, first_ok, hi)[settled])
+
+        pos[tracks[found]] = first_ok[found] + 1
+        last_good[tracks[settled]] = -1
+        active[tracks[exhausted]] = False
+
+        searching = tracks[~settled]
+        search_from[searching] = hi[~settled]
+        block[searching] *= 2
+
+    if drop_from:
+        # Apply every dropped range at once with a difference array
+        delta = np.zeros(n + 1, dtype=int)
+        np.add.at(delta, np.concatenate(drop_from), 1)
+        np.add.at(delta, np.concatenate(drop_to), -1)
+        keep = np.cumsum(delta[:-1]) == 0
+
+    return keep
+
+
+METRIC_COLUMNS = ["distance_from_prev_m", "time_diff_s", "speed_mps"]
+
+
+def _patch_metrics(df, keep, lat, lon, t_ns, nat, starts,
+                   method=DEFAULT_METHOD):
+    """
+    Update movement metrics of the filtered frame df = original[keep].
+
+    Only rows whose previous row was dropped get a new previous fix,
+    so only those are recomputed. Every other row keeps its values.
+    Returns the number of rows patched.
+    """
+    kept = np.nonzero(keep)[0]
+    # Position in df of rows that now follow a different fix
+    moved = np.nonzero(
+        (np.diff(kept) != 1) & ~starts[kept[1:]]
+    )[0] + 1
+    if not len(moved):
+        return 0
+
+    prev, cur = kept[moved - 1], kept[moved]
+    distance_m = pairwise_distance_m(
+        lat[prev], lon[prev], lat[cur], lon[cur], method=method
+    )
+    time_s = np.nan_to_num(_elapsed_s(t_ns, nat, prev, cur))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        speed = np.where(time_s > 0, distance_m / time_s, 0.0)
+
+    for col, values in zip(METRIC_COLUMNS, (distance_m, time_s, speed)):
+        column = df[col].to_numpy(dtype=float, copy=True)
+        column[moved] = values
+        df[col] = column
+    return len(moved)
+
+
+def remove_outliers(data_dict, speed_threshold=None, method=DEFAULT_METHOD):
+    """
+    Drop fixes that need more than their species' speed threshold in m/s
+    to reach from the last kept fix of the same whale and tag.
+
+    speed_threshold None uses SPECIES_SPEED_THRESHOLDS, a dict replaces
+    that table and a number applies to every row.
+
+    When the frame already carries movement metrics they are patched
+    around the removed rows instead of being recomputed for every row.
+    A kept fix always has a positive time gap from its new neighbour,
+    so no zero deltas can appear.
+    """
+    try:
+        for key, df in data_dict.items():
+            original = len(df)
 
-                speed = dist_m / time_s if time_s > 0 else float("inf")
+            lat = df["location-lat"].to_numpy(dtype=float)
+            lon = df["location-long"].to_numpy(dtype=float)
+            t_ns, nat = _timestamps_ns(df)
+            starts = _track_starts(df)
+            keep = _outlier_keep_mask(
+                lat,
+                lon,
+                t_ns,
+                nat,
+                starts,
+                _row_thresholds(df, speed_threshold),
+                method=method,
+            )
 
-                if speed <= speed_threshold:
-                    keep[i] = True
-                    last_good = i
-                else:
-                    keep[i] = False
-                    # last_good intentionally NOT updated
+            # Studies without outliers are left exactly as they are
+            if keep.all():
+                logger.info(f"[{key}] Percentage of rows remaining 100.00")
+                continue
 
             filtered = df[keep].reset_index(drop=True)
 
+            if set(METRIC_COLUMNS).issubset(filtered.columns):
+                patched = _patch_metrics(
+                    filtered, keep, lat, lon, t_ns, nat, starts,
+                    method=method
+                )
+                logger.info(
+                    f"[{key}] {original - len(filtered)} outliers removed, "
+                    f"{patched} rows had metrics patched"
+                )
+
             after = len(filtered)
-            percent = (after / original) * 100
-            print(f"Percentage of rows remaining {percent:.2f}")
+            percent = (after / original) * 100 if original else 100.0
+            logger.info(
+                f"[{key}] Percentage of rows remaining {percent:.2f}"
+            )
 
             data_dict[key] = filtered
 
@@ -363,6 +865,34 @@ def remove_outliers(data_dict, speed_threshold=10):
         raise
 
 
+def _row_thresholds(df, speed_threshold):
+    # Per-row threshold array for remove_outliers
+    if speed_threshold is None or isinstance(speed_threshold, dict):
+        return species_speed_thresholds(df, speed_threshold)
+    return np.broadcast_to(
+        np.asarray(speed_threshold, dtype=float), (len(df),)
+    )
+
+
+def _recode_categories(series, mapping):
+    """
+    Replace values of a categorical series through mapping by working
+    on its categories. Values mapped to None become missing.
+    """
+    renamed = [mapping.get(c, c) for c in series.cat.categories]
+    categories = pd.Index(
+        [c for c in dict.fromkeys(renamed) if c is not None]
+    )
+    # Old code -> new code, -1 marks missing
+    lookup = np.append(categories.get_indexer(renamed), -1)
+    codes = lookup[series.cat.codes.to_numpy()]
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories),
+        index=series.index,
+        name=series.name,
+    )
+
+
 def fill_missing_column(data_dict):
     # Study-level species fallbacks
     study_species_map = {
@@ -376,9 +906,15 @@ def fill_missing_column(data_dict):
         if key in data_dict:
             df = data_dict[key]
 
+            species_col = df["individual-taxon-canonical-name"]
+            # Categorical columns need the new name as a category first
+            if (
+                isinstance(species_col.dtype, pd.CategoricalDtype)
+                and species not in species_col.cat.categories
+            ):
+                species_col = species_col.cat.add_categories([species])
             df["individual-taxon-canonical-name"] = (
-                df["individual-taxon-canonical-name"]
-                .fillna(species)
+                species_col.fillna(species)
             )
 
             logger.info(
@@ -410,17 +946,24 @@ def change_species_names(data_dict):
     for key, df in data_dict.items():
         if "individual-taxon-canonical-name" in df.columns:
 
-            # Apply mapping
-            df["individual-taxon-canonical-name"] = (
-                df["individual-taxon-canonical-name"].replace(mapping)
-            )
+            species_col = df["individual-taxon-canonical-name"]
+            if isinstance(species_col.dtype, pd.CategoricalDtype):
+                # Rename the categories rather than every row
+                df["individual-taxon-canonical-name"] = _recode_categories(
+                    species_col, {**mapping, "": None, " ": None}
+                )
+            else:
+                # Apply mapping
+                df["individual-taxon-canonical-name"] = (
+                    species_col.replace(mapping)
+                )
 
-            # Normalise empty strings to NA
-            df["individual-taxon-canonical-name"] = (
-                df["individual-taxon-canonical-name"]
-                .replace("", pd.NA)
-                .replace(" ", pd.NA)
-            )
+                # Normalise empty strings to NA
+                df["individual-taxon-canonical-name"] = (
+                    df["individual-taxon-canonical-name"]
+                    .replace("", pd.NA)
+                    .replace(" ", pd.NA)
+                )
 
             # Count remaining NAs
             na_count = df["individual-taxon-canonical-name"].isna().sum()
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+# Identifier and species columns, raw and combined names
+IDENTIFIER_COLUMNS = [
+    "individual-local-identifier",
+    "tag-local-identifier",
+    "individual-taxon-canonical-name",
+    "study-name",
+    "study_tag_id",
+    "individual_local_identifier",
+    "tag_local_identifier",
+    "individual_taxon_canonical_name",
+    "study_name",
+]
+
+# Metrics are computed in float64 and stored as float32. That keeps
+# about 7 significant digits: millimetres on a 10 km step, and a second
+# on gaps of up to about 190 days. Coordinates stay float64, float32
+# would round them to about a metre
+METRIC_DTYPES = {
+    "distance_from_prev_m": "float32",
+    "time_diff_s": "float32",
+    "speed_mps": "float32",
+}
+
+# dtypes of the combined dataset in compact mode, for reading it back
+COMPACT_DTYPES = {
+    **{col: "category" for col in IDENTIFIER_COLUMNS if "_" in col},
+    **METRIC_DTYPES,
+}
+
+
+def compact_frame(df):
+    """
+    Dictionary-encode the identifier columns and downcast the metrics
+    present in df. Columns already compact are left as they are.
+    """
+    for col in df.columns:
+        if col in IDENTIFIER_COLUMNS and df[col].dtype == object:
+            df[col] = df[col].astype("category")
+        elif col in METRIC_DTYPES and df[col].dtype == "float64":
+            df[col] = df[col].astype(METRIC_DTYPES[col])
+    return df
+
+
+def pair_codes(left, right):
+    """
+    Factorize two columns together.
+    Returns the code of each row and the distinct (left, right) pairs.
+    """
+    if len(left) == 0:
+        # MultiIndex.factorize cannot rebuild pairs from no rows
+        return np.empty(0, dtype=np.intp), pd.MultiIndex.from_arrays(
+            [left, right]
+        )
+    return pd.MultiIndex.from_arrays([left, right]).factorize()
+
+
+def joined_labels(left, right, sep="_"):
+    """
+    left + sep + right as strings, built once per distinct pair and
+    taken per row. Matches astype(str) concatenation.
+    """
+    codes, pairs = pair_codes(left, right)
+    labels = np.array([f"{a}{sep}{b}" for a, b in pairs], dtype=object)
+    return labels[codes]
+
+
+def joined_categorical(left, right, sep="_"):
+    """
+    Categorical version of joined_labels.
+    """
+    codes, pairs = pair_codes(left, right)
+    labels = np.array([f"{a}{sep}{b}" for a, b in pairs], dtype=object)
+    # Different pairs can still join to the same label
+    label_codes, categories = pd.factorize(labels)
+    codes = np.where(codes >= 0, label_codes[codes], -1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def unify_categories(frames):
+    """
+    Give every categorical column the same sorted categories in all
+    frames, so concatenating them keeps the category dtype.
+    """
+    frames = list(frames)
+    columns = {
+        col for df in frames for col in df.columns
+        if isinstance(df[col].dtype, pd.CategoricalDtype)
+    }
+    for col in columns:
+        categories = pd.Index([])
+        for df in frames:
+            if col in df.columns:
+                categories = categories.union(
+                    df[col].astype("category").cat.categories
+                )
+        dtype = pd.CategoricalDtype(categories.sort_values())
+        for df in frames:
+            if col in df.columns:
+                df[col] = df[col].astype(dtype)
+    return frames
@@ -1,102 +1,178 @@
 import logging
+import numpy as np
 import pandas as pd
 from src.utils.logging_utils import setup_logger
+from src.transform.compact import (
+    IDENTIFIER_COLUMNS,
+    METRIC_DTYPES,
+    joined_categorical,
+    joined_labels,
+)
+from src.transform.track_registry import assign_track_ids
 
 # Set up the logger with module name and captures every message
 logger = setup_logger(__name__, "Create_new_df.log", level=logging.DEBUG)
 
+# Cleaned column behind each column of the combined dataset, in order
+# study_tag_id (and track_id) are built from study-name and the tag
+OUTPUT_COLUMNS = {
+    "study_tag_id": None,
+    "timestamp": "timestamp",
+    "location_lat": "location-lat",
+    "location_lon": "location-long",
+    "distance_from_prev_m": "distance_from_prev_m",
+    "time_diff_s": "time_diff_s",
+    "speed_mps": "speed_mps",
+    "individual_local_identifier": "individual-local-identifier",
+    "tag_local_identifier": "tag-local-identifier",
+    "individual_taxon_canonical_name": "individual-taxon-canonical-name",
+    "study_name": "study-name",
+}
+
 
 # Set up the logger with module name and captures every message
-def create_combined_df(cleaned_data):
+def create_combined_df(cleaned_data, compact=False, registry=None):
+    """
+    Combine the cleaned studies into one DataFrame.
+    compact keeps identifiers as categoricals, including study_tag_id,
+    and metrics as float32, see src/transform/compact.py.
+    With a track registry an integer track_id column is added, see
+    src/transform/track_registry.py.
+
+    Each study's output columns are picked in one step without copying,
+    then written straight into preallocated columns of the result.
+    """
 
     logger.info("Starting combined df creation")
 
-    # Task 1 - Add a unique identifier for each column
-    logger.info("Starting unique column creation")
-    cleaned_data = create_unique_column(cleaned_data)
-    logger.info("Unique column created")
-
-    # Task 2 - Keep required useful columns
-    logger.info("Starting retention of only useful columns")
-    cleaned_data = retain_useful_columns(cleaned_data)
-    logger.info("Retention of only useful columns done")
+    # Task 1 - Output columns of every study, nothing copied yet
+    logger.info("Starting output column selection")
+    studies = [
+        study_columns(df, compact=compact, registry=registry)
+        for df in cleaned_data.values()
+    ]
+    logger.info("Output columns selected")
 
-    # Task 3 - Keep required useful columns
-    logger.info("Starting column_rename")
-    cleaned_data = change_column_names(cleaned_data)
-    logger.info("Column rename done")
-
-    # Task 4 - Combine all dataframes into one
+    # Task 2 - Fill one preallocated column per output column
     logger.info("Starting combining dataframes")
-    combined_data = combined_df(cleaned_data)
-    logger.info("Combined dataframe done")
+    combined_data = assemble_columns(studies, compact=compact)
+    logger.info(f"Combined dataframe done, {len(combined_data)} rows")
 
     # Return the data
     return combined_data
 
 
-def create_unique_column(cleaned_data):
-    # For every df in the data
-    for key, df in cleaned_data.items():
-        # Create a new column with study name and tag identifier
-        df["study_tag_id"] = (
-            df["study-name"].astype(str)
-            + "_"
-            + df["tag-local-identifier"].astype(str)
+def study_columns(df, compact=False, registry=None):
+    """
+    The combined schema of one cleaned study as {name: column}.
+    Existing columns are passed through, only the ids are built.
+    """
+    columns = {}
+    if registry is not None:
+        columns["track_id"] = assign_track_ids(
+            df["study-name"], df["tag-local-identifier"], registry
+        )
+    join = joined_categorical if compact else joined_labels
+    columns["study_tag_id"] = join(
+        df["study-name"], df["tag-local-identifier"]
+    )
+    for name, source in OUTPUT_COLUMNS.items():
+        if source is not None:
+            columns[name] = df[source]
+    return columns
+
+
+def assemble_columns(studies, compact=False):
+    """
+    Stack the columns of every study into one DataFrame.
+
+    Each output column is allocated once at its final length and every
+    study is copied into its slice, so the only copy made is the output
+    itself. Gives the same result as pd.concat(..., ignore_index=True),
+    with compact_frame and unify_categories applied first if compact.
+    """
+    if not studies:
+        return pd.DataFrame()
+    names = list(studies[0])
+    if any(list(study) != names for study in studies):
+        # Studies disagree on columns, leave the alignment to pandas
+        logger.warning("Studies have different columns, using pd.concat")
+        return pd.concat(
+            [pd.DataFrame(study) for study in studies], ignore_index=True
         )
-        # Save the data
-        cleaned_data[key] = df
-    return cleaned_data
-
-
-def retain_useful_columns(cleaned_data):
-    # For every df in the data
-    for key, df in cleaned_data.items():
-        # Save the useful columns for analysis
-        df = df[
-            [
-                "study_tag_id",
-                "timestamp",
-                "location-lat",
-                "location-long",
-                "distance_from_prev_m",
-                "time_diff_s",
-                "speed_mps",
-                "individual-local-identifier",
-                "tag-local-identifier",
-                "individual-taxon-canonical-name",
-                "study-name"
-            ]
-        ]
-        # Save the data
-        cleaned_data[key] = df
-    return cleaned_data
-
-
-def change_column_names(cleaned_data):
-    for key, df in cleaned_data.items():
-        df = df.rename(columns={
-            "location-lat": "location_lat",
-            "location-long": "location_lon",
-            "individual-local-identifier": "individual_local_identifier",
-            "tag-local-identifier": "tag_local_identifier",
-            "individual-taxon-canonical-name":
-                "individual_taxon_canonical_name",
-            "study-name": "study_name"
-        })
-        cleaned_data[key] = df
-    return cleaned_data
-
-
-def combined_df(cleaned_data):
-    # Set a holder to just store the dfs
-    dfs = []
-    # For every df in the data save it to the list
-    for df in cleaned_data.values():
-        dfs.append(df)
-
-    # Combine the dataframes into a combined df
-    # Ignore index so no overlaps
-    combined_df = pd.concat(dfs, ignore_index=True)
-    print(combined_df["individual_taxon_canonical_name"].unique())
-    return combined_df
+
+    lengths = [len(study[names[0]]) for study in studies]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    columns = {}
+    for name in names:
+        parts = [pd.Series(study[name], copy=False) for study in studies]
+        columns[name] = _fill_column(name, parts, bounds, compact)
+    return pd.DataFrame(columns, copy=False)
+
+
+def _compact_dtype(name, dtype, compact):
+    # dtype a study column would have after compact_frame
+    if compact and name in IDENTIFIER_COLUMNS and dtype == object:
+        return "category"
+    if compact and name in METRIC_DTYPES and dtype == "float64":
+        return np.dtype(METRIC_DTYPES[name])
+    return dtype
+
+
+def _output_dtype(name, parts, compact):
+    """
+    dtype pd.concat would give the column, as numpy or categorical.
+    None when it is some other extension dtype.
+    """
+    dtypes = [_compact_dtype(name, part.dtype, compact) for part in parts]
+    categorical = [
+        d == "category" or isinstance(d, pd.CategoricalDtype) for d in dtypes
+    ]
+    if compact and name in IDENTIFIER_COLUMNS and any(categorical):
+        # Same sorted categories as unify_categories
+        categories = pd.Index([])
+        for part in parts:
+            categories = categories.union(
+                part.cat.categories
+                if isinstance(part.dtype, pd.CategoricalDtype)
+                else pd.Index(part.dropna().unique())
+            )
+        return pd.CategoricalDtype(categories.sort_values())
+    if all(d == dtypes[0] for d in dtypes):
+        if isinstance(dtypes[0], pd.CategoricalDtype):
+            return dtypes[0]
+        return dtypes[0] if isinstance(dtypes[0], np.dtype) else None
+    if any(categorical) or not all(
+        isinstance(d, np.dtype) and d.kind in "iuf" for d in dtypes
+    ):
+        return np.dtype(object)
+    return np.result_type(*dtypes)
+
+
+def _fill_column(name, parts, bounds, compact):
+    """
+    One output column, filled study by study into a single allocation.
+    """
+    dtype = _output_dtype(name, parts, compact)
+    if dtype is None:
+        return pd.concat(parts, ignore_index=True)
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Codes only, recoded to the shared categories
+        size = len(dtype.categories)
+        codes = np.empty(bounds[-1], dtype=(
+            np.int8 if size < 2**7 else
+            np.int16 if size < 2**15 else np.int32
+        ))
+        for part, start, end in zip(parts, bounds[:-1], bounds[1:]):
+            codes[start:end] = pd.Categorical(part, dtype=dtype).codes
+        return pd.Series(
+            pd.Categorical.from_codes(codes, dtype=dtype), copy=False
+        )
+
+    values = np.empty(bounds[-1], dtype=dtype)
+    for part, start, end in zip(parts, bounds[:-1], bounds[1:]):
+        values[start:end] = part.to_numpy(dtype=dtype)
+    # Explicit dtype, a bare object array would be copied while pandas
+    # checks it for dates
+    return pd.Series(values, dtype=dtype, copy=False)
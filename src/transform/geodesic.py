@@ -0,0 +1,198 @@
+import logging
+import numpy as np
+import geopy.distance
+from src.utils.logging_utils import setup_logger
+
+# Set up the logger with module name and captures every message
+logger = setup_logger(__name__, "Geodesic.log", level=logging.DEBUG)
+
+# Mean earth radius (IUGG) used by the haversine tier
+EARTH_RADIUS_M = 6371008.8
+
+# WGS-84 ellipsoid, the same one geopy uses by default
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+# Accuracy tiers from fastest to most exact
+# haversine - sphere, up to ~0.5% error, cheapest
+# vincenty  - vectorised ellipsoid, within 1 mm of geopy
+# geodesic  - geopy called per pair, exact but slow
+DISTANCE_METHODS = ("haversine", "vincenty", "geodesic")
+DEFAULT_METHOD = "vincenty"
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """
+    Great circle distance in metres between arrays of points.
+    """
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lam = np.radians(np.asarray(lon2) - np.asarray(lon1))
+
+    a = (
+        np.sin(d_phi / 2) ** 2
+        + np.cos(phi1) * np.cos(phi2) * np.sin(d_lam / 2) ** 2
+    )
+    # Clip guards against rounding pushing a just above 1
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def geodesic_m(lat1, lon1, lat2, lon2):
+    """
+    Exact geopy distance in metres, one call per pair.
+    Pairs geopy cannot handle come back as NaN.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        np.asarray(lat1, dtype=float), np.asarray(lon1, dtype=float),
+        np.asarray(lat2, dtype=float), np.asarray(lon2, dtype=float)
+    )
+    out = np.full(lat1.shape, np.nan)
+    for i in np.ndindex(lat1.shape):
+        try:
+            out[i] = geopy.distance.distance(
+                (lat1[i], lon1[i]), (lat2[i], lon2[i])
+            ).meters
+        except Exception as e:
+            logger.error(f"d = NaN due to error {e}")
+    return out
+
+
+def vincenty_m(lat1, lon1, lat2, lon2, max_iter=200, tol=1e-12):
+    """
+    Vincenty inverse formula on WGS-84 solved for all pairs at once.
+
+    Agrees with geopy's geodesic to within 1 mm. Nearly antipodal pairs,
+    where the iteration does not converge, fall back to geopy.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        np.asarray(lat1, dtype=float), np.asarray(lon1, dtype=float),
+        np.asarray(lat2, dtype=float), np.asarray(lon2, dtype=float)
+    )
+    shape = lat1.shape
+    lat1, lon1, lat2, lon2 = (
+        x.ravel() for x in (lat1, lon1, lat2, lon2)
+    )
+    f = WGS84_F
+
+    big_l = np.radians(lon2 - lon1)
+    u1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    lam = big_l.copy()
+    sin_sigma = np.zeros_like(lam)
+    cos_sigma = np.ones_like(lam)
+    sigma = np.zeros_like(lam)
+    cos2_alpha = np.ones_like(lam)
+    cos_2sigma_m = np.zeros_like(lam)
+
+    # Only rows with real coordinates take part in the iteration
+    active = np.isfinite(lam) & np.isfinite(u1) & np.isfinite(u2)
+    finite = active.copy()
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(max_iter):
+            if not active.any():
+                break
+            idx = np.nonzero(active)[0]
+            a_l = lam[idx]
+            s1, c1 = sin_u1[idx], cos_u1[idx]
+            s2, c2 = sin_u2[idx], cos_u2[idx]
+
+            sin_lam, cos_lam = np.sin(a_l), np.cos(a_l)
+            s_sig = np.sqrt(
+                (c2 * sin_lam) ** 2 + (c1 * s2 - s1 * c2 * cos_lam) ** 2
+            )
+            c_sig = s1 * s2 + c1 * c2 * cos_lam
+            sig = np.arctan2(s_sig, c_sig)
+            # Coincident points have sin sigma of zero
+            sin_alpha = np.where(
+                s_sig == 0, 0.0, c1 * c2 * sin_lam / s_sig
+            )
+            c2_alpha = 1 - sin_alpha ** 2
+            # Equatorial lines have cos^2 alpha of zero
+            c_2sm = np.where(
+                c2_alpha == 0, 0.0, c_sig - 2 * s1 * s2 / c2_alpha
+            )
+            big_c = f / 16 * c2_alpha * (4 + f * (4 - 3 * c2_alpha))
+            new_lam = big_l[idx] + (1 - big_c) * f * sin_alpha * (
+                sig + big_c * s_sig * (
+                    c_2sm + big_c * c_sig * (-1 + 2 * c_2sm ** 2)
+                )
+            )
+
+            lam[idx] = new_lam
+            sin_sigma[idx] = s_sig
+            cos_sigma[idx] = c_sig
+            sigma[idx] = sig
+            cos2_alpha[idx] = c2_alpha
+            cos_2sigma_m[idx] = c_2sm
+            active[idx] = np.abs(new_lam - a_l) > tol
+
+        u_sq = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        big_a = 1 + u_sq / 16384 * (
+            4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq))
+        )
+        big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = big_b * sin_sigma * (
+            cos_2sigma_m + big_b / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                - big_b / 6 * cos_2sigma_m
+                * (-3 + 4 * sin_sigma ** 2)
+                * (-3 + 4 * cos_2sigma_m ** 2)
+            )
+        )
+        out = WGS84_B * big_a * (sigma - delta_sigma)
+
+    out = np.where(finite, out, np.nan)
+
+    # Anything still iterating is close to antipodal, let geopy solve it
+    if active.any():
+        logger.debug(f"{int(active.sum())} pairs fell back to geopy")
+        out[active] = geodesic_m(
+            lat1[active], lon1[active], lat2[active], lon2[active]
+        )
+    return out.reshape(shape)
+
+
+def pairwise_distance_m(lat1, lon1, lat2, lon2, method=DEFAULT_METHOD):
+    """
+    Distance in metres between two arrays of points using one of the
+    accuracy tiers in DISTANCE_METHODS.
+    """
+    if method == "haversine":
+        return haversine_m(lat1, lon1, lat2, lon2)
+    if method == "vincenty":
+        return vincenty_m(lat1, lon1, lat2, lon2)
+    if method == "geodesic":
+        return geodesic_m(lat1, lon1, lat2, lon2)
+    raise ValueError(
+        f"Unknown distance method {method!r}, "
+        f"expected one of {DISTANCE_METHODS}"
+    )
+
+
+def distance_from_prev_m(lat, lon, track_start, method=DEFAULT_METHOD):
+    """
+    Distance from the previous fix for a whole sorted frame in one pass.
+
+    lat and lon are the coordinate columns in track order and track_start
+    is True on the first row of every whale and tag. Those rows are zero.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    track_start = np.asarray(track_start, dtype=bool)
+
+    distances = np.zeros(len(lat))
+    if len(lat) < 2:
+        return distances
+
+    # Only pairs inside the same track need a distance
+    rows = np.nonzero(~track_start[1:])[0] + 1
+    distances[rows] = pairwise_distance_m(
+        lat[rows - 1], lon[rows - 1], lat[rows], lon[rows], method=method
+    )
+    return distances
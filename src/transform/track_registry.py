@@ -0,0 +1,95 @@
+import logging
+import uuid
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.utils.file_utils import atomic_write
+from src.utils.logging_utils import setup_logger
+from src.transform.compact import pair_codes
+
+logger = setup_logger(__name__, "Track_registry.log", level=logging.DEBUG)
+
+# Track ids handed out so far, also the lookup table back to labels
+root_directory = Path(__file__).resolve().parents[2]
+registry_path = root_directory / "data" / "registry" / "track_ids.csv"
+
+REGISTRY_COLUMNS = [
+    "track_id", "study_name", "tag_local_identifier", "study_tag_id"
+]
+
+
+def load_registry(path=None) -> dict:
+    """
+    Read the registry as {(study, tag): track_id}, empty if there is
+    none yet. Keys are the text the labels are built from.
+    """
+    path = Path(registry_path if path is None else path)
+    if not path.exists():
+        return {}
+    lookup = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return dict(zip(
+        zip(lookup["study_name"], lookup["tag_local_identifier"]),
+        lookup["track_id"].astype(int),
+    ))
+
+
+def save_registry(registry, path=None):
+    """
+    Write the registry with each label, through a temporary file.
+    """
+    path = Path(registry_path if path is None else path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lookup = pd.DataFrame(
+        [(track_id, study, tag, f"{study}_{tag}")
+         for (study, tag), track_id in registry.items()],
+        columns=REGISTRY_COLUMNS,
+    ).sort_values("track_id")
+    with atomic_write(path) as tmp_path:
+        lookup.to_csv(tmp_path, index=False)
+
+
+def registry_generation(path=None) -> str:
+    """
+    Token of the registry in use, kept in a file next to it. A new one
+    is drawn whenever there is no registry, so the ids of a deleted
+    registry, already in the published dataset, are never mixed with
+    the ids of its replacement. See study_input_keys.
+    """
+    path = Path(registry_path if path is None else path)
+    token_path = path.with_suffix(".generation")
+    if path.exists() and token_path.exists():
+        return token_path.read_text().strip()
+    token = uuid.uuid4().hex
+    token_path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_write(token_path) as tmp_path:
+        tmp_path.write_text(token)
+    logger.info(f"New track registry, generation {token}")
+    return token
+
+
+def load_track_lookup(path=None) -> pd.DataFrame:
+    # The registry as a table, one row per track id
+    return pd.read_csv(
+        registry_path if path is None else path,
+        dtype={"study_name": str, "tag_local_identifier": str},
+    )
+
+
+def assign_track_ids(study, tag, registry):
+    """
+    Integer track id of every row, one per (study, tag) pair.
+
+    Pairs already in the registry keep their id. New pairs get the
+    next ids in sorted order and are added to the registry, so ids stay
+    the same from run to run.
+    """
+    codes, pairs = pair_codes(study, tag)
+    keys = [(str(s), str(t)) for s, t in pairs]
+    new = sorted(set(keys) - registry.keys())
+    next_id = max(registry.values(), default=-1) + 1
+    for offset, key in enumerate(new):
+        registry[key] = next_id + offset
+    if new:
+        logger.info(f"{len(new)} new tracks, ids from {next_id}")
+    ids = np.array([registry[key] for key in keys], dtype="int32")
+    return ids[codes]
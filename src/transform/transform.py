@@ -1,11 +1,34 @@
+import numpy as np
+import pandas as pd
 from src.transform.clean_data import clean_data
+from src.transform.compact import unify_categories
 from src.utils.logging_utils import setup_logger
 from src.transform.create_new_df import create_combined_df
+from src.extract.manifest import (
+    iter_cleaned_study,
+    load_cleaned_study,
+    store_cleaned_study,
+)
+from src.extract.spill import (
+    TRACK_KEY,
+    read_partition,
+    remove_spilled_study,
+)
 
 
-def transform_data(data_dict: dict):
+def transform_data(data_dict: dict, workers: int = 1, manifest=None,
+                   compact: bool = False, registry=None,
+                   dedup_across_studies: bool = False,
+                   per_study: bool = False, skip=()):
     """
     Transforms the data in the provided dictionary of DataFrames.
+    workers, compact and dedup_across_studies are passed to clean_data,
+    compact and registry to create_combined_df.
+    With a manifest, newly cleaned studies are cached and unchanged
+    studies are read back from the cache before combining, except
+    those in skip.
+    per_study returns {name: combined DataFrame} instead of one frame,
+    so the load stage knows which study each row came from.
     """
     logger = setup_logger("transform_data", "transform_data.log")
 
@@ -13,14 +36,155 @@ def transform_data(data_dict: dict):
         logger.info("Starting data transformation process")
         # Clean transaction data
         logger.info("Cleaning data...")
-        cleaned_data = clean_data(data_dict)
+        cleaned_data = clean_data(
+            data_dict, workers=workers, compact=compact,
+            dedup_across_studies=dedup_across_studies,
+        )
         logger.info("Data cleaned successfully.")
+        if manifest is not None:
+            cleaned_data = merge_cached_studies(
+                cleaned_data, manifest, skip
+            )
+        if per_study:
+            logger.info("Shaping each study...")
+            return {
+                name: create_combined_df(
+                    {name: df}, compact=compact, registry=registry
+                )
+                for name, df in cleaned_data.items()
+            }
         # Combine data in one dataframe
         logger.info("Combining into one df...")
-        combined_df = create_combined_df(cleaned_data)
+        combined_df = create_combined_df(
+            cleaned_data, compact=compact, registry=registry
+        )
         logger.info("Data combined successfully.")
 
         return combined_df
     except Exception as e:
         logger.error(f"Data transformation failed: {str(e)}")
         raise
+
+
+def merge_cached_studies(cleaned_data: dict, manifest: dict,
+                         skip=()) -> dict:
+    """
+    Cache the freshly cleaned studies and add the unchanged ones from
+    the cache, in manifest order. Cached studies in skip are left out.
+    """
+    for name, df in cleaned_data.items():
+        store_cleaned_study(manifest, name, df)
+    return {
+        name: (
+            cleaned_data[name] if name in cleaned_data
+            else load_cleaned_study(manifest, name)
+        )
+        for name in manifest["studies"]
+        if name in cleaned_data or name not in skip
+    }
+
+
+def transform_stream(studies, workers: int = 1, manifest=None,
+                     compact: bool = False, registry=None, skip=()):
+    """
+    Clean and shape one study at a time.
+
+    studies yields (name, DataFrame) pairs, see extract_data_stream.
+    Yields (name, DataFrame) with each study in the combined schema,
+    ready to be appended to the output. With a manifest, unchanged
+    studies are read back from the cache in manifest order, except
+    those in skip, and only changed ones are pulled from studies.
+    Spilled studies are yielded, cached and read back a partition at
+    a time.
+    """
+    logger = setup_logger("transform_data", "transform_data.log")
+    studies = iter(studies)
+    try:
+        if manifest is None:
+            for name, df in studies:
+                for cleaned in _clean_study(name, df, workers, compact):
+                    yield name, create_combined_df(
+                        cleaned, compact=compact, registry=registry
+                    )
+                logger.info(f"Streamed {name}")
+            return
+
+        for name, entry in manifest["studies"].items():
+            if entry["output"] is None:
+                # Changed studies arrive in the same order as the manifest
+                name, df = next(studies)
+                spilled = isinstance(df, list)
+                for i, cleaned in enumerate(
+                    _clean_study(name, df, workers, compact)
+                ):
+                    store_cleaned_study(
+                        manifest, name, cleaned[name],
+                        part=i if spilled else None,
+                    )
+                    yield name, create_combined_df(
+                        cleaned, compact=compact, registry=registry
+                    )
+            elif name in skip:
+                continue
+            else:
+                for cleaned in iter_cleaned_study(manifest, name):
+                    yield name, create_combined_df(
+                        {name: cleaned}, compact=compact, registry=registry,
+                    )
+            logger.info(f"Streamed {name}")
+    except Exception as e:
+        logger.error(f"Data transformation failed: {str(e)}")
+        raise
+
+
+def _clean_study(name, df, workers, compact=False):
+    # A list means the study was spilled, see clean_spilled_study
+    if isinstance(df, list):
+        yield from clean_spilled_study(name, df, workers, compact)
+    else:
+        yield clean_data({name: df}, workers=workers, compact=compact)
+
+
+def clean_spilled_study(name, partitions, workers: int = 1,
+                        compact: bool = False):
+    """
+    Clean a study spilled by spill_study one partition at a time.
+    Partitions hold whole tracks, except a track over the budget, which
+    is cut by time. The last kept fix of such a track is put in front
+    of its next slice and taken out again after cleaning, so each fix
+    is judged from the same fix as in a whole-study clean.
+    Yields {name: cleaned partition} and removes the partition files
+    once done.
+    """
+    logger = setup_logger("transform_data", "transform_data.log")
+    carry = None
+    try:
+        for i, path in enumerate(partitions):
+            df = read_partition(path, compact)
+            carried = carry is not None and _track_rows(df, carry).any()
+            if carried:
+                columns = [col for col in df.columns if col in carry.columns]
+                df = pd.concat(
+                    unify_categories([carry[columns].copy(), df]),
+                    ignore_index=True,
+                )
+            cleaned = clean_data({name: df}, workers=workers,
+                                 compact=compact)
+            if carried:
+                df = cleaned[name]
+                first = np.argmax(_track_rows(df, carry))
+                cleaned[name] = df.drop(index=first).reset_index(drop=True)
+            if len(cleaned[name]):
+                carry = cleaned[name].iloc[[-1]].copy()
+            yield cleaned
+            logger.info(f"[{name}] partition {i + 1}/{len(partitions)}")
+    finally:
+        remove_spilled_study(partitions)
+
+
+def _track_rows(df, row):
+    # Rows of df on the track of the one-row frame row
+    mask = np.ones(len(df), dtype=bool)
+    for col in TRACK_KEY:
+        mask &= (df[col] == row[col].iloc[0]).to_numpy()
+    return mask
@@ -0,0 +1,43 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# Read once, mkstemp files are private to the owner
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _fsync(path):
+    # Flush the file to disk before it is renamed into place
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+@contextmanager
+def atomic_write(path):
+    """
+    Write a file through a hidden temporary file next to it.
+
+    Yields the temporary path to write to. Every call gets its own
+    temporary file, so concurrent writers of the same path never share
+    one. When the block finishes it is synced to disk and renamed over
+    path in one step, so readers see the old file or the new one, never
+    part of it. If the block raises, the temporary file is removed and
+    path is left as it was.
+    """
+    path = Path(path)
+    fd, name = tempfile.mkstemp(
+        prefix=f".{path.name}.", suffix=".tmp", dir=path.parent
+    )
+    os.close(fd)
+    tmp_path = Path(name)
+    try:
+        # Same permissions as a file opened for writing
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        yield tmp_path
+        _fsync(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
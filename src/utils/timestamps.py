@@ -0,0 +1,83 @@
+import logging
+import pandas as pd
+from src.utils.logging_utils import setup_logger
+
+logger = setup_logger(__name__, "Timestamps.log", level=logging.DEBUG)
+
+# Formats seen in Movebank exports and our own processed output
+# Tried in order, the first one parsing the most of the sample wins
+CANDIDATE_FORMATS = [
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+]
+
+
+def detect_timestamp_format(values, sample_size=1000):
+    """
+    Pick the candidate format that parses the most of a sample of the
+    non-missing values. Returns None when no candidate parses any.
+    """
+    sample = values.dropna()
+    if len(sample) > sample_size:
+        # Spread the sample over the file rather than its first rows
+        step = len(sample) // sample_size
+        sample = sample.iloc[::step][:sample_size]
+    sample = sample.astype(str)
+    if sample.empty:
+        return None
+
+    best_format, best_count = None, 0
+    for fmt in CANDIDATE_FORMATS:
+        count = pd.to_datetime(sample, format=fmt, errors="coerce").notna()
+        count = int(count.sum())
+        if count > best_count:
+            best_format, best_count = fmt, count
+            if count == len(sample):
+                break
+    return best_format
+
+
+def parse_timestamps(values, name="timestamp", sample_size=1000):
+    """
+    Parse a column of timestamps with one vectorised pass.
+
+    The dominant format is detected from a sample and applied to the
+    whole column. Only rows it cannot parse go through the slow mixed
+    format parser. Unparseable values become NaT and values with a UTC
+    offset are converted to naive UTC.
+
+    Returns the parsed series and the number of rows that needed the
+    fallback.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, 0
+
+    fmt = detect_timestamp_format(values, sample_size)
+    if fmt is None:
+        parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    else:
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+
+    failed = parsed.isna() & values.notna()
+    fallback = int(failed.sum())
+    if fallback:
+        # Movebank times are UTC, offsets are folded in and dropped
+        parsed[failed] = pd.to_datetime(
+            values[failed].astype(str), format="mixed", errors="coerce",
+            utc=True,
+        ).dt.tz_localize(None)
+
+    logger.info(
+        f"[{name}] parsed {len(values)} timestamps with format {fmt!r}, "
+        f"{fallback} rows needed the mixed format fallback"
+    )
+    return parsed, fallback
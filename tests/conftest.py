@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def write_study(path, seed=0, rows=200, tag=1000):
+    """
+    Write a synthetic raw study to path, two whales on one tag.
+    The study is named after the file, different seeds give different
+    content.
+    """
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "timestamp": (
+            pd.Timestamp("2013-03-08")
+            + pd.to_timedelta(np.cumsum(rng.integers(0, 3600, rows)), "s")
+        ).strftime("%Y-%m-%d %H:%M:%S.000"),
+        "location-lat": -60 + np.cumsum(rng.normal(0, 0.01, rows)),
+        "location-long": 160 + np.cumsum(rng.normal(0, 0.01, rows)),
+        "individual-local-identifier": rng.choice(["W1", "W2"], rows),
+        "tag-local-identifier": tag,
+        "individual-taxon-canonical-name": "Balaenoptera musculus",
+        "study-name": path.stem,
+    }).to_csv(path, index=False)
+
+
+def combined_frame(study, species, times, lat=None):
+    """
+    Rows of the combined dataset for one track of a study.
+    location_lat counts the rows unless lat is given.
+    """
+    return pd.DataFrame({
+        "track_id": 0,
+        "study_tag_id": f"{study}_1",
+        "timestamp": pd.to_datetime(times, format="ISO8601"),
+        "location_lat": range(len(times)) if lat is None else lat,
+        "speed_mps": 1.5,
+        "tag_local_identifier": 1,
+        "individual_taxon_canonical_name": species,
+        "study_name": study,
+    })
+
+
+def daily_fixes(rows=400, seed=0):
+    """
+    Combined fixes of three whales over 20 days, two blue whales and a
+    narwhal, with distances and speeds.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "timestamp": pd.Timestamp("2020-01-01")
+        + pd.to_timedelta(np.sort(rng.integers(0, 20 * 86400, rows)), "s"),
+        "individual_local_identifier": rng.choice(["W1", "W2", "W3"], rows),
+        "individual_taxon_canonical_name": "Blue whale",
+        "study_name": "Study A",
+        "distance_from_prev_m": rng.uniform(0, 5000, rows),
+        "speed_mps": rng.uniform(0, 3, rows),
+    }).assign(individual_taxon_canonical_name=lambda df: np.where(
+        df["individual_local_identifier"] == "W3", "Narwhal", "Blue whale"
+    ))
+
+
+@pytest.fixture
+def raw_dir(tmp_path, mocker):
+    # Raw data, cache, registry and spill files all live in tmp_path
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    mocker.patch("src.extract.create_file_list.data_directory", raw)
+    mocker.patch("src.extract.manifest.cache_directory", tmp_path / "cache")
+    mocker.patch(
+        "src.transform.track_registry.registry_path",
+        tmp_path / "registry" / "track_ids.csv",
+    )
+    mocker.patch("src.extract.spill.spill_directory", tmp_path / "spill")
+    return raw
@@ -1,7 +1,7 @@
 import subprocess
 import sys
 from pathlib import Path
-import pandas as pd
+from src.load.load import read_processed
 
 
 def test_etl_pipeline_runs_and_creates_output():
@@ -23,15 +23,10 @@ def test_etl_pipeline_runs_and_creates_output():
     # The ETL path should succeed
     assert result.returncode == 0, f"ETL pipeline failed: {result.stderr}"
 
-    # Output file
-    output_path = (
-        project_root
-        / "data"
-        / "processed"
-        / "combined_cleaned_data.csv"
-    )
-    assert output_path.exists(), "Expected output file not created."
+    # Output dataset, Parquet partitioned by species and study
+    output_path = project_root / "data" / "processed" / "whales"
+    assert output_path.exists(), "Expected output dataset not created."
 
-    # File must contain data
-    df = pd.read_csv(output_path)
-    assert len(df) > 0, "Output CSV is empty."
+    # Dataset must contain data
+    df = read_processed(root=output_path)
+    assert len(df) > 0, "Output dataset is empty."
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from src.load.aggregates import (
+    daily_summary,
+    read_daily_summary,
+    read_species_rankings,
+    species_rankings,
+    write_summaries,
+)
+from src.load.load import save_combined_parquet
+from tests.conftest import daily_fixes
+
+
+def _page_rankings(df):
+    # What the Cetacean Olympics page computed on every rerun
+    df = df.assign(obs_date=df["timestamp"].dt.date)
+    individuals = df.groupby(
+        "individual_local_identifier", as_index=False
+    ).agg(
+        total_distance_m=("distance_from_prev_m", "sum"),
+        days_observed=("obs_date", "nunique"),
+        avg_speed_mps=("speed_mps", "mean"),
+        species=("individual_taxon_canonical_name", "first"),
+    )
+    individuals = individuals[individuals["days_observed"] >= 5].copy()
+    individuals["daily_km"] = (
+        individuals["total_distance_m"] / 1000
+    ) / individuals["days_observed"]
+    return individuals.groupby("species", as_index=False).agg(
+        mean_daily_km=("daily_km", "mean"),
+        mean_speed=("avg_speed_mps", "mean"),
+        No=("individual_local_identifier", "count"),
+    )
+
+
+def test_daily_summary_adds_up_batches():
+    df = daily_fixes()
+
+    whole = daily_summary([df])
+    batched = daily_summary([df.iloc[:150], df.iloc[150:]])
+
+    pd.testing.assert_frame_equal(batched, whole)
+    assert whole["fix_count"].sum() == len(df)
+    assert np.isclose(
+        whole["distance_m"].sum(), df["distance_from_prev_m"].sum()
+    )
+
+
+def test_species_rankings_match_page():
+    df = daily_fixes()
+
+    rankings = species_rankings(daily_summary([df]))
+
+    expected = _page_rankings(df)
+    pd.testing.assert_frame_equal(rankings[expected.columns], expected)
+    top = rankings.sort_values("distance_rank")
+    assert top["mean_daily_km"].is_monotonic_decreasing
+
+
+def test_write_summaries_from_dataset(tmp_path):
+    df = daily_fixes()
+    root = save_combined_parquet(df, root=tmp_path / "whales")
+
+    daily_path, rankings_path = write_summaries(
+        root, daily_path=tmp_path / "daily.parquet",
+        rankings_path=tmp_path / "rankings.parquet",
+    )
+
+    daily = read_daily_summary(path=daily_path)
+    assert daily["fix_count"].sum() == len(df)
+    assert list(read_species_rankings(rankings_path)["species"]) == [
+        "Blue whale", "Narwhal"
+    ]
@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 import geopy.distance
 import pandas as pd
 from pathlib import Path
@@ -11,7 +12,17 @@ from src.transform.clean_data import (
     remove_zero_time_delta,
     speed_calculation,
     remove_outliers,
-    clean_data
+    derive_movement_metrics,
+    fill_missing_column,
+    change_species_names,
+    clean_data,
+    drop_duplicates,
+    filter_argos_fixes,
+    species_speed_thresholds,
+    DEFAULT_SPEED_THRESHOLD,
+    _is_track_sorted,
+    _sort_tracks,
+    _partition_study,
 )
 
 # Set up pytests for coding
@@ -215,7 +226,8 @@ class TestDistanceCalculation():
 
         actual = updated.loc[1, "distance_from_prev_m"]
 
-        assert actual == expected
+        # Vectorised ellipsoid tier agrees with geopy to within 1 mm
+        assert actual == pytest.approx(expected, abs=1e-3)
 
     def test_distance_calculator_sorting(self, whale_data_distance_calculated):
         # Test that the sorting stage works correctly on actual data
@@ -455,3 +467,368 @@ def test_clean_data_end_to_end(whale_data):
         Would like to test for no outliers but some still remain
         Future work!
         '''
+
+
+def _reference_outlier_keep(df, speed_threshold=10):
+    # Straight row by row version of the last good point filter
+    keep = [True] + [False] * (len(df) - 1)
+    last_good = 0
+    for i in range(1, len(df)):
+        ids = ["individual-local-identifier", "tag-local-identifier"]
+        if (df.loc[i, ids] != df.loc[last_good, ids]).any():
+            keep[i] = True
+            last_good = i
+            continue
+        dist_m = geopy.distance.distance(
+            (df.at[last_good, "location-lat"],
+             df.at[last_good, "location-long"]),
+            (df.at[i, "location-lat"], df.at[i, "location-long"]),
+        ).meters
+        time_s = (
+            df.at[i, "timestamp"] - df.at[last_good, "timestamp"]
+        ).total_seconds()
+        speed = dist_m / time_s if time_s > 0 else float("inf")
+        if speed <= speed_threshold:
+            keep[i] = True
+            last_good = i
+    return keep
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_outlier_kernel_matches_row_loop(seed):
+    # Several tracks with bursts of jumps and repeated timestamps
+    rng = np.random.default_rng(seed)
+    n = 300
+    df = pd.DataFrame({
+        "individual-local-identifier": np.sort(
+            rng.integers(0, 6, n)).astype(str),
+        "tag-local-identifier": "T1",
+        "timestamp": pd.Timestamp("2020-01-01") + pd.to_timedelta(
+            np.sort(rng.integers(0, 200000, n)), unit="s"),
+        "location-lat": rng.normal(0, 0.05, n) * rng.choice([0.1, 1, 5], n),
+        "location-long": rng.normal(0, 0.05, n),
+    })
+    df = df.sort_values(
+        ["individual-local-identifier", "timestamp"]
+    ).reset_index(drop=True)
+    expected = df[_reference_outlier_keep(df)].reset_index(drop=True)
+
+    actual = remove_outliers({"Test": df.copy()}, method="geodesic")
+
+    pd.testing.assert_frame_equal(actual["Test"], expected)
+
+
+def test_remove_zero_time_delta_fake_data():
+    # Zero gaps only survive at the start of a whale and tag
+    df = pd.DataFrame({
+        "individual-local-identifier": ["W1", "W1", "W1", "W2", "W2"],
+        "tag-local-identifier": ["T1", "T1", "T1", "T2", "T2"],
+        "time_diff_s": [0, 0, 60, 0, 0],
+    })
+
+    actual = remove_zero_time_delta({"Test": df})["Test"]
+
+    assert list(actual["time_diff_s"]) == [0, 60, 0]
+    assert list(actual["individual-local-identifier"]) == ["W1", "W1", "W2"]
+
+
+def test_speed_calculation_fake_data():
+    df = pd.DataFrame({
+        "distance_from_prev_m": [0, 600, 100],
+        "time_diff_s": [0, 60, 0],
+    })
+
+    actual = speed_calculation({"Test": df})["Test"]
+
+    assert list(actual["speed_mps"]) == [0, 10, 0]
+
+
+def test_derive_movement_metrics_fake_data():
+    # Unsorted input with a repeated timestamp inside one track
+    df = pd.DataFrame({
+        "individual-local-identifier": ["W2", "W1", "W1", "W1"],
+        "tag-local-identifier": ["T2", "T1", "T1", "T1"],
+        "timestamp": pd.to_datetime([
+            "2020-01-01 00:00:00",
+            "2020-01-01 00:10:00",
+            "2020-01-01 00:00:00",
+            "2020-01-01 00:00:00",
+        ]),
+        "location-lat": [5.0, 0.01, 0.0, 0.0],
+        "location-long": [5.0, 0.0, 0.0, 0.0],
+    })
+
+    actual = derive_movement_metrics({"Test": df})["Test"]
+
+    # Sorted, duplicate time removed, metrics measured between kept rows
+    assert list(actual["individual-local-identifier"]) == ["W1", "W1", "W2"]
+    assert list(actual["time_diff_s"]) == [0, 600, 0]
+    expected = geopy.distance.distance((0, 0), (0.01, 0)).meters
+    assert actual.loc[1, "distance_from_prev_m"] == pytest.approx(
+        expected, abs=1e-3
+    )
+    assert actual.loc[1, "speed_mps"] == pytest.approx(expected / 600)
+    assert actual.loc[2, "distance_from_prev_m"] == 0
+
+
+def test_sorted_frame_is_not_resorted():
+    df = pd.DataFrame({
+        "individual-local-identifier": ["W1", "W1", "W2"],
+        "tag-local-identifier": ["T1", "T1", "T1"],
+        "timestamp": pd.to_datetime([
+            "2020-01-01 00:00:00",
+            "2020-01-01 00:10:00",
+            "2020-01-01 00:00:00",
+        ]),
+    })
+
+    assert _is_track_sorted(df)
+    assert _sort_tracks(df) is df
+    assert not _is_track_sorted(df.iloc[::-1])
+
+
+def test_outlier_patch_matches_full_recompute():
+    # Patched metrics must equal a full re-run over the kept rows
+    rng = np.random.default_rng(7)
+    n = 200
+    df = pd.DataFrame({
+        "individual-local-identifier": np.sort(
+            rng.integers(0, 4, n)).astype(str),
+        "tag-local-identifier": "T1",
+        "timestamp": pd.Timestamp("2020-01-01") + pd.to_timedelta(
+            np.sort(rng.integers(0, 100000, n)), unit="s"),
+        "location-lat": rng.normal(0, 0.05, n),
+        "location-long": rng.normal(0, 0.05, n),
+    })
+    with_metrics = derive_movement_metrics({"Test": df})
+
+    patched = remove_outliers(with_metrics)["Test"]
+    recomputed = derive_movement_metrics({"Test": patched.copy()})["Test"]
+
+    assert len(patched) < n
+    pd.testing.assert_frame_equal(patched, recomputed)
+
+
+def _fake_study(seed, whales=5, n=120):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "individual-local-identifier": rng.integers(0, whales, n).astype(str),
+        "tag-local-identifier": "T1",
+        "timestamp": (
+            pd.Timestamp("2020-01-01")
+            + pd.to_timedelta(rng.integers(0, 100000, n), unit="s")
+        ).astype(str),
+        "location-lat": rng.normal(0, 0.05, n),
+        "location-long": rng.normal(0, 0.05, n),
+        "individual-taxon-canonical-name": "Balaenoptera musculus",
+    })
+
+
+def test_partition_study_keeps_tracks_whole():
+    df = _fake_study(0)
+
+    parts = _partition_study(df, target_rows=30)
+
+    assert len(parts) > 1
+    assert sum(len(p) for p in parts) == len(df)
+    # Each whale appears in exactly one chunk
+    owners = [set(p["individual-local-identifier"]) for p in parts]
+    assert sum(len(o) for o in owners) == len(set().union(*owners))
+
+
+def test_clean_data_parallel_matches_serial():
+    serial = clean_data({"A": _fake_study(1), "B": _fake_study(2)})
+    parallel = clean_data(
+        {"A": _fake_study(1), "B": _fake_study(2)}, workers=2
+    )
+
+    assert list(parallel) == ["A", "B"]
+    for key in serial:
+        pd.testing.assert_frame_equal(parallel[key], serial[key])
+
+
+def test_species_columns_stay_categorical():
+    # Filling and renaming species works on the categories directly
+    df = pd.DataFrame({
+        "individual-taxon-canonical-name": pd.Categorical(
+            ["Monodon monoceros", None, "Balaenoptera musculus", " "]
+        ),
+    })
+    data_dict = {
+        "Baffin Bay narwhal- 2009 to 2012 Argos data- "
+        "Fisheries and Oceans Canada": df
+    }
+
+    actual = change_species_names(fill_missing_column(data_dict))
+    actual = list(actual.values())[0]["individual-taxon-canonical-name"]
+
+    assert actual.dtype == "category"
+    assert list(actual[:3]) == ["Narwhal", "Narwhal", "Blue whale"]
+    assert pd.isna(actual[3])
+
+
+def _fixes(individuals, times, comment="a"):
+    # Fixes with an extra column that is not part of the key
+    return pd.DataFrame({
+        "individual-local-identifier": pd.Categorical(individuals),
+        "tag-local-identifier": "T1",
+        "timestamp": pd.to_datetime(times),
+        "location-lat": -60.0,
+        "location-long": 160.0,
+        "comments": comment,
+    })
+
+
+class TestDropDuplicates:
+
+    def test_counts_per_study(self):
+        data_dict = {
+            "A": _fixes(["W1", "W1", "W1"],
+                        ["2013-03-08", "2013-03-08", "2013-03-09"]),
+            "B": _fixes(["W2", "W2"], ["2013-03-08", "2013-03-09"]),
+        }
+
+        actual = drop_duplicates(data_dict)
+
+        assert len(actual["A"]) == 2
+        assert len(actual["B"]) == 2
+        assert list(actual["A"].index) == [0, 1]
+
+    def test_key_columns_only(self):
+        df = pd.concat([
+            _fixes(["W1"], ["2013-03-08"], comment="a"),
+            _fixes(["W1"], ["2013-03-08"], comment="b"),
+        ], ignore_index=True)
+
+        actual = drop_duplicates({"A": df})["A"]
+
+        assert actual["comments"].tolist() == ["a"]
+
+    def test_across_studies_keeps_first_study(self):
+        def data_dict():
+            return {
+                "A": _fixes(["W1", "W1"], ["2013-03-08", "2013-03-09"]),
+                "B": _fixes(["W1", "W3"], ["2013-03-09", "2013-03-09"]),
+            }
+
+        within = drop_duplicates(data_dict())
+        across = drop_duplicates(data_dict(), across_studies=True)
+
+        assert len(within["B"]) == 2
+        assert len(across["A"]) == 2
+        assert across["B"]["individual-local-identifier"].tolist() == ["W3"]
+
+    def test_hash_collision_keeps_rows(self, mocker):
+        # Every row gets the same fingerprint, only real repeats go
+        mocker.patch(
+            "src.transform.clean_data.row_fingerprints",
+            side_effect=lambda df: np.zeros(len(df), dtype="uint64"),
+        )
+        df = _fixes(["W1", "W2", "W1"],
+                    ["2013-03-08", "2013-03-08", "2013-03-08"])
+
+        actual = drop_duplicates({"A": df})["A"]
+
+        assert actual["individual-local-identifier"].tolist() == ["W1", "W2"]
+
+
+def _argos_fixes():
+    # One fix per class, the GPS fix at the end has no class or radius
+    classes = ["3", "2", "1", "0", "A", "B", "Z", None]
+    return pd.DataFrame({
+        "individual-local-identifier": "N1",
+        "argos:lc": pd.Categorical(classes),
+        "argos:error-radius": [250, 500, 1000, 1500, 2000, None, None,
+                               None],
+        "argos:semi-major": [300, 600, 1200, 1800, 2500, 9000, None,
+                             None],
+    })
+
+
+class TestArgosFilter:
+
+    def test_default_drops_only_z(self):
+        actual = filter_argos_fixes({"A": _argos_fixes()})["A"]
+
+        assert len(actual) == 7
+        # Argos columns are gone once used
+        assert list(actual.columns) == ["individual-local-identifier"]
+
+    def test_error_radius_falls_back_to_semi_major(self):
+        filters = {"A": {"drop_classes": [], "max_error_radius_m": 1500}}
+
+        actual = filter_argos_fixes({"A": _argos_fixes()}, filters)["A"]
+
+        # 2000 m and the 9000 m semi-major go, no radius is kept
+        assert len(actual) == 6
+
+    def test_per_study_settings(self):
+        data_dict = {"A": _argos_fixes(), "B": _argos_fixes(),
+                     "C": _argos_fixes()}
+        filters = {
+            "A": None,
+            "C": {"drop_classes": ["B", "Z"], "max_error_radius_m": None},
+        }
+
+        actual = filter_argos_fixes(data_dict, filters)
+
+        assert len(actual["A"]) == 8
+        assert len(actual["B"]) == 7
+        # Class B is dropped only where a study opts in
+        assert len(actual["C"]) == 6
+
+    def test_study_without_argos_columns_untouched(self):
+        df = _fixes(["W1"], ["2013-03-08"])
+
+        actual = filter_argos_fixes({"A": df})["A"]
+
+        assert actual is df
+
+
+def _track_at_7_mps(species):
+    # The last fix is about 6.9 m/s from the one before
+    return pd.DataFrame({
+        "timestamp": pd.to_datetime([
+            "2020-01-01 00:00:00",
+            "2020-01-01 00:10:00",
+            "2020-01-01 00:12:40",
+        ]),
+        "location-lat": [0.0, 0.01, 0.02],
+        "location-long": [0.0, 0.0, 0.0],
+        "individual-local-identifier": "W1",
+        "tag-local-identifier": "T1",
+        "individual-taxon-canonical-name": pd.Categorical([species] * 3),
+    })
+
+
+class TestSpeciesThresholds:
+
+    def test_lookup_per_row(self):
+        df = pd.DataFrame({
+            "individual-taxon-canonical-name": pd.Categorical(
+                ["Narwhal", "Whale shark", None, "Unknown whale"]
+            ),
+        })
+
+        actual = species_speed_thresholds(df)
+
+        assert actual.tolist() == [6.0, 3.0, DEFAULT_SPEED_THRESHOLD,
+                                   DEFAULT_SPEED_THRESHOLD]
+
+    def test_narwhal_judged_by_its_own_limit(self):
+        data_dict = {
+            "Blue": _track_at_7_mps("Blue whale"),
+            "Narwhal": _track_at_7_mps("Narwhal"),
+        }
+
+        actual = remove_outliers(data_dict)
+
+        assert len(actual["Blue"]) == 3
+        assert len(actual["Narwhal"]) == 2
+
+    def test_single_threshold_still_applies_to_all(self):
+        actual = remove_outliers(
+            {"Blue": _track_at_7_mps("Blue whale")}, speed_threshold=5
+        )
+
+        assert len(actual["Blue"]) == 2
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from src.transform.compact import (
+    compact_frame,
+    joined_categorical,
+    unify_categories,
+)
+from src.transform.create_new_df import create_combined_df
+
+
+def _cleaned_study(study, tags):
+    rows = len(tags)
+    return pd.DataFrame({
+        "timestamp": pd.date_range("2013-03-08", periods=rows, freq="h"),
+        "location-lat": np.linspace(-60, -59, rows),
+        "location-long": np.linspace(160, 161, rows),
+        "distance_from_prev_m": np.linspace(0, 1234.5678, rows),
+        "time_diff_s": np.full(rows, 3600.0),
+        "speed_mps": np.linspace(0, 0.34293, rows),
+        "individual-local-identifier": [f"W{tag}" for tag in tags],
+        "tag-local-identifier": [str(tag) for tag in tags],
+        "individual-taxon-canonical-name": "Blue whale",
+        "study-name": study,
+    })
+
+
+def test_joined_categorical_matches_string_join():
+    left = pd.Series(["A", "A", "B", None], dtype="category")
+    right = pd.Series(["1", "2", "1", "1"], dtype="category")
+
+    result = joined_categorical(left, right)
+
+    expected = left.astype(str) + "_" + right.astype(str)
+    assert list(result.astype(str)) == list(expected)
+
+
+def test_unify_categories_keeps_category_on_concat():
+    frames = unify_categories([
+        pd.DataFrame({"a": pd.Categorical(["x"])}),
+        pd.DataFrame({"a": pd.Categorical(["y"])}),
+    ])
+
+    combined = pd.concat(frames, ignore_index=True)
+
+    assert combined["a"].dtype == "category"
+    assert combined["a"].tolist() == ["x", "y"]
+
+
+def test_compact_frame_downcasts_metrics_only():
+    df = compact_frame(_cleaned_study("A", [1, 2]))
+
+    assert df["speed_mps"].dtype == "float32"
+    assert df["location-lat"].dtype == "float64"
+    assert df["study-name"].dtype == "category"
+
+
+def test_create_combined_df_compact_same_values():
+    def studies():
+        return {
+            "A": _cleaned_study("A", [1, 1, 2]),
+            "B": _cleaned_study("B", [7, 8]),
+        }
+
+    expected = create_combined_df(studies())
+    result = create_combined_df(studies(), compact=True)
+
+    assert result["study_tag_id"].dtype == "category"
+    assert result["study_name"].dtype == "category"
+    assert result["speed_mps"].dtype == "float32"
+    pd.testing.assert_frame_equal(
+        result.astype(expected.dtypes.to_dict()), expected,
+        check_exact=False, rtol=1e-6,
+    )
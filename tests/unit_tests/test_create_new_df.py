@@ -3,13 +3,8 @@ import pytest
 from pathlib import Path
 from src.extract.extract_files_into_df import extract_files_to_df
 from src.transform.clean_data import clean_data
-from src.transform.create_new_df import (
-    create_combined_df,
-    create_unique_column,
-    retain_useful_columns,
-    change_column_names,
-    combined_df
-)
+from src.transform.compact import compact_frame, unify_categories
+from src.transform.create_new_df import OUTPUT_COLUMNS, create_combined_df
 
 
 # Load in the test data(reduced actual)
@@ -42,21 +37,24 @@ def whale_data_cleaned(whale_data):
 
 
 @pytest.fixture
-def cleaned_unique_col(whale_data_cleaned):
-    whale_data_cleaned = create_unique_column(whale_data_cleaned)
-    return whale_data_cleaned
-
-
-@pytest.fixture
-def retained_usuful_col(cleaned_unique_col):
-    whale_data_cleaned = retain_useful_columns(cleaned_unique_col)
-    return whale_data_cleaned
-
-
-@pytest.fixture
-def changed_col_names(retained_usuful_col):
-    whale_data_cleaned = change_column_names(retained_usuful_col)
-    return whale_data_cleaned
+def combined(whale_data_cleaned):
+    return create_combined_df(whale_data_cleaned)
+
+
+def _study_with_extra_column():
+    return pd.DataFrame({
+        "timestamp": ["2013-03-10 07:01:29", "2013-03-10 07:27:48"],
+        "location-lat": [-64.191, -64.242],
+        "location-long": [169.181, 169.689],
+        "distance_from_prev_m": [0, 5.9],
+        "time_diff_s": [0, 10.5],
+        "speed_mps": [0, 0.5],
+        "individual-local-identifier": ["121205", "121206"],
+        "tag-local-identifier": ["Tag1", "Tag2"],
+        "individual-taxon-canonical-name": ["Species1", "Species2"],
+        "study-name": ["Blue Whale Study", "Humpback Whale Study"],
+        "test_col": [999, "Test"]
+    })
 
 
 # Tests for unique column generation
@@ -64,15 +62,7 @@ class TestUniqueColumnGeneration():
 
     # Tests the study_id tag is structured correctly
     def test_create_unique_column(self):
-        df = pd.DataFrame({
-            "study-name": ["Blue Whale Study", "Humpback Whale Study"],
-            "tag-local-identifier": ["Tag1", "Tag2"]
-        })
-
-        data = {"Test": df}
-
-        actual = create_unique_column(data)
-        actual = actual["Test"]
+        actual = create_combined_df({"Test": _study_with_extra_column()})
 
         # Asserts study_tag_id is in the column and it comes across correctly
         assert "study_tag_id" in actual.columns
@@ -80,145 +70,51 @@ class TestUniqueColumnGeneration():
         assert actual.loc[1, "study_tag_id"] == "Humpback Whale Study_Tag2"
 
     # Ensure there are no NAs in the study_tag_id column
-    def test_unique_column_na(self, whale_data_cleaned):
+    def test_unique_column_na(self, combined):
         # With actual data
-        actual = create_unique_column(whale_data_cleaned)
-        for df in actual.values():
-            assert "study_tag_id" in df.columns
-            assert df["study_tag_id"].isna().sum() == 0
+        assert combined["study_tag_id"].isna().sum() == 0
 
     # Ensure the combined column is always a string
-    def test_all_str(self, whale_data_cleaned):
-        actual = create_unique_column(whale_data_cleaned)
-        for df in actual.values():
-            for i in range(len(df)):
-                assert isinstance(df.loc[i, "study_tag_id"], str)
+    def test_all_str(self, combined):
+        for value in combined["study_tag_id"]:
+            assert isinstance(value, str)
 
 
 # Test required columns are retained
 class TestRetainedColumns():
     # Perform a test to ensure it removes a column
     def test_retain_useful_columns(self):
-        df = pd.DataFrame({
-            "study_tag_id": ["121205", "121206"],
-            "timestamp": ["2013-03-10 07:01:29", "2013-03-10 07:27:48"],
-            "location-lat": [-64.191, -64.242],
-            "location-long": [169.181, 169.689],
-            "distance_from_prev_m": [0, 5.9],
-            "time_diff_s": [0, 10.5],
-            "speed_mps": [0, 0.5],
-            "individual-local-identifier": ["121205", "121206"],
-            "tag-local-identifier": ["T1", "T2"],
-            "individual-taxon-canonical-name": ["Species1", "Species2"],
-            "study-name": ["Balaenoptera musculus", "Balaenoptera musculus"],
-            "test_col": [999, "Test"]
-        })
-
-        data = {"Test": df}
-
-        actual = retain_useful_columns(data)
-        actual_df = actual["Test"]
-        # The expected columns
-        expected_cols = [
-            "study_tag_id",
-            "timestamp",
-            "location-lat",
-            "location-long",
-            "distance_from_prev_m",
-            "time_diff_s",
-            "speed_mps",
-            "individual-local-identifier",
-            "tag-local-identifier",
-            "individual-taxon-canonical-name",
-            "study-name"
-        ]
+        actual = create_combined_df({"Test": _study_with_extra_column()})
 
         # Compare the list of columns
-        assert list(actual_df.columns) == expected_cols
+        assert list(actual.columns) == list(OUTPUT_COLUMNS)
         # Check the specific column is not in
-        assert "test_col" not in actual_df.columns
+        assert "test_col" not in actual.columns
         # Check the length is correct
-        assert len(actual_df) == 2
+        assert len(actual) == 2
 
     # Ensure there are no Na values in required fields
-    def test_no_nas(self, cleaned_unique_col):
-        actual = retain_useful_columns(cleaned_unique_col)
-
-        expected_cols = [
-            "study_tag_id",
-            "timestamp",
-            "location-lat",
-            "location-long",
-            "distance_from_prev_m",
-            "time_diff_s",
-            "speed_mps",
-            "individual-local-identifier",
-            "tag-local-identifier",
-            "individual-taxon-canonical-name",
-            "study-name"
-        ]
-
-        for df in actual.values():
-            assert list(df.columns) == expected_cols
-            na_count = df[expected_cols].isna().sum().sum()
-            assert na_count == 0
+    def test_no_nas(self, combined):
+        assert list(combined.columns) == list(OUTPUT_COLUMNS)
+        assert combined.isna().sum().sum() == 0
 
 
 # Test column renaming logic
 class TestColumnNameChange():
 
-    # Test to see it removes a column
+    # Test the old column names are replaced
     def test_change_col_name(self):
-        df = pd.DataFrame({
-            "study_tag_id": ["121205", "121206"],
-            "timestamp": ["2013-03-10 07:01:29", "2013-03-10 07:27:48"],
-            "location-lat": [-64.191, -64.242],
-            "location-long": [169.181, 169.689],
-            "distance_from_prev_m": [0, 5.9],
-            "time_diff_s": [0, 10.5],
-            "speed_mps": [0, 0.5],
-            "individual-local-identifier": ["121205", "121206"],
-            "tag-local-identifier": ["T1", "T2"],
-            "individual-taxon-canonical-name": ["Species1", "Species2"],
-            "study-name": ["Balaenoptera musculus", "Balaenoptera musculus"],
-            "test_col": [999, "Test"]
-        })
-
-        data = {"Test": df}
-
-        actual = change_column_names(data)
-        actual = actual["Test"]
-
-        expected_cols = [
-            "location_lat",
-            "location_lon",
-            "individual_local_identifier",
-            "tag_local_identifier",
-            "individual_taxon_canonical_name",
-            "study_name"
-        ]
+        actual = create_combined_df({"Test": _study_with_extra_column()})
 
         # Check the columns against expected
-        for col in expected_cols:
-            assert col in actual.columns
-
-        old_cols = [
-            "location-lat",
-            "location-long",
-            "individual-local-identifier",
-            "tag-local-identifier",
-            "individual-taxon-canonical-name",
-            "study-name"
-        ]
-
-        # Check the old columns still are not in there
-        for col in old_cols:
-            assert col not in actual.columns
+        for name, source in OUTPUT_COLUMNS.items():
+            assert name in actual.columns
+            # Check the old columns still are not in there
+            if source != name:
+                assert source not in actual.columns
 
     # Test renaming with real data
-    def test_change_col_names_real(self, retained_usuful_col):
-        actual = change_column_names(retained_usuful_col)
-
+    def test_change_col_names_real(self, combined):
         expected_cols = [
             "location_lat",
             "location_lon",
@@ -229,43 +125,24 @@ class TestColumnNameChange():
         ]
 
         # Check the columns against expected
-            
         for col in expected_cols:
-            for df in actual.values():
-                assert col in df.columns
-
+            assert col in combined.columns
 
-def test_combined_df_real(changed_col_names):
-    actual = combined_df(changed_col_names)
 
+def test_combined_df_real(whale_data_cleaned, combined):
     # number of rows after merging should equal sum of source dfs
-    expected_len = sum(len(df) for df in changed_col_names.values())
+    expected_len = sum(len(df) for df in whale_data_cleaned.values())
 
-    assert len(actual) == expected_len
+    assert len(combined) == expected_len
 
     # ensure no missing essential columns
-    essential = [
-        "study_tag_id",
-        "timestamp",
-        "location_lat",
-        "location_lon",
-        "distance_from_prev_m",
-        "time_diff_s",
-        "speed_mps",
-        "individual_local_identifier",
-        "tag_local_identifier",
-        "individual_taxon_canonical_name",
-        "study_name"
-    ]
-    for col in essential:
-        assert col in actual.columns
+    for col in OUTPUT_COLUMNS:
+        assert col in combined.columns
 
 
-def test_create_combined_df(changed_col_names):
-    actual = combined_df(changed_col_names)
-
-    # Should return a dict of DataFrames
-    assert isinstance(actual, pd.DataFrame)
+def test_create_combined_df(combined):
+    # Should return a single DataFrame
+    assert isinstance(combined, pd.DataFrame)
 
 
 def test_full_combination(whale_data_cleaned):
@@ -276,3 +153,71 @@ def test_full_combination(whale_data_cleaned):
 
     expected_len = sum(len(df) for df in whale_data_cleaned.values())
     assert len(actual) == expected_len
+
+
+def _cleaned_study(study, tags):
+    # Minimal cleaned study, identifiers categorical as extract reads them
+    n = len(tags)
+    return pd.DataFrame({
+        "timestamp": pd.date_range("2013-03-08", periods=n, freq="h"),
+        "location-lat": [-60.0 + i for i in range(n)],
+        "location-long": [160.0 + i for i in range(n)],
+        "distance_from_prev_m": [float(i) for i in range(n)],
+        "time_diff_s": [3600.0] * n,
+        "speed_mps": [0.5] * n,
+        "individual-local-identifier": pd.Categorical(
+            [f"W{t}" for t in tags]),
+        "tag-local-identifier": pd.Categorical([str(t) for t in tags]),
+        "individual-taxon-canonical-name": "Balaenoptera musculus",
+        "study-name": study,
+    })
+
+
+def _concat_studies(studies, compact):
+    # Renamed copies of every study joined with pd.concat
+    frames = []
+    for df in studies.values():
+        frame = pd.DataFrame({
+            name: (
+                df["study-name"].astype(str) + "_"
+                + df["tag-local-identifier"].astype(str)
+            ) if source is None else df[source]
+            for name, source in OUTPUT_COLUMNS.items()
+        })
+        frames.append(compact_frame(frame) if compact else frame)
+    if compact:
+        frames = unify_categories(frames)
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_combine_matches_concat(compact):
+    def studies():
+        return {
+            "A": _cleaned_study("A", [2, 1, 1]),
+            "B": _cleaned_study("B", [3, 3]),
+        }
+
+    expected = _concat_studies(studies(), compact)
+
+    actual = create_combined_df(studies(), compact=compact, registry={})
+
+    pd.testing.assert_frame_equal(actual.drop(columns="track_id"), expected)
+    assert actual["track_id"].tolist() == [1, 0, 0, 2, 2]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_combine_empty_study(compact):
+    # A study can lose every fix in cleaning, e.g. all Argos class Z
+    actual = create_combined_df(
+        {"A": _cleaned_study("A", []), "B": _cleaned_study("B", [1, 2])},
+        compact=compact, registry={},
+    )
+    assert actual["study_tag_id"].astype(str).tolist() == ["B_1", "B_2"]
+    assert actual["track_id"].tolist() == [0, 1]
+
+    empty = create_combined_df(
+        {"A": _cleaned_study("A", [])}, compact=compact, registry={}
+    )
+    assert len(empty) == 0
+    assert list(empty.columns) == list(actual.columns)
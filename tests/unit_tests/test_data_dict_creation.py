@@ -1,7 +1,14 @@
+import os
 import pandas as pd
 import pytest
 from pathlib import Path
-from src.extract.extract_files_into_df import extract_files_to_df
+from src.extract.extract_files_into_df import (
+    extract_files_to_df,
+    iter_files_to_df,
+    read_study_csv,
+    read_study,
+    REQUIRED_COLUMNS,
+)
 
 # Set the path to the test data
 root_tests = Path(__file__).resolve().parents[1]
@@ -52,3 +59,152 @@ def test_extract_files_to_df_correct_keys(file_list_for_tests):
     ]
     # Ensure they are the same
     assert list(result.keys()) == expected_keys
+
+
+def test_extract_files_to_df_keeps_order(tmp_path):
+    # Larger files are read first but keys follow the input order
+    small = tmp_path / "Small study.csv"
+    large = tmp_path / "Large study.csv"
+    pd.DataFrame({"timestamp": ["2013-03-08"]}).to_csv(small, index=False)
+    pd.DataFrame({"timestamp": ["2013-03-08"] * 1000}).to_csv(
+        large, index=False
+    )
+
+    result = extract_files_to_df([small, large], workers=2)
+
+    assert list(result.keys()) == ["Small study", "Large study"]
+    assert len(result["Large study"]) == 1000
+
+
+def test_iter_files_to_df_yields_in_order(tmp_path):
+    files = [tmp_path / "B study.csv", tmp_path / "A study.csv"]
+    for rows, path in enumerate(files, start=1):
+        pd.DataFrame({"timestamp": ["2013-03-08"] * rows}).to_csv(
+            path, index=False
+        )
+
+    result = [(name, len(df)) for name, df in iter_files_to_df(files)]
+
+    assert result == [("B study", 1), ("A study", 2)]
+
+
+def test_extract_files_to_df_missing_file_raises(tmp_path):
+    good = tmp_path / "Good.csv"
+    pd.DataFrame({"a": [1]}).to_csv(good, index=False)
+
+    with pytest.raises(FileNotFoundError):
+        extract_files_to_df([good, tmp_path / "Missing.csv"])
+
+
+def test_read_study_csv_projection_and_dtypes(tmp_path):
+    # Extra columns are never read, the rest get the dtype map
+    path = tmp_path / "Study.csv"
+    pd.DataFrame({
+        "event-id": [1, 2],
+        "timestamp": ["2013-03-08 05:45:10.000", "2013-03-08 06:45:10.000"],
+        "location-long": [169.7, 169.8],
+        "location-lat": [-64.5, -64.6],
+        "sensor-type": ["gps", "gps"],
+        "individual-taxon-canonical-name": ["Balaenoptera musculus"] * 2,
+        "tag-local-identifier": [121205, 121205],
+        "individual-local-identifier": ["W1", "W1"],
+        "study-name": ["Study", "Study"],
+    }).to_csv(path, index=False)
+
+    df = read_study_csv(path)
+
+    assert list(df.columns) == REQUIRED_COLUMNS
+    assert "datetime" in str(df["timestamp"].dtype)
+    assert df["location-lat"].dtype == "float64"
+    # Identifiers keep the dtypes read_csv infers
+    assert df["tag-local-identifier"].dtype == "int64"
+    assert df["individual-local-identifier"].dtype == object
+    compact = read_study_csv(path, compact=True)
+    assert compact["tag-local-identifier"].dtype == "category"
+
+
+def test_read_study_csv_keeps_argos_columns(tmp_path):
+    # Argos quality columns are read only when the study has them
+    path = tmp_path / "Argos study.csv"
+    pd.DataFrame({
+        "timestamp": ["2013-03-08 05:45:10.000", "2013-03-08 06:45:10.000"],
+        "location-long": [169.7, 169.8],
+        "location-lat": [-64.5, -64.6],
+        "argos:lc": ["3", "B"],
+        "argos:error-radius": [250, 5000],
+        "argos:orientation": [10, 20],
+        "individual-taxon-canonical-name": ["Monodon monoceros"] * 2,
+        "tag-local-identifier": [1, 1],
+        "individual-local-identifier": ["N1", "N1"],
+        "study-name": ["Study", "Study"],
+    }).to_csv(path, index=False)
+
+    df = read_study_csv(path)
+
+    assert list(df.columns) == REQUIRED_COLUMNS + [
+        "argos:lc", "argos:error-radius"
+    ]
+    assert df["argos:lc"].dtype == "category"
+    assert df["argos:error-radius"].dtype == "float64"
+
+
+def test_read_study_csv_warns_on_missing_column(tmp_path, caplog):
+    path = tmp_path / "No species.csv"
+    pd.DataFrame({
+        "timestamp": ["2013-03-08 05:45:10.000"],
+        "location-long": [169.7],
+        "location-lat": [-64.5],
+        "tag-local-identifier": [121205],
+        "individual-local-identifier": ["W1"],
+        "study-name": ["Study"],
+    }).to_csv(path, index=False)
+
+    df = read_study_csv(path)
+
+    assert "individual-taxon-canonical-name" in caplog.text
+    assert df["individual-taxon-canonical-name"].isna().all()
+    assert list(df.columns) == REQUIRED_COLUMNS
+
+
+def test_read_study_staging_round_trip(tmp_path):
+    # First read stages the CSV, later reads use the Parquet copy
+    path = tmp_path / "Study.csv"
+    pd.DataFrame({
+        "timestamp": ["2013-03-08 05:45:10.000"],
+        "location-long": [169.7],
+        "location-lat": [-64.5],
+        "comments": ["free text"],
+        "tag-local-identifier": [121205],
+        "individual-local-identifier": ["W1"],
+        "individual-taxon-canonical-name": ["Balaenoptera musculus"],
+        "study-name": ["Study"],
+    }).to_csv(path, index=False)
+    staging_dir = tmp_path / "staging"
+
+    first = read_study(path, staging=True, staging_dir=staging_dir)
+    staged = staging_dir / "Study.parquet"
+    assert staged.exists()
+    # Staged copy keeps every column for later projection
+    assert "comments" in pd.read_parquet(staged).columns
+
+    second = read_study(path, staging=True, staging_dir=staging_dir)
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(first, read_study_csv(path))
+
+
+def test_read_study_restages_newer_csv(tmp_path):
+    path = tmp_path / "Study.csv"
+    staging_dir = tmp_path / "staging"
+    pd.DataFrame({"timestamp": ["2013-03-08"]}).to_csv(path, index=False)
+    read_study(path, staging=True, staging_dir=staging_dir)
+
+    # Make the CSV newer than its staged copy
+    pd.DataFrame({"timestamp": ["2013-03-08"] * 4}).to_csv(
+        path, index=False
+    )
+    staged = staging_dir / "Study.parquet"
+    os.utime(staged, ns=(1, 1))
+
+    actual = read_study(path, staging=True, staging_dir=staging_dir)
+
+    assert len(actual) == 4
@@ -0,0 +1,136 @@
+import pandas as pd
+import sqlalchemy as sa
+from src.load.database import (
+    database_version,
+    export_combined_sql,
+    get_engine,
+    loaded_studies,
+    read_database,
+    save_combined_sql,
+)
+from src.load.load import (
+    publish_version,
+    save_combined_parquet,
+    stage_combined_parquet,
+)
+from tests.conftest import combined_frame
+
+
+def test_save_combined_sql_upserts_by_study(tmp_path):
+    path = tmp_path / "whales.db"
+    save_combined_sql(pd.concat([
+        combined_frame("Study A", "Blue whale", ["2020-01-01", "2020-01-02"]),
+        combined_frame("Study B", "Narwhal", ["2020-01-03"]),
+    ], ignore_index=True), path)
+
+    # Reloading Study A replaces its rows and keeps Study B
+    reload = combined_frame("Study A", "Blue whale", ["2020-02-01"], lat=5.0)
+    reload["speed_mps"] = float("nan")
+    save_combined_sql(reload, path)
+
+    df = read_database(path=path).sort_values("timestamp")
+    assert df["study_name"].tolist() == ["Study B", "Study A"]
+    assert df["location_lat"].tolist() == [0.0, 5.0]
+    assert df["tag_local_identifier"].tolist() == ["1", "1"]
+    assert df["speed_mps"].isna().tolist() == [False, True]
+
+
+def test_read_database_filters_use_indexes(tmp_path):
+    path = tmp_path / "whales.db"
+    save_combined_sql(pd.concat([
+        combined_frame("Study A", "Blue whale",
+                       ["2020-01-01", "2020-01-02", "2020-01-03 12:00:00.5"]),
+        combined_frame("Study B", "Narwhal", ["2020-01-02"]),
+    ], ignore_index=True), path)
+
+    df = read_database(
+        columns=["timestamp", "speed_mps"], track="Study A_1",
+        start="2020-01-02", end="2020-01-04", path=path,
+    )
+
+    assert list(df.columns) == ["timestamp", "speed_mps"]
+    assert df["timestamp"].tolist() == [
+        pd.Timestamp("2020-01-02"), pd.Timestamp("2020-01-03 12:00:00.5"),
+    ]
+    engine = get_engine(path)
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM whales "
+            "WHERE study_tag_id = ? AND timestamp >= ?",
+            ("Study A_1", "2020-01-02"),
+        ).fetchall()
+        indexes = {ix["name"] for ix in sa.inspect(conn).get_indexes("whales")}
+    engine.dispose()
+    assert "ix_whales_track_time" in plan[0][-1]
+    assert indexes == {
+        "ix_whales_track_time", "ix_whales_species", "ix_whales_study",
+        "ix_whales_study_file",
+    }
+
+
+def test_export_combined_sql_matches_dataset(tmp_path):
+    df = pd.concat([
+        combined_frame("Study A", "Blue whale", ["2020-01-01", "2020-01-02"]),
+        combined_frame("Study B", "Narwhal", ["2020-01-03"]),
+    ], ignore_index=True)
+    root = save_combined_parquet(df, root=tmp_path / "whales")
+
+    path = export_combined_sql(root, tmp_path / "whales.db")
+
+    result = read_database(
+        columns=list(df.columns), path=path
+    ).sort_values("timestamp", ignore_index=True)
+    expected = df.astype({"tag_local_identifier": str})
+    pd.testing.assert_frame_equal(
+        result, expected, check_dtype=False, check_like=True
+    )
+
+
+def test_export_combined_sql_syncs_changed_study_files(tmp_path):
+    root, path = tmp_path / "whales", tmp_path / "whales.db"
+    a = combined_frame("Study A", "Blue whale", ["2020-01-01"])
+    # File b's rows carry another study name than the file
+    b = combined_frame("Baffin", "Narwhal", ["2020-01-02"])
+    c = combined_frame("Study C", "Narwhal", ["2020-01-03"])
+    version = stage_combined_parquet(
+        [("a", a), ("b", b), ("c", c)],
+        inputs={"a": "a1", "b": "b1", "c": "c1"}, root=root,
+    )
+    export_combined_sql(root, path, version)
+    publish_version(version, root)
+    assert database_version(path) == 1
+
+    # Unchanged studies are not loaded again
+    engine = get_engine(path)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "UPDATE whales SET speed_mps = 9 WHERE study_name = 'Study C'"
+        )
+    engine.dispose()
+    # Version 2 is published without a database load. Study b is renamed
+    a["location_lat"] = 5.0
+    b["study_name"] = "Baffin Bay"
+    publish_version(stage_combined_parquet(
+        [("a", a), ("b", b), ("c", c)],
+        inputs={"a": "a2", "b": "b2", "c": "c1"}, root=root,
+    ), root)
+    version = stage_combined_parquet(
+        [("a", a), ("c", c)], inputs={"a": "a2", "c": "c1"}, root=root
+    )
+    export_combined_sql(root, path, version)
+    publish_version(version, root)
+
+    df = read_database(path=path).sort_values("timestamp")
+    assert database_version(path) == 3
+    assert df["study_name"].tolist() == ["Study A", "Study C"]
+    assert df["study_file"].tolist() == ["a", "c"]
+    assert df["location_lat"].tolist() == [5.0, 0.0]
+    assert df["speed_mps"].tolist() == [1.5, 9.0]
+    assert set(loaded_studies(path)) == {"a", "c"}
+
+    # Rows no study file of the dataset holds are deleted
+    save_combined_sql(b, path)
+    export_combined_sql(root, path)
+    df = read_database(path=path).sort_values("timestamp")
+    assert df["study_name"].tolist() == ["Study A", "Study C"]
+    assert df["speed_mps"].tolist() == [1.5, 9.0]
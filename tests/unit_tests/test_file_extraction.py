@@ -1,3 +1,4 @@
+import pytest
 from pathlib import Path
 from src.extract.create_file_list import create_file_list
 
@@ -37,6 +38,16 @@ def test_extract_csv_to_path_list(mocker):
     assert len(file_list) == 2
 
 
+def test_create_file_list_without_csv_raises(mocker):
+    mocker.patch(
+        "src.extract.create_file_list.os.listdir",
+        return_value=["Whales are cool.txt"])
+    mocker.patch("pathlib.Path.exists", return_value=True)
+
+    with pytest.raises(FileNotFoundError, match="No studies found"):
+        create_file_list()
+
+
 def test_file_list_extraction():
     # Use the root now it works
     root = Path(__file__).resolve().parents[2]
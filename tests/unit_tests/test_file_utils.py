@@ -0,0 +1,42 @@
+import pytest
+from src.utils.file_utils import atomic_write
+
+
+def test_atomic_write_replaces_file(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_text("old")
+
+    with atomic_write(path) as tmp:
+        tmp.write_text("new")
+        # Nothing visible until the block finishes
+        assert path.read_text() == "old"
+
+    assert path.read_text() == "new"
+    assert [p.name for p in tmp_path.iterdir()] == ["out.txt"]
+
+
+def test_atomic_write_keeps_old_file_on_error(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_text("old")
+
+    with pytest.raises(ValueError):
+        with atomic_write(path) as tmp:
+            tmp.write_text("partial")
+            raise ValueError("write failed")
+
+    assert path.read_text() == "old"
+    assert [p.name for p in tmp_path.iterdir()] == ["out.txt"]
+
+
+def test_atomic_write_concurrent_writers_do_not_share_a_file(tmp_path):
+    path = tmp_path / "out.txt"
+
+    with atomic_write(path) as first, atomic_write(path) as second:
+        assert first != second
+        first.write_text("first")
+        second.write_text("second")
+        assert first.read_text() == "first"
+
+    # The writer that finishes last wins, whole
+    assert path.read_text() == "first"
+    assert [p.name for p in tmp_path.iterdir()] == ["out.txt"]
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import geopy.distance
+from src.transform.geodesic import (
+    haversine_m,
+    vincenty_m,
+    geodesic_m,
+    pairwise_distance_m,
+    distance_from_prev_m,
+)
+
+
+@pytest.fixture
+def random_pairs():
+    # Short whale-like hops plus some long ones across the globe
+    rng = np.random.default_rng(42)
+    lat1 = rng.uniform(-85, 85, 500)
+    lon1 = rng.uniform(-180, 180, 500)
+    lat2 = np.clip(lat1 + rng.normal(0, 1, 500), -89, 89)
+    lon2 = lon1 + rng.normal(0, 1, 500)
+    lat2[:50] = rng.uniform(-85, 85, 50)
+    lon2[:50] = rng.uniform(-180, 180, 50)
+    return lat1, lon1, lat2, lon2
+
+
+def test_vincenty_matches_geopy(random_pairs):
+    # Vectorised ellipsoid must stay within 1 mm of geopy
+    expected = geodesic_m(*random_pairs)
+    actual = vincenty_m(*random_pairs)
+    assert np.abs(actual - expected).max() < 1e-3
+
+
+def test_haversine_close_to_geopy(random_pairs):
+    # Sphere is only an approximation but should be within 0.6%
+    expected = geodesic_m(*random_pairs)
+    actual = haversine_m(*random_pairs)
+    assert (np.abs(actual - expected) / expected).max() < 0.006
+
+
+def test_vincenty_antipodal_falls_back():
+    # Nearly antipodal pairs do not converge and use geopy instead
+    expected = geopy.distance.distance((0, 0), (0.5, 179.7)).meters
+    actual = vincenty_m(0, 0, 0.5, 179.7)
+    assert actual == pytest.approx(expected, abs=1e-3)
+
+
+def test_vincenty_same_point_and_nan():
+    assert vincenty_m(10.0, 20.0, 10.0, 20.0) == 0
+    assert np.isnan(vincenty_m(np.nan, 20.0, 10.0, 20.0))
+
+
+def test_pairwise_unknown_method():
+    with pytest.raises(ValueError):
+        pairwise_distance_m(0, 0, 1, 1, method="flat")
+
+
+def test_distance_from_prev_resets_on_new_track():
+    lat = np.array([0.0, 0.1, 5.0, 5.1])
+    lon = np.array([0.0, 0.1, 5.0, 5.1])
+    starts = np.array([True, False, True, False])
+
+    actual = distance_from_prev_m(lat, lon, starts)
+
+    assert actual[0] == 0
+    assert actual[2] == 0
+    assert actual[1] == pytest.approx(
+        geopy.distance.distance((0, 0), (0.1, 0.1)).meters, abs=1e-3
+    )
+    assert actual[3] > 0
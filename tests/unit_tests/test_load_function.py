@@ -1,12 +1,27 @@
 import pandas as pd
-from src.load.load import save_combined_csv
+from src.load.load import (
+    append_combined_csv,
+    dataset_version,
+    open_arrow_store,
+    publish_version,
+    read_processed,
+    read_version,
+    save_combined_csv,
+    save_combined_parquet,
+    stage_combined_parquet,
+    store_frame,
+    write_arrow_store,
+)
+from tests.conftest import combined_frame
 
 
-def test_save_combined_csv_saves_file():
+def test_save_combined_csv_saves_file(tmp_path):
     df = pd.DataFrame({"col": [1, 2, 3]})
 
     # Call the function
-    result_path = save_combined_csv(df)
+    result_path = save_combined_csv(
+        df, tmp_path / "combined_cleaned_data.csv"
+    )
 
     # Assert the function returned a Path
     assert result_path.exists()
@@ -14,3 +29,123 @@ def test_save_combined_csv_saves_file():
     # Assert the file contains something
     loaded = pd.read_csv(result_path)
     assert len(loaded) == 3
+
+
+def test_append_combined_csv_matches_single_write(tmp_path):
+    frames = [pd.DataFrame({"col": [1, 2]}), pd.DataFrame({"col": [3]})]
+
+    result_path = append_combined_csv(
+        iter(frames), tmp_path / "combined_cleaned_data.csv"
+    )
+
+    # One header, every row in order
+    loaded = pd.read_csv(result_path)
+    assert loaded["col"].tolist() == [1, 2, 3]
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_save_combined_parquet_partitions_by_species_and_study(tmp_path):
+    df = pd.concat([
+        combined_frame("Study A", "Blue whale", ["2020-01-02", "2020-01-01"]),
+        combined_frame("Study/B", None, ["2020-01-03"]),
+    ], ignore_index=True)
+
+    root = save_combined_parquet(df, root=tmp_path / "whales")
+
+    files = sorted(
+        p.relative_to(root).as_posix() for p in root.rglob("*.parquet")
+    )
+    assert files == [
+        "individual_taxon_canonical_name=Blue%20whale/"
+        "study_name=Study%20A/part-v000001-00000.parquet",
+        "individual_taxon_canonical_name=__HIVE_DEFAULT_PARTITION__/"
+        "study_name=Study%2FB/part-v000001-00000.parquet",
+    ]
+    loaded = read_processed(root=root)
+    assert list(loaded.columns) == list(df.columns)
+    # Sorted by time within a partition
+    study_a = loaded[loaded["study_name"] == "Study A"]
+    assert study_a["location_lat"].tolist() == [1, 0]
+    assert loaded["individual_taxon_canonical_name"].isna().sum() == 1
+
+
+def test_read_processed_prunes_by_study(tmp_path):
+    df = pd.concat([
+        combined_frame("Study A", "Blue whale", ["2020-01-01"]),
+        combined_frame("Study B", "Narwhal", ["2020-01-01", "2020-01-02"]),
+    ], ignore_index=True)
+    root = save_combined_parquet(df, root=tmp_path / "whales")
+
+    loaded = read_processed(
+        columns=["timestamp", "study_name"],
+        filters=[("study_name", "=", "Study B"),
+                 ("timestamp", ">", pd.Timestamp("2020-01-01"))],
+        root=root,
+    )
+
+    assert len(loaded) == 1
+    assert list(loaded.columns) == ["timestamp", "study_name"]
+
+
+def test_arrow_store_matches_dataset(tmp_path):
+    df = pd.concat([
+        combined_frame("Study A", "Blue whale", ["2020-01-01", "2020-01-02"]),
+        combined_frame("Study B", "Narwhal", ["2020-01-03"]),
+    ], ignore_index=True)
+    root = save_combined_parquet(df, root=tmp_path / "whales")
+
+    path = write_arrow_store(root, tmp_path / "whales.arrow")
+    table = open_arrow_store(path)
+    actual = store_frame(table, ["location_lat", "study_name"])
+
+    expected = read_processed(
+        columns=["location_lat", "study_name"], root=root
+    )
+    assert list(actual.columns) == ["location_lat", "study_name"]
+    assert actual["study_name"].dtype == "category"
+    pd.testing.assert_frame_equal(
+        actual.astype({"study_name": object}), expected
+    )
+
+
+def test_incremental_upsert_replaces_only_changed_studies(tmp_path):
+    root = tmp_path / "whales"
+    # Study B's file has rows of two study names
+    study_a = combined_frame("Study A", "Blue whale", ["2020-01-01"])
+    study_b = pd.concat([
+        combined_frame("Study B", "Narwhal", ["2020-01-02"]),
+        combined_frame("Study B2", "Narwhal", ["2020-01-03"]),
+    ], ignore_index=True)
+    publish_version(stage_combined_parquet(
+        [("a", study_a), ("b", study_b)], inputs={"a": "a1", "b": "b1"},
+        root=root,
+    ), root)
+    first = read_version(root)
+    b_files = first["studies"]["b"]["files"]
+
+    # a changed, b did not, c is gone from the inputs
+    study_a["location_lat"] = 10
+    staged = stage_combined_parquet(
+        [("a", study_a), ("b", study_b)], inputs={"a": "a2", "b": "b1"},
+        root=root,
+    )
+    # Staged files are not visible before the version is published
+    assert dataset_version(root) == 1
+    assert read_processed(root=root)["location_lat"].tolist() == [0, 0, 0]
+
+    publish_version(staged, root)
+    version = read_version(root)
+    assert version["version"] == 2
+    assert version["changed"] == ["a"]
+    assert version["studies"]["b"]["files"] == b_files
+    assert version["rows"] == 3
+    loaded = read_processed(root=root)
+    assert loaded["location_lat"].tolist() == [10, 0, 0]
+
+    # A third version drops the files only the first one used
+    publish_version(stage_combined_parquet(
+        [("b", study_b)], inputs={"b": "b1"}, root=root
+    ), root)
+    assert read_version(root)["removed"] == ["a"]
+    files = {p.relative_to(root).as_posix() for p in root.rglob("*.parquet")}
+    assert files == set(version["studies"]["a"]["files"] + b_files)
@@ -0,0 +1,69 @@
+import os
+import pandas as pd
+from src.extract.manifest import (
+    load_manifest,
+    save_manifest,
+    split_changed_files,
+    store_cleaned_study,
+    load_cleaned_study,
+)
+from tests.conftest import write_study
+
+
+def _first_run(tmp_path, files):
+    # Run the manifest as the pipeline does and cache every study
+    manifest = load_manifest(tmp_path / "cache")
+    changed = split_changed_files(files, manifest, tmp_path / "cache")
+    for path in changed:
+        store_cleaned_study(
+            manifest, path.stem, pd.DataFrame({"a": [1]}),
+            tmp_path / "cache"
+        )
+    save_manifest(manifest, tmp_path / "cache")
+    return changed
+
+
+def test_first_run_everything_changed(tmp_path):
+    files = [tmp_path / "A.csv", tmp_path / "B.csv"]
+    for path in files:
+        write_study(path, rows=3)
+
+    assert _first_run(tmp_path, files) == files
+
+
+def test_second_run_only_changed_files(tmp_path):
+    files = [tmp_path / "A.csv", tmp_path / "B.csv"]
+    for path in files:
+        write_study(path, rows=3)
+    _first_run(tmp_path, files)
+
+    # New content in B, only a touched mtime in A
+    write_study(files[1], rows=5)
+    os.utime(files[0], ns=(1, 1))
+    new_file = tmp_path / "C.csv"
+    write_study(new_file, rows=2)
+
+    manifest = load_manifest(tmp_path / "cache")
+    changed = split_changed_files(
+        files + [new_file], manifest, tmp_path / "cache"
+    )
+
+    assert changed == [files[1], new_file]
+    assert list(manifest["studies"]) == ["A", "B", "C"]
+    cached = load_cleaned_study(manifest, "A", tmp_path / "cache")
+    assert list(cached["a"]) == [1]
+
+
+def test_removed_study_is_dropped(tmp_path):
+    files = [tmp_path / "A.csv", tmp_path / "B.csv"]
+    for path in files:
+        write_study(path, rows=3)
+    _first_run(tmp_path, files)
+
+    manifest = load_manifest(tmp_path / "cache")
+    changed = split_changed_files(files[:1], manifest, tmp_path / "cache")
+
+    assert changed == []
+    assert list(manifest["studies"]) == ["A"]
+    # Only A's cached study is left behind
+    assert len(list((tmp_path / "cache").glob("*.pkl"))) == 1
@@ -0,0 +1,120 @@
+import pandas as pd
+import pytest
+import src.extract.extract
+from scripts.run_etl import run_etl_pipeline
+from src.load.load import read_processed, read_version
+from tests.conftest import write_study
+
+
+def test_pipelined_matches_phased_run(tmp_path, raw_dir):
+    for seed, name in enumerate(["A study", "B study", "C study"]):
+        write_study(raw_dir / f"{name}.csv", seed)
+
+    expected = read_processed(root=run_etl_pipeline(
+        incremental=False, output_root=tmp_path / "phased"
+    ))
+    result = read_processed(root=run_etl_pipeline(
+        incremental=False, pipelined=True, workers=2, queue_depth=1,
+        output_root=tmp_path / "pipelined",
+    ))
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("mode", [{}, {"streaming": True},
+                                  {"pipelined": True}])
+def test_incremental_switch_from_compact_matches_clean_run(tmp_path, raw_dir,
+                                                           mode):
+    for seed, name in enumerate(["A study", "B study"]):
+        write_study(raw_dir / f"{name}.csv", seed)
+    output = tmp_path / "incremental"
+
+    run_etl_pipeline(compact=True, output_root=output, **mode)
+    # Every study changes its input key, none may come from a compact cache
+    result = read_processed(root=run_etl_pipeline(
+        output_root=output, **mode
+    ))
+    expected = read_processed(root=run_etl_pipeline(
+        incremental=False, output_root=tmp_path / "clean"
+    ))
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_second_memory_budget_run_reuses_spilled_studies(tmp_path, raw_dir,
+                                                         mocker):
+    for seed, name in enumerate(["A study", "B study"]):
+        write_study(raw_dir / f"{name}.csv", seed)
+    output = tmp_path / "processed"
+    # A budget this small spills every study, a partition per track
+    first = read_processed(root=run_etl_pipeline(
+        memory_budget=1, output_root=output
+    ))
+
+    spill = mocker.spy(src.extract.extract, "spill_study")
+    write_study(raw_dir / "B study.csv", 5)
+    result = read_processed(root=run_etl_pipeline(
+        memory_budget=1, output_root=output
+    ))
+
+    # Only the changed study is spilled again
+    assert [call.args[0].name for call in spill.call_args_list] == [
+        "B study.csv"
+    ]
+    a_rows = result["study_name"] == "A study"
+    pd.testing.assert_frame_equal(
+        result[a_rows].reset_index(drop=True),
+        first[first["study_name"] == "A study"].reset_index(drop=True),
+    )
+    expected = read_processed(root=run_etl_pipeline(
+        incremental=False, output_root=tmp_path / "clean"
+    ))
+    # Spilled studies have a file per partition, so compare in one order
+    key = ["study_tag_id", "timestamp"]
+    pd.testing.assert_frame_equal(
+        result.sort_values(key, ignore_index=True),
+        expected.sort_values(key, ignore_index=True),
+    )
+
+
+def test_new_registry_rewrites_every_study(tmp_path, raw_dir):
+    for seed, name in enumerate(["A study", "B study"]):
+        write_study(raw_dir / f"{name}.csv", seed)
+    output = tmp_path / "processed"
+    run_etl_pipeline(output_root=output)
+
+    # Only B changed, but A's published ids came from the lost registry
+    (tmp_path / "registry" / "track_ids.csv").unlink()
+    write_study(raw_dir / "B study.csv", 5)
+    result = read_processed(root=run_etl_pipeline(output_root=output))
+
+    assert read_version(output / "whales")["changed"] == [
+        "A study", "B study"
+    ]
+    labels = result.groupby("track_id")["study_tag_id"].nunique()
+    assert labels.tolist() == [1, 1]
+
+
+@pytest.mark.parametrize("mode", [{}, {"streaming": True},
+                                  {"memory_budget": 1}])
+def test_numeric_and_text_tags_share_one_schema(tmp_path, raw_dir, mode):
+    write_study(raw_dir / "A study.csv", 0, tag=1000)
+    write_study(raw_dir / "B study.csv", 1, tag="T1")
+
+    df = read_processed(root=run_etl_pipeline(
+        incremental=False, output_root=tmp_path / "processed", **mode
+    ))
+
+    # Identifiers are stored as text whatever dtype each study was read as
+    assert sorted(df["tag_local_identifier"].unique()) == ["1000", "T1"]
+
+
+@pytest.mark.parametrize("mode", [{}, {"streaming": True},
+                                  {"pipelined": True}])
+def test_empty_raw_directory_fails_before_publishing(tmp_path, raw_dir, mode):
+    output = tmp_path / "processed"
+
+    with pytest.raises(FileNotFoundError, match="No studies found"):
+        run_etl_pipeline(output_root=output, **mode)
+
+    assert read_version(output / "whales")["version"] == 0
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.extract.extract_files_into_df import read_study_csv
+from src.extract.spill import (
+    CLEANING_OVERHEAD,
+    _bytes_per_row,
+    count_tracks,
+    pack_tracks,
+    read_partition,
+    spill_study,
+)
+from src.transform.clean_data import clean_data
+from src.transform.transform import clean_spilled_study
+
+
+def _write_study(path):
+    # Two tracks for W1 (tags 1 and 2), one for W2, rows interleaved
+    pd.DataFrame({
+        "timestamp": pd.date_range("2013-03-08", periods=9, freq="h")
+        .strftime("%Y-%m-%d %H:%M:%S.000"),
+        "location-lat": range(9),
+        "location-long": range(9),
+        "individual-local-identifier": ["W2", "W1", "W1"] * 3,
+        "tag-local-identifier": [3, 1, 2] * 3,
+        "individual-taxon-canonical-name": "Balaenoptera musculus",
+        "study-name": "Study",
+    }).to_csv(path, index=False)
+
+
+def _write_long_track(path):
+    # One track of 20 hourly fixes and a short one after it. Fixes 3,
+    # 4 and 9 jump 5 degrees, 6 repeats the time of 5 and 12 has no
+    # position
+    n = 20
+    lat = np.arange(n) * 0.01
+    lat[[3, 4, 9]] += 5
+    times = pd.date_range("2013-03-08", periods=n, freq="h").to_numpy()
+    times[6] = times[5]
+    lat[12] = np.nan
+    pd.DataFrame({
+        "timestamp": pd.DatetimeIndex(times)
+        .strftime("%Y-%m-%d %H:%M:%S.000").tolist()
+        + ["2013-03-08 00:00:00.000", "2013-03-08 01:00:00.000"],
+        "location-lat": list(lat) + [1.0, 1.01],
+        "location-long": [0.0] * (n + 2),
+        "individual-local-identifier": ["W1"] * n + ["W2", "W2"],
+        "tag-local-identifier": [1] * n + [2, 2],
+        "individual-taxon-canonical-name": "Balaenoptera musculus",
+        "study-name": "Study",
+    }).to_csv(path, index=False)
+
+
+def _budget_for_rows(path, rows):
+    memory, _ = _bytes_per_row(path, 10_000)
+    return int(memory * CLEANING_OVERHEAD * rows) + 1
+
+
+def test_count_tracks_sorted_by_track(tmp_path):
+    path = tmp_path / "Study.csv"
+    _write_study(path)
+
+    counts = count_tracks(path, chunksize=2)
+
+    assert list(counts.index) == [("W1", "1"), ("W1", "2"), ("W2", "3")]
+    assert counts.tolist() == [3, 3, 3]
+
+
+def test_pack_tracks_keeps_tracks_whole():
+    counts = pd.Series([3, 3, 5, 2])
+
+    assert pack_tracks(counts, 6).tolist() == [0, 0, 1, 2]
+
+
+def test_spill_study_partitions_hold_whole_tracks(tmp_path):
+    path = tmp_path / "Study.csv"
+    _write_study(path)
+
+    # Budget small enough for one track per partition
+    partitions = spill_study(
+        path, _budget_for_rows(path, 3), tmp_path / "spill", chunksize=4
+    )
+    frames = [read_partition(part, compact=True) for part in partitions]
+
+    assert len(frames) == 3
+    tracks = [
+        set(zip(df["individual-local-identifier"],
+                df["tag-local-identifier"]))
+        for df in frames
+    ]
+    assert tracks == [{("W1", "1")}, {("W1", "2")}, {("W2", "3")}]
+    assert sum(len(df) for df in frames) == 9
+    assert frames[0]["individual-local-identifier"].dtype == "category"
+    # Outside compact mode tags come back as read_csv reads them
+    assert read_partition(partitions[0])["tag-local-identifier"].tolist() \
+        == [1, 1, 1]
+
+
+def test_spill_study_cuts_a_long_track_by_time(tmp_path, caplog):
+    path = tmp_path / "Study.csv"
+    _write_long_track(path)
+
+    partitions = spill_study(
+        path, _budget_for_rows(path, 3), tmp_path / "spill"
+    )
+    frames = [read_partition(part) for part in partitions]
+
+    assert len(frames) > 1
+    assert all(len(df) <= 4 for df in frames)
+    assert sum(len(df) for df in frames) == 22
+    # Slices of W1 follow each other in time, equal times stay together
+    times = [
+        df.loc[df["individual-local-identifier"] == "W1", "timestamp"]
+        for df in frames
+    ]
+    times = [t for t in times if len(t)]
+    ends = [t.max() for t in times[:-1]]
+    starts = [t.min() for t in times[1:]]
+    assert all(end < start for end, start in zip(ends, starts))
+    assert "split by time" in caplog.text
+
+
+@pytest.mark.parametrize("rows", [1, 3, 7])
+def test_cleaning_a_cut_track_matches_the_whole_study(tmp_path, rows):
+    path = tmp_path / "Study.csv"
+    _write_long_track(path)
+    expected = clean_data({"Study": read_study_csv(path)})["Study"]
+
+    partitions = spill_study(
+        path, _budget_for_rows(path, rows), tmp_path / "spill"
+    )
+    result = pd.concat(
+        [cleaned["Study"]
+         for cleaned in clean_spilled_study("Study", partitions)],
+        ignore_index=True,
+    )
+
+    pd.testing.assert_frame_equal(
+        result.astype(object), expected.astype(object)
+    )
@@ -0,0 +1,38 @@
+import pandas as pd
+from src.utils.timestamps import detect_timestamp_format, parse_timestamps
+
+
+def test_detect_timestamp_format_movebank():
+    values = pd.Series(["2013-08-03 10:00:00.000", "2013-08-03 11:30:00.000"])
+    assert detect_timestamp_format(values) == "%Y-%m-%d %H:%M:%S.%f"
+
+
+def test_detect_timestamp_format_nothing_parses():
+    assert detect_timestamp_format(pd.Series(["error", None])) is None
+
+
+def test_parse_timestamps_matches_mixed_parser():
+    values = pd.Series([
+        "2013-08-03 10:00:00.000",
+        "2013-08-03 11:30:00.000",
+        "2013-08-03 12:00:00",
+        "2013-08-03T13:00:00+01:00",
+        "error",
+        None,
+    ])
+    parsed, fallback = parse_timestamps(values)
+
+    assert parsed.dtype == "datetime64[ns]"
+    # Seconds only, offset and garbage rows use the fallback
+    assert fallback == 3
+    assert parsed[2] == pd.Timestamp("2013-08-03 12:00:00")
+    # Offsets are converted to naive UTC
+    assert parsed[3] == pd.Timestamp("2013-08-03 12:00:00")
+    assert parsed[4:].isna().all()
+
+
+def test_parse_timestamps_leaves_datetimes_alone():
+    values = pd.Series(pd.to_datetime(["2013-08-03", "2013-08-04"]))
+    parsed, fallback = parse_timestamps(values)
+    assert parsed is values
+    assert fallback == 0
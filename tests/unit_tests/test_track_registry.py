@@ -0,0 +1,47 @@
+import pandas as pd
+from src.transform.track_registry import (
+    assign_track_ids,
+    load_registry,
+    load_track_lookup,
+    registry_generation,
+    save_registry,
+)
+
+
+def test_assign_track_ids_one_id_per_pair():
+    registry = {}
+    study = pd.Series(["B", "A", "B", "A"], dtype="category")
+    tag = pd.Series(["1", "2", "1", "2"], dtype="category")
+
+    ids = assign_track_ids(study, tag, registry)
+
+    # New pairs are numbered in sorted order
+    assert ids.tolist() == [1, 0, 1, 0]
+    assert registry == {("A", "2"): 0, ("B", "1"): 1}
+
+
+def test_track_ids_stable_across_runs(tmp_path):
+    path = tmp_path / "track_ids.csv"
+    registry = load_registry(path)
+    assign_track_ids(pd.Series(["B"]), pd.Series([1]), registry)
+    save_registry(registry, path)
+
+    # Next run sees an earlier sorting pair and keeps the old id
+    registry = load_registry(path)
+    ids = assign_track_ids(pd.Series(["A", "B"]), pd.Series([1, 1]), registry)
+
+    assert ids.tolist() == [1, 0]
+    save_registry(registry, path)
+    lookup = load_track_lookup(path)
+    assert lookup["study_tag_id"].tolist() == ["B_1", "A_1"]
+    assert lookup["track_id"].tolist() == [0, 1]
+
+
+def test_registry_generation_changes_with_a_new_registry(tmp_path):
+    path = tmp_path / "track_ids.csv"
+    first = registry_generation(path)
+    save_registry({("A", "1"): 0}, path)
+    assert registry_generation(path) == first
+
+    path.unlink()
+    assert registry_generation(path) != first